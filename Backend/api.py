@@ -1,20 +1,44 @@
-import requests
-from fastapi import FastAPI, Query, HTTPException, Depends, status
+from fastapi import FastAPI, Query, HTTPException, Depends, status, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 import uvicorn
 import os
-import bcrypt
+import asyncio
+import base64
+import hashlib
+import json
 import jwt
-from datetime import datetime, timedelta
+import logging
+import re
+import psycopg2.errors
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from db_connection import get_db_connection
+from db_connection import get_db_connection, PoolTimeout
+from upstream import get_upstream_client, fetch_cards_by_ids, id_chunks, UpstreamError
+from quota import get_quota_governor, QuotaExhausted, PRIORITY_INTERACTIVE
+import catalog
+import autocomplete
+import price_refresh
+import collection_io
+import set_completion
+from migrations import migrate, MIGRATION_CONFIG
+from passwords import get_password_hasher, needs_rehash, PasswordPoolBusy
+import metrics
+from images import (get_image_cache, ImageError, IMAGE_CONFIG, CACHE_CONTROL as IMAGE_CACHE_CONTROL,
+                    proxied_image_url, rewrite_body_images)
+from fast_json import dumps, rows_to_dicts, FastJSONResponse, RawJSONResponse
+from cache import (CachedBody, card_cache, search_cache, search_cache_key, card_cache_key, user_cache,
+                   collection_owner_cache, set_completion_cache)
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="BinderBuilder API", description="API for Pokemon card collection management")
 
 # Enable CORS
@@ -26,6 +50,157 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and in-flight requests
+app.add_middleware(metrics.MetricsMiddleware, routes=app.router.routes)
+
+CACHES = (card_cache, search_cache, user_cache, collection_owner_cache, set_completion_cache)
+
+def _pool_gauges():
+    stats = get_db_connection().pool_stats()
+    return {(state,): stats[state] for state in ('size', 'idle', 'in_use', 'waiting', 'max_size')}
+
+# Replicas are labelled by their position in DB_REPLICA_DSNS, as in /api/db/stats, so hosts stay out of /api/metrics
+def _replica_pool_gauges():
+    return {(str(number), state): replica['pool'][state]
+            for number, replica in enumerate(get_db_connection().replica_stats())
+            for state in ('size', 'idle', 'in_use', 'waiting')}
+
+def _replica_gauge(field: str):
+    return lambda: {(str(number),): float(replica[field] or 0)
+                    for number, replica in enumerate(get_db_connection().replica_stats())}
+
+def _cache_gauge(field: str):
+    return lambda: {(cache.name,): cache.stats()[field] for cache in CACHES}
+
+def _cache_lookups():
+    lookups = {}
+    for cache in CACHES:
+        stats = cache.stats()
+        for result in ('hits', 'misses', 'coalesced', 'evictions', 'expirations'):
+            lookups[(cache.name, result)] = stats[result]
+    return lookups
+
+def _password_gauges():
+    stats = get_password_hasher().stats()
+    return {(field,): stats[field] for field in ('workers', 'pending', 'max_queue', 'rejected')}
+
+def _quota_queue_depth():
+    return {(priority,): depth for priority, depth in get_quota_governor().stats()['queued'].items()}
+
+def _quota_requests():
+    stats = get_quota_governor().stats()
+    return {(priority, outcome): stats[outcome][priority]
+            for outcome in ('granted', 'rejected') for priority in stats[outcome]}
+
+def _quota_tokens():
+    return {(): float(get_quota_governor().stats()['available'] or 0)}
+
+metrics.registry.register(metrics.CallbackGauge(
+    "db_pool_connections", "Database pool connections by state", ("state",), _pool_gauges))
+metrics.registry.register(metrics.CallbackGauge(
+    "db_replica_pool_connections", "Replica pool connections by replica and state", ("replica", "state"),
+    _replica_pool_gauges))
+metrics.registry.register(metrics.CallbackGauge(
+    "db_replica_lag_seconds", "Replay lag measured by the last replica health check", ("replica",),
+    _replica_gauge('lag_seconds')))
+metrics.registry.register(metrics.CallbackGauge(
+    "db_replica_healthy", "Whether reads are currently routed to a replica", ("replica",), _replica_gauge('healthy')))
+metrics.registry.register(metrics.CallbackGauge(
+    "db_replica_reads_total", "Reads served per replica", ("replica",), _replica_gauge('reads'), kind="counter"))
+metrics.registry.register(metrics.CallbackGauge(
+    "cache_entries", "Entries held per in-process cache", ("cache",), _cache_gauge('entries')))
+metrics.registry.register(metrics.CallbackGauge(
+    "cache_bytes", "Estimated bytes held per in-process cache", ("cache",), _cache_gauge('bytes')))
+metrics.registry.register(metrics.CallbackGauge(
+    "cache_events_total", "Cache hits, misses, coalesced loads, evictions and expirations", ("cache", "event"),
+    _cache_lookups, kind="counter"))
+metrics.registry.register(metrics.CallbackGauge(
+    "password_hasher", "Password hashing pool workers, queue occupancy and rejections", ("field",), _password_gauges))
+metrics.registry.register(metrics.CallbackGauge(
+    "upstream_quota_queue_depth", "Pokemon TCG API calls waiting for a quota token, by priority", ("priority",),
+    _quota_queue_depth))
+metrics.registry.register(metrics.CallbackGauge(
+    "upstream_quota_requests_total", "Quota tokens granted and calls rejected, by priority", ("priority", "outcome"),
+    _quota_requests, kind="counter"))
+metrics.registry.register(metrics.CallbackGauge(
+    "upstream_quota_tokens", "Tokens left in the shared upstream quota bucket when last checked", (), _quota_tokens))
+
+@app.on_event("startup")
+def open_database_pool():
+    """Open the database connection pool and apply pending migrations before serving requests"""
+    db = get_db_connection()
+    db.connect()
+    if MIGRATION_CONFIG['on_startup']:
+        try:
+            migrate(db)
+        except (psycopg2.Error, PoolTimeout) as e:
+            logger.error(f"Schema migrations failed, serving with the current schema: {e}")
+
+@app.on_event("startup")
+async def start_catalog_sync():
+    """Keep the local card catalog mirror current in the background"""
+    if catalog.CATALOG_SYNC_INTERVAL_HOURS > 0:
+        app.state.catalog_sync = asyncio.create_task(catalog.run_periodic_sync())
+
+@app.on_event("startup")
+async def start_autocomplete_index():
+    """Build the autocomplete index and keep rebuilding it in the background"""
+    if autocomplete.AUTOCOMPLETE_CONFIG['refresh_minutes'] > 0:
+        app.state.autocomplete_rebuild = asyncio.create_task(autocomplete.run_periodic_rebuild())
+
+@app.on_event("startup")
+async def start_price_refresh():
+    """Keep stored card prices current in the background"""
+    if price_refresh.PRICE_REFRESH_CONFIG['interval_hours'] > 0:
+        app.state.price_refresh = asyncio.create_task(price_refresh.run_periodic_refresh())
+
+@app.on_event("shutdown")
+def close_database_pool():
+    """Release pooled database connections"""
+    get_db_connection().disconnect()
+
+@app.on_event("shutdown")
+async def close_upstream_client():
+    """Release pooled upstream HTTP connections"""
+    for task_name in ("catalog_sync", "price_refresh"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
+    await get_upstream_client().close()
+    await get_image_cache().close()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    """Stop the password hashing workers"""
+    get_password_hasher().shutdown()
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request, exc: PasswordPoolBusy):
+    """Shed login and registration bursts with a 503 instead of queueing them without bound"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many concurrent sign-ins, please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(QuotaExhausted)
+async def quota_exhausted_handler(request, exc: QuotaExhausted):
+    """Answer 503 when the Pokemon TCG API quota cannot serve the request within its budget"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Card lookups are temporarily rate limited, please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc: PoolTimeout):
+    """Shed load with a 503 when every pooled connection is busy"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
@@ -34,16 +209,6 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Security
 security = HTTPBearer()
 
-POKEMON_DB_API_KEY = os.getenv("POKEMON_DB_API_KEY")
-if not POKEMON_DB_API_KEY:
-    raise ValueError("POKEMON_DB_API_KEY environment variable is not set")
-
-BASE_URL = "https://api.pokemontcg.io/v2"
-
-headers = {
-    "X-Api-Key": POKEMON_DB_API_KEY
-}
-
 # Pydantic models for type safety
 class PokemonCard(BaseModel):
     id: str
@@ -69,6 +234,25 @@ class CollectionCard(BaseModel):
     quantity: int = 1
     collection_id: int
 
+class BulkCardItem(BaseModel):
+    card: dict
+    quantity: int = Field(1, ge=1)
+
+class BulkAddCards(BaseModel):
+    cards: List[BulkCardItem]
+
+# Largest batch accepted by the bulk add endpoint
+MAX_BULK_ADD_CARDS = 1000
+
+class CardBatchRequest(BaseModel):
+    ids: List[str]
+
+# Largest number of ids accepted by the batch card lookup
+MAX_BATCH_CARD_IDS = 500
+
+# Card ids are letters, digits, dots, dashes and underscores; anything else cannot go into an id: query safely
+CARD_ID_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
 # Authentication models
 class UserRegister(BaseModel):
     username: str
@@ -93,40 +277,120 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
-def search_cards(query: str, page: int = 1, page_size: int = 20):
-    """Search for Pokemon cards using the API"""
+async def search_cards(query: str, page: int = 1, page_size: int = 20) -> CachedBody:
+    """Search for Pokemon cards, serving repeated searches from the cache"""
+    # Format the query to work with Pokemon TCG API
+    # If the query doesn't have a field specifier, assume it's a name search
+    formatted_query = query
+    if ':' not in query:
+        formatted_query = f"name:{query}*"
+
+    key = search_cache_key(formatted_query, page, page_size)
+    return await search_cache.get_or_load(key, lambda: fetch_search_results(formatted_query, page, page_size))
+
+async def fetch_search_results(formatted_query: str, page: int, page_size: int) -> CachedBody:
+    """Run a formatted search against the local catalog, falling back to the upstream API"""
     try:
-        # Format the query to work with Pokemon TCG API
-        # If the query doesn't have a field specifier, assume it's a name search
-        formatted_query = query
-        if ':' not in query:
-            formatted_query = f"name:{query}*"
+        # Serve common name/set queries from the local catalog mirror
+        local_result = await run_in_threadpool(catalog.search_local, formatted_query, page, page_size)
+        if local_result is not None:
+            return CachedBody.from_data(rewrite_body_images(local_result))
         
-        url = f"{BASE_URL}/cards"
         params = {
             "q": formatted_query,
             "page": page,
             "pageSize": page_size
         }
         
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        # Without image URLs to rewrite, upstream bytes are served as-is instead of decoded and re-encoded
+        if not IMAGE_CONFIG['enabled']:
+            return CachedBody(await get_upstream_client().get_raw("/cards", params=params,
+                                                                  priority=PRIORITY_INTERACTIVE))
+        body = await get_upstream_client().get_json("/cards", params=params, priority=PRIORITY_INTERACTIVE)
+        return CachedBody.from_data(rewrite_body_images(body))
+    except UpstreamError as e:
         raise HTTPException(status_code=500, detail="Failed to fetch cards")
 
-def get_card_by_id(card_id: str):
-    """Get a specific card by ID"""
+async def get_card_by_id(card_id: str) -> CachedBody:
+    """Get a specific card by ID, serving repeated lookups from the cache"""
+    return await card_cache.get_or_load(card_cache_key(card_id), lambda: fetch_card(card_id))
+
+async def fetch_card(card_id: str) -> CachedBody:
+    """Fetch a specific card from the upstream API"""
     try:
-        url = f"{BASE_URL}/cards/{card_id}"
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        if not IMAGE_CONFIG['enabled']:
+            return CachedBody(await get_upstream_client().get_raw(f"/cards/{card_id}", endpoint="/cards/{id}",
+                                                                  priority=PRIORITY_INTERACTIVE))
+        body = await get_upstream_client().get_json(f"/cards/{card_id}", endpoint="/cards/{id}",
+                                                    priority=PRIORITY_INTERACTIVE)
+        return CachedBody.from_data(rewrite_body_images(body))
+    except UpstreamError as e:
         raise HTTPException(status_code=404, detail=f"Failed to fetch card {card_id}")
 
+def upstream_error_detail(error: Exception) -> dict:
+    """Per-id error for a card whose upstream lookup failed"""
+    if isinstance(error, QuotaExhausted):
+        return {"status": 503, "detail": "Card lookups are temporarily rate limited", "retry_after": error.retry_after}
+    return {"status": 502, "detail": "Card lookup failed upstream"}
+
+async def get_cards_by_ids(card_ids: List[str]) -> dict:
+    """Resolve many cards at once from the card cache, then the local catalog, then batched upstream searches.
+
+    Returns the cards found keyed by id, an error per id that could not be
+    resolved, and how many ids each source answered.
+    """
+    cards = {}
+    errors = {}
+    sources = {"cache": 0, "catalog": 0, "upstream": 0}
+
+    wanted = []
+    for card_id in dict.fromkeys(card_id.strip() for card_id in card_ids):
+        if not CARD_ID_RE.match(card_id):
+            errors[card_id] = {"status": 400, "detail": "Invalid card id"}
+            continue
+        cached = card_cache.get(card_cache_key(card_id))
+        if cached is not None:
+            cards[card_id] = cached.data['data']
+            sources["cache"] += 1
+        else:
+            wanted.append(card_id)
+
+    def remember(card_id: str, card: dict):
+        body = CachedBody.from_data(rewrite_body_images({"data": card}))
+        card_cache.set(card_cache_key(card_id), body)
+        cards[card_id] = body.data['data']
+
+    if wanted:
+        try:
+            local = await run_in_threadpool(catalog.get_cards, wanted)
+        except psycopg2.Error as e:
+            logger.error(f"Catalog lookup failed, resolving cards upstream: {e}")
+            local = {}
+        for card_id, card in local.items():
+            remember(card_id, card)
+        sources["catalog"] = len(local)
+
+    missing = [card_id for card_id in wanted if card_id not in cards]
+    upstream_calls = 0
+    if missing:
+        # Misses are folded into id:(a OR b ...) searches run concurrently at interactive priority
+        failed = {}
+        fetched = await fetch_cards_by_ids(missing, priority=PRIORITY_INTERACTIVE, failed=failed)
+        upstream_calls = len(id_chunks(missing))
+        for card_id in missing:
+            if card_id in fetched:
+                remember(card_id, fetched[card_id])
+                sources["upstream"] += 1
+            elif card_id in failed:
+                errors[card_id] = upstream_error_detail(failed[card_id])
+            else:
+                errors[card_id] = {"status": 404, "detail": "Card not found"}
+
+    for source, count in sources.items():
+        if count:
+            metrics.CARD_BATCH_IDS.inc(source, amount=count)
+    return {"cards": cards, "errors": errors, "sources": sources, "upstream_calls": upstream_calls}
+
 def add_card_to_collection(card_data: dict, collection_id: int):
     """Add a card to the user's collection"""
     db = get_db_connection()
@@ -148,20 +412,322 @@ def add_card_to_collection(card_data: dict, collection_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to add card to collection")
 
-def get_user_collection(collection_id: int):
-    """Get all cards in a user's collection"""
+# Explicit column list keeps prepared collection queries valid when columns are added to cards.
+# Prices come back as float8 so rows serialize without building Decimals.
+COLLECTION_CARD_COLUMNS = """
+    c.id, c.pokemon_card_id, c.name, c.set_name, c.series, c.image_url,
+    c.price::float8 AS price, c.quantity, c.collection_id, c.added_at
+"""
+# Names for collection rows fetched as tuples, in SELECT order
+COLLECTION_CARD_FIELDS = ('id', 'pokemon_card_id', 'name', 'set_name', 'series', 'image_url',
+                          'price', 'quantity', 'collection_id', 'added_at', 'collection_name')
+
+# Collection list queries, served by idx_collections_user_created; benchmarks/plan_check.py checks their plans
+USER_COLLECTIONS_QUERY = """
+    SELECT id, name, description, created_at, updated_at
+    FROM collections
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+"""
+USER_COLLECTIONS_FIELDS = ('id', 'name', 'description', 'created_at', 'updated_at')
+
+USER_COLLECTIONS_TOTALS_QUERY = """
+    SELECT col.id, col.name, col.description, col.created_at, col.updated_at,
+           COALESCE(s.card_count, 0) AS card_count,
+           COALESCE(s.unique_cards, 0) AS unique_cards,
+           COALESCE(s.total_value, 0)::float8 AS total_value
+    FROM collections col
+    LEFT JOIN collection_summaries s ON s.collection_id = col.id
+    WHERE col.user_id = %s
+    ORDER BY col.created_at DESC
+"""
+USER_COLLECTIONS_TOTALS_FIELDS = USER_COLLECTIONS_FIELDS + ('card_count', 'unique_cards', 'total_value')
+
+# Auth lookups, served by the unique indexes on users.username and users.email
+EXISTING_USER_QUERY = "SELECT id FROM users WHERE username = %s OR email = %s"
+LOGIN_USER_QUERY = "SELECT id, username, password_hash, token_version FROM users WHERE username = %s"
+
+def proxy_card_images(rows):
+    """Point each collection row's image at the local image proxy"""
+    if IMAGE_CONFIG['enabled']:
+        for row in rows:
+            row['image_url'] = proxied_image_url(row['image_url'], IMAGE_CONFIG['card_width'])
+    return rows
+
+def get_user_collection(collection_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                        user_id: Optional[int] = None):
+    """Get cards in a user's collection, newest first.
+
+    Without a ``limit`` every card is returned. With one, a page of at most
+    ``limit`` cards is returned along with the cursor for the next page.
+    Passing the requesting ``user_id`` lets the read go to that user's replica.
+    """
     db = get_db_connection()
-    
-    query = """
-        SELECT c.*, col.name as collection_name
+
+    if limit is None:
+        query = f"""
+            SELECT {COLLECTION_CARD_COLUMNS}, col.name as collection_name
+            FROM cards c
+            JOIN collections col ON c.collection_id = col.id
+            WHERE c.collection_id = %s
+            ORDER BY c.added_at DESC, c.id DESC
+        """
+        rows = db.fetch_all(query, (collection_id,), prepare=True, as_tuples=True, replica=user_id is not None, affinity=user_id)
+        return proxy_card_images(rows_to_dicts(COLLECTION_CARD_FIELDS, rows)), None
+
+    # Keyset pagination on (added_at, id) so deep pages cost the same as the first
+    position_clause = ""
+    params = [collection_id]
+    if cursor:
+        added_at, card_id = decode_collection_cursor(cursor)
+        position_clause = "AND (c.added_at, c.id) < (%s, %s)"
+        params.extend([added_at, card_id])
+
+    query = f"""
+        SELECT {COLLECTION_CARD_COLUMNS}, col.name as collection_name
+        FROM cards c
+        JOIN collections col ON c.collection_id = col.id
+        WHERE c.collection_id = %s {position_clause}
+        ORDER BY c.added_at DESC, c.id DESC
+        LIMIT %s
+    """
+    params.append(limit + 1)
+    rows = db.fetch_all(query, tuple(params), prepare=True, as_tuples=True, replica=user_id is not None, affinity=user_id)
+    result = rows_to_dicts(COLLECTION_CARD_FIELDS, rows)
+
+    next_cursor = None
+    if len(result) > limit:
+        result = result[:limit]
+        next_cursor = encode_collection_cursor(result[-1]['added_at'], result[-1]['id'])
+    return proxy_card_images(result), next_cursor
+
+def iter_user_collection_ndjson(collection_id: int, batch_size: int = 500, user_id: Optional[int] = None):
+    """Stream a collection as newline-delimited JSON, one card per line"""
+    db = get_db_connection()
+    query = f"""
+        SELECT {COLLECTION_CARD_COLUMNS}, col.name as collection_name
         FROM cards c
         JOIN collections col ON c.collection_id = col.id
         WHERE c.collection_id = %s
-        ORDER BY c.added_at DESC
+        ORDER BY c.added_at DESC, c.id DESC
     """
-    
-    result = db.execute_query(query, (collection_id,))
-    return result if result else []
+    for rows in db.iter_rows(query, (collection_id,), batch_size=batch_size, as_tuples=True, replica=user_id is not None, affinity=user_id):
+        yield b"".join(dumps(row) + b"\n" for row in proxy_card_images(rows_to_dicts(COLLECTION_CARD_FIELDS, rows)))
+
+def encode_collection_cursor(added_at: datetime, card_id: int) -> str:
+    """Encode a keyset position as an opaque cursor"""
+    raw = json.dumps([added_at.isoformat(), card_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_collection_cursor(cursor: str):
+    """Decode a cursor from encode_collection_cursor back into (added_at, id)"""
+    try:
+        added_at, card_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(added_at), int(card_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def get_collection_stats(collection_id: int, user_id: Optional[int] = None):
+    """Read a collection's incrementally maintained totals and per-set breakdown"""
+    db = get_db_connection()
+
+    totals_query = """
+        SELECT card_count, unique_cards, total_value, updated_at
+        FROM collection_summaries
+        WHERE collection_id = %s
+    """
+    totals = db.fetch_one(totals_query, (collection_id,), prepare=True, replica=user_id is not None, affinity=user_id)
+
+    sets_query = """
+        SELECT NULLIF(set_name, '') AS set_name, series, card_count, unique_cards, total_value
+        FROM collection_set_summaries
+        WHERE collection_id = %s
+        ORDER BY total_value DESC, set_name
+    """
+    sets = db.fetch_all(sets_query, (collection_id,), prepare=True, replica=user_id is not None, affinity=user_id)
+
+    summary = totals if totals else {"card_count": 0, "unique_cards": 0, "total_value": 0, "updated_at": None}
+    return {"collection_id": collection_id, **summary, "sets": sets}
+
+# Longest range a history request may cover, and the spans up to which finer buckets are used
+MAX_HISTORY_DAYS = 3660
+HISTORY_BUCKET_SPANS = [(92, 'day'), (730, 'week')]
+
+# Buckets covering [start, end], each with its exclusive end date clipped to the range
+HISTORY_BUCKETS_QUERY = """
+    SELECT bucket::date AS bucket,
+           LEAST(bucket + %(step)s::interval, %(end)s::date + 1)::date AS bucket_end
+    FROM generate_series(date_trunc(%(interval)s, %(start)s::timestamp), %(end)s::timestamp, %(step)s::interval) AS bucket
+"""
+
+def history_range(start: Optional[date], end: Optional[date], interval: str):
+    """Resolve a requested history range to (start, end, bucket interval), defaulting to the last year"""
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    span = (end - start).days
+    if span < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end")
+    if span > MAX_HISTORY_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"History ranges are limited to {MAX_HISTORY_DAYS} days"
+        )
+
+    if interval == 'auto':
+        interval = next((name for days, name in HISTORY_BUCKET_SPANS if span <= days), 'month')
+    return start, end, interval
+
+def get_card_price_history(card_id: str, start: date, end: date, interval: str):
+    """A card's price per bucket: the closing price plus the low and high seen during the bucket"""
+    query = f"""
+        WITH buckets AS ({HISTORY_BUCKETS_QUERY})
+        SELECT b.bucket, latest.price, LEAST(opening.price, moves.low) AS low, GREATEST(opening.price, moves.high) AS high
+        FROM buckets b
+        LEFT JOIN LATERAL (
+            SELECT h.price FROM card_price_history h
+            WHERE h.pokemon_card_id = %(card_id)s AND h.recorded_on < b.bucket_end
+            ORDER BY h.recorded_on DESC LIMIT 1
+        ) latest ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT h.price FROM card_price_history h
+            WHERE h.pokemon_card_id = %(card_id)s AND h.recorded_on < b.bucket
+            ORDER BY h.recorded_on DESC LIMIT 1
+        ) opening ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT MIN(h.price) AS low, MAX(h.price) AS high FROM card_price_history h
+            WHERE h.pokemon_card_id = %(card_id)s AND h.recorded_on >= b.bucket AND h.recorded_on < b.bucket_end
+        ) moves ON TRUE
+        ORDER BY b.bucket
+    """
+    params = {"card_id": card_id, "start": start, "end": end, "interval": interval, "step": f"1 {interval}"}
+    points = get_db_connection().fetch_all(query, params)
+    return {"card_id": card_id, "start": start, "end": end, "interval": interval, "points": points}
+
+def get_collection_value_history(collection_id: int, start: date, end: date, interval: str):
+    """A collection's market value at the close of each bucket.
+
+    Each card counts from the day it was added, valued at its latest recorded
+    price as of the bucket's end, or at its stored price before any history
+    exists for it. Rather than looking up every card's price once per bucket,
+    the history is read once per card as a series of value changes, summed
+    per bucket and accumulated with a running sum.
+    """
+    query = f"""
+        WITH buckets AS ({HISTORY_BUCKETS_QUERY}),
+        owned AS (
+            SELECT id, pokemon_card_id, added_at::date AS added_on, COALESCE(quantity, 0) AS quantity, price
+            FROM cards
+            WHERE collection_id = %(collection_id)s AND added_at::date <= %(end)s
+        ),
+        -- A card adds its stored price on the day it was added, then each recorded price moves its
+        -- value by the change from the one before; moves before it was added land on that day
+        changes AS (
+            SELECT added_on AS day, quantity * COALESCE(price, 0) AS value_delta, quantity AS card_delta
+            FROM owned
+            UNION ALL
+            SELECT GREATEST(o.added_on, h.recorded_on),
+                   o.quantity * (h.price - COALESCE(LAG(h.price) OVER (PARTITION BY o.id ORDER BY h.recorded_on), o.price, 0)),
+                   0
+            FROM owned o
+            JOIN card_price_history h ON h.pokemon_card_id = o.pokemon_card_id AND h.recorded_on <= %(end)s
+        ),
+        -- Changes before the range open the first bucket
+        bucket_changes AS (
+            SELECT GREATEST(date_trunc(%(interval)s, day::timestamp), date_trunc(%(interval)s, %(start)s::timestamp))::date AS bucket,
+                   SUM(value_delta) AS value_delta, SUM(card_delta) AS card_delta
+            FROM changes
+            GROUP BY 1
+        )
+        SELECT b.bucket,
+               SUM(COALESCE(d.value_delta, 0)) OVER (ORDER BY b.bucket) AS value,
+               SUM(COALESCE(d.card_delta, 0)) OVER (ORDER BY b.bucket)::bigint AS card_count
+        FROM buckets b
+        LEFT JOIN bucket_changes d ON d.bucket = b.bucket
+        ORDER BY b.bucket
+    """
+    params = {"collection_id": collection_id, "start": start, "end": end, "interval": interval, "step": f"1 {interval}"}
+    points = get_db_connection().fetch_all(query, params)
+    return {"collection_id": collection_id, "start": start, "end": end, "interval": interval, "points": points}
+
+# Clients may store these responses but must revalidate before reuse
+REVALIDATE = "no-cache"
+PRIVATE_REVALIDATE = "private, no-cache"
+
+# Suggestions only change when the autocomplete index is rebuilt, so clients may reuse them briefly
+SUGGESTIONS_CACHE_CONTROL = "public, max-age=300"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names ``etag``, using the weak comparison GET requires"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag.removeprefix('W/'):
+            return True
+    return False
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    """Tag a response with its ETag, returning a 304 to send instead when the client already has it"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def fast_json(response: Response, content) -> FastJSONResponse:
+    """Render ``content`` with orjson, keeping headers already set on the injected response"""
+    return FastJSONResponse(content, headers=dict(response.headers))
+
+def get_collection_version(collection_id: int, user_id: Optional[int] = None) -> int:
+    """Current version of a collection; bumped by triggers on every write to it or its cards"""
+    row = get_db_connection().fetch_one(
+        "SELECT version FROM collections WHERE id = %s", (collection_id,), prepare=True, as_tuples=True,
+        replica=user_id is not None, affinity=user_id
+    )
+    return row[0] if row else 0
+
+def collection_etag(collection_id: int, version: int, *variant) -> str:
+    """ETag for one representation of a collection at a version"""
+    suffix = hashlib.md5(repr(variant).encode('utf-8')).hexdigest()[:8] if variant else "all"
+    return f'"collection-{collection_id}-v{version}-{suffix}"'
+
+def get_collections_etag(user_id: int, include_totals: bool) -> str:
+    """ETag for a user's collection list from the ids and versions of their collections"""
+    query = """
+        SELECT COALESCE(md5(string_agg(id || ':' || version, ',' ORDER BY id)), '')
+        FROM collections
+        WHERE user_id = %s
+    """
+    digest = get_db_connection().fetch_one(query, (user_id,), prepare=True, as_tuples=True,
+                                           replica=True, affinity=user_id)[0]
+    return f'"collections-{user_id}-{digest[:16] or "empty"}-{int(include_totals)}"'
+
+def get_owned_collection_ids(user_id: int, refresh: bool = False) -> frozenset:
+    """Ids of the collections a user owns, served from the ownership cache unless ``refresh`` is set.
+
+    Cache misses read from a replica; a refresh reads from the primary.
+    """
+    owned = None if refresh else collection_owner_cache.get(user_id)
+    if owned is None:
+        db = get_db_connection()
+        rows = db.fetch_all("SELECT id FROM collections WHERE user_id = %s", (user_id,), prepare=True, as_tuples=True,
+                            replica=not refresh, affinity=user_id)
+        owned = frozenset(row[0] for row in rows)
+        collection_owner_cache.set(user_id, owned)
+    return owned
+
+def require_collection_owner(collection_id: int, current_user: dict):
+    """Raise 403 unless the current user owns the collection"""
+    owned = get_owned_collection_ids(current_user['id'])
+    if collection_id not in owned:
+        # The cached set may predate a newly created collection, so confirm before refusing
+        owned = get_owned_collection_ids(current_user['id'], refresh=True)
+
+    if collection_id not in owned:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: You don't own this collection"
+        )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -178,46 +744,102 @@ def verify_token(token: str):
     """Verify JWT token and return payload"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        if payload.get("sub") is None:
             return None
-        return username
+        return payload
     except jwt.PyJWTError:
         return None
 
+def load_user(user_id: int, replica: bool = True):
+    """Get a user record by id, served from the short-lived user cache when possible"""
+    user = user_cache.get(user_id) if replica else None
+    if user is not None:
+        return user
+
+    db = get_db_connection()
+    query = "SELECT id, username, email, created_at, token_version FROM users WHERE id = %s"
+    user = db.fetch_one(query, (user_id,), prepare=True, replica=replica, affinity=user_id)
+    if user is None and replica:
+        # A user registered moments ago may not have reached the replica yet
+        user = db.fetch_one(query, (user_id,), prepare=True)
+    if user is None:
+        return None
+
+    user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: int):
+    """Drop cached identity and collection ownership for a user after it changes"""
+    user_cache.invalidate(user_id)
+    collection_owner_cache.invalidate(user_id)
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from JWT token"""
     token = credentials.credentials
-    username = verify_token(token)
-    if username is None:
+    payload = verify_token(token)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user from database
-    db = get_db_connection()
-    query = "SELECT id, username, email, created_at FROM users WHERE username = %s"
-    result = db.execute_query(query, (username,))
+    user_id = payload.get("uid")
+    if user_id is not None:
+        # Tokens carry the user id, so the common case is a cache hit with no query
+        user = load_user(user_id)
+    else:
+        # Tokens issued before ids were embedded in the claims
+        db = get_db_connection()
+        query = "SELECT id, username, email, created_at, token_version FROM users WHERE username = %s"
+        user = db.fetch_one(query, (payload["sub"],), prepare=True)
     
-    if not result:
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if payload.get("ver", 0) != user['token_version'] and user_id is not None:
+        # The cached or replica copy may predate a revocation made elsewhere
+        user = load_user(user_id, replica=False) or user
+
+    if payload.get("ver", 0) != user['token_version']:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return result[0]
+    return user
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+def create_user(username: str, email: str, password_hash: str):
+    """Insert a user and their default collection, committing both together"""
+    insert_query = """
+        INSERT INTO users (username, email, password_hash, created_at, updated_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        RETURNING id, username, email, created_at
+    """
+    collection_query = """
+        INSERT INTO collections (name, description, user_id, created_at, updated_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    """
+    with get_db_connection().transaction() as tx:
+        user = tx.fetch_one(insert_query, (username, email, password_hash))
+        tx.execute(collection_query, (f"{username}'s Collection", "Default collection", user['id']))
+    return user
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def rehash_password(user_id: int, password: str):
+    """Re-hash a password with the configured work factor after a successful login"""
+    try:
+        hashed_password = await get_password_hasher().hash(password)
+    except PasswordPoolBusy:
+        # Under load the upgrade simply waits for the user's next login
+        return
+    db = get_db_connection()
+    query = "UPDATE users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s"
+    await run_in_threadpool(db.execute, query, (hashed_password, user_id))
 
 @app.get("/")
 async def index():
@@ -226,6 +848,8 @@ async def index():
 
 @app.get("/api/search")
 async def search_endpoint(
+    request: Request,
+    response: Response,
     q: str = Query(..., description="Search query"),
     page: int = Query(1, description="Page number"),
     pageSize: int = Query(20, description="Number of results per page")
@@ -234,63 +858,296 @@ async def search_endpoint(
     if not q:
         raise HTTPException(status_code=400, detail="Query parameter 'q' is required")
     
-    result = search_cards(q, page, pageSize)
-    return result
+    result = await search_cards(q, page, pageSize)
+    # Cached bodies are already encoded, so they are sent as bytes
+    return (conditional(request, response, result.etag, REVALIDATE)
+            or RawJSONResponse(result.raw, headers=dict(response.headers)))
+
+@app.get("/api/autocomplete")
+async def autocomplete_endpoint(
+    q: str = Query(..., description="Prefix typed so far"),
+    limit: int = Query(autocomplete.AUTOCOMPLETE_CONFIG['default_results'], ge=1,
+                       le=autocomplete.AUTOCOMPLETE_CONFIG['max_results'], description="Suggestions to return")
+):
+    """API endpoint for card and set name suggestions, served from the in-memory prefix index"""
+    suggestions = autocomplete.get_autocomplete_index().suggest(q, limit)
+    return RawJSONResponse(dumps({"query": q, "suggestions": suggestions}),
+                           headers={"Cache-Control": SUGGESTIONS_CACHE_CONTROL})
+
+@app.get("/api/autocomplete/stats")
+async def autocomplete_stats(current_user: dict = Depends(get_current_user)):
+    """Size and age of the autocomplete index"""
+    return autocomplete.get_autocomplete_index().stats()
+
+@app.post("/api/cards/batch")
+async def get_cards_batch_endpoint(payload: CardBatchRequest):
+    """API endpoint for resolving many cards in one call, keyed by id with an error per unresolved id"""
+    if len(payload.ids) > MAX_BATCH_CARD_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_CARD_IDS} card ids can be looked up per request"
+        )
+    return RawJSONResponse(dumps(await get_cards_by_ids(payload.ids)))
 
 @app.get("/api/card/{card_id}")
-async def get_card_endpoint(card_id: str):
+async def get_card_endpoint(card_id: str, request: Request, response: Response):
     """API endpoint for getting a specific card"""
-    result = get_card_by_id(card_id)
-    return result
+    result = await get_card_by_id(card_id)
+    return (conditional(request, response, result.etag, REVALIDATE)
+            or RawJSONResponse(result.raw, headers=dict(response.headers)))
+
+@app.get("/api/card/{card_id}/price-history")
+def get_card_price_history_endpoint(
+    card_id: str,
+    start: Optional[date] = Query(None, description="First day of the range; defaults to a year before end"),
+    end: Optional[date] = Query(None, description="Last day of the range; defaults to today"),
+    interval: str = Query("auto", pattern="^(auto|day|week|month)$", description="Bucket size"),
+):
+    """API endpoint for a card's downsampled price history"""
+    start, end, interval = history_range(start, end, interval)
+    return get_card_price_history(card_id, start, end, interval)
+
+@app.get("/api/images")
+async def image_proxy_endpoint(
+    request: Request,
+    url: str = Query(..., description="Upstream image URL"),
+    w: Optional[int] = Query(None, description="Thumbnail width; omit for the original image")
+):
+    """Serve a card image from the local disk cache, as the original or a WebP thumbnail"""
+    cache = get_image_cache()
+    try:
+        if w is None:
+            path, etag, media_type = await cache.original(url)
+        else:
+            path, etag, media_type = await cache.thumbnail(url, w)
+    except ImageError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": IMAGE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
 
 @app.post("/api/collection/{collection_id}/add-card")
-async def add_card_endpoint(collection_id: int, card_data: dict, current_user: dict = Depends(get_current_user)):
+def add_card_endpoint(collection_id: int, card_data: dict, current_user: dict = Depends(get_current_user)):
     """API endpoint for adding a card to collection"""
     # Verify user owns this collection
-    db = get_db_connection()
-    ownership_query = "SELECT id FROM collections WHERE id = %s AND user_id = %s"
-    ownership_result = db.execute_query(ownership_query, (collection_id, current_user['id']))
-    
-    if not ownership_result:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: You don't own this collection"
-        )
+    require_collection_owner(collection_id, current_user)
     
     result = add_card_to_collection(card_data, collection_id)
+    # Keep this user's reads on the primary until replicas have the new card
+    get_db_connection().note_write(current_user['id'])
     return result
 
+@app.post("/api/collection/{collection_id}/add-cards")
+def add_cards_endpoint(collection_id: int, payload: BulkAddCards, current_user: dict = Depends(get_current_user)):
+    """API endpoint for adding many cards to a collection in one transaction"""
+    if len(payload.cards) > MAX_BULK_ADD_CARDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_ADD_CARDS} cards can be added per request"
+        )
+
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+
+    db = get_db_connection()
+    results = db.add_cards_to_collection([(item.card, item.quantity) for item in payload.cards], collection_id)
+    db.note_write(current_user['id'])
+    if results is None:
+        raise HTTPException(status_code=500, detail="Failed to add cards to collection")
+
+    added = sum(1 for result in results if result['status'] == 'added')
+    return {"collection_id": collection_id, "added": added, "failed": len(results) - added, "results": results}
+
+@app.post("/api/collection/{collection_id}/import")
+async def import_collection_endpoint(
+    collection_id: int,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|json|ndjson)$", description="Upload format; defaults to the Content-Type"),
+    mode: str = Query("add", pattern="^(add|set)$", description="Add to existing quantities or replace them"),
+    current_user: dict = Depends(get_current_user)
+):
+    """API endpoint importing a CSV, JSON or NDJSON file of card ids and quantities into a collection"""
+    # Verify user owns this collection
+    await run_in_threadpool(require_collection_owner, collection_id, current_user)
+
+    try:
+        fmt = collection_io.import_format(request.headers.get("content-type"), format)
+        upload = await collection_io.spool_upload(request.stream())
+        try:
+            return await collection_io.import_collection(collection_id, upload, fmt, mode)
+        finally:
+            upload.close()
+            get_db_connection().note_write(current_user['id'])
+    except collection_io.TransferError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.get("/api/collection/{collection_id}/export")
+def export_collection_endpoint(
+    collection_id: int,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Export format"),
+    current_user: dict = Depends(get_current_user)
+):
+    """API endpoint streaming a collection as a CSV or NDJSON download"""
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+
+    headers = {"Content-Disposition": f'attachment; filename="collection-{collection_id}.{format}"'}
+    if format == "ndjson":
+        return StreamingResponse(iter_user_collection_ndjson(collection_id, user_id=current_user['id']),
+                                 media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(collection_io.iter_export_csv(collection_id), media_type="text/csv", headers=headers)
+
 @app.get("/api/collection/{collection_id}")
-async def get_collection_endpoint(collection_id: int, current_user: dict = Depends(get_current_user)):
+def get_collection_endpoint(
+    collection_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit to return every card"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    current_user: dict = Depends(get_current_user)
+):
     """API endpoint for getting a user's collection"""
     # Verify user owns this collection
-    db = get_db_connection()
-    ownership_query = "SELECT id FROM collections WHERE id = %s AND user_id = %s"
-    ownership_result = db.execute_query(ownership_query, (collection_id, current_user['id']))
+    require_collection_owner(collection_id, current_user)
+
+    # An unchanged collection is answered from its version alone, without reading any cards
+    etag = collection_etag(collection_id, get_collection_version(collection_id, current_user['id']), limit, cursor)
+    not_modified = conditional(request, response, etag, PRIVATE_REVALIDATE)
+    if not_modified:
+        return not_modified
     
-    if not ownership_result:
+    result, next_cursor = get_user_collection(collection_id, limit, cursor, current_user['id'])
+    body = {"collection_id": collection_id, "cards": result}
+    if limit is not None:
+        body["next_cursor"] = next_cursor
+    return fast_json(response, body)
+
+@app.get("/api/collection/{collection_id}/stream")
+def stream_collection_endpoint(collection_id: int, request: Request, current_user: dict = Depends(get_current_user)):
+    """API endpoint streaming a collection as NDJSON, fetched from the database in batches"""
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+
+    etag = collection_etag(collection_id, get_collection_version(collection_id, current_user['id']), "ndjson")
+    headers = {"ETag": etag, "Cache-Control": PRIVATE_REVALIDATE}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return StreamingResponse(iter_user_collection_ndjson(collection_id, user_id=current_user['id']),
+                             media_type="application/x-ndjson", headers=headers)
+
+@app.get("/api/collection/{collection_id}/stats")
+def get_collection_stats_endpoint(collection_id: int, request: Request, response: Response,
+                                  current_user: dict = Depends(get_current_user)):
+    """API endpoint for a collection's card count, market value and per-set breakdown"""
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+
+    etag = collection_etag(collection_id, get_collection_version(collection_id, current_user['id']), "stats")
+    return (conditional(request, response, etag, PRIVATE_REVALIDATE)
+            or get_collection_stats(collection_id, current_user['id']))
+
+def require_catalog():
+    """Raise 503 until the catalog mirror holds the set rosters completion is computed from"""
+    if not catalog.catalog_ready():
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: You don't own this collection"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Set rosters are not available until the card catalog has synced",
+            headers={"Retry-After": "60"}
         )
-    
-    result = get_user_collection(collection_id)
-    return {"collection_id": collection_id, "cards": result}
 
-@app.get("/api/collections", response_model=List[dict])
-async def get_user_collections(current_user: dict = Depends(get_current_user)):
+@app.get("/api/collection/{collection_id}/sets")
+def get_set_completion_endpoint(
+    collection_id: int,
+    request: Request,
+    response: Response,
+    include_unstarted: bool = Query(False, description="Also list sets the collection has no cards from"),
+    current_user: dict = Depends(get_current_user)
+):
+    """API endpoint for how complete each set is in a collection"""
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+    require_catalog()
+
+    version = get_collection_version(collection_id, current_user['id'])
+    generation = catalog.catalog_generation()
+    etag = collection_etag(collection_id, version, "sets", generation, include_unstarted)
+    not_modified = conditional(request, response, etag, PRIVATE_REVALIDATE)
+    if not_modified:
+        return not_modified
+
+    key = (collection_id, version, generation, "sets", include_unstarted)
+    body = set_completion_cache.get(key)
+    if body is None:
+        body = CachedBody.from_data(
+            set_completion.collection_set_completion(collection_id, include_unstarted, current_user['id']))
+        set_completion_cache.set(key, body)
+    return RawJSONResponse(body.raw, headers=dict(response.headers))
+
+@app.get("/api/collection/{collection_id}/sets/{set_id}/missing")
+def get_missing_set_cards_endpoint(collection_id: int, set_id: str, request: Request, response: Response,
+                                   current_user: dict = Depends(get_current_user)):
+    """API endpoint for the cards of one set a collection does not hold yet"""
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+    require_catalog()
+
+    version = get_collection_version(collection_id, current_user['id'])
+    generation = catalog.catalog_generation()
+    etag = collection_etag(collection_id, version, "missing", generation, set_id)
+    not_modified = conditional(request, response, etag, PRIVATE_REVALIDATE)
+    if not_modified:
+        return not_modified
+
+    key = (collection_id, version, generation, "missing", set_id)
+    body = set_completion_cache.get(key)
+    if body is None:
+        result = set_completion.missing_set_cards(collection_id, set_id, current_user['id'])
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Set {set_id} not found")
+        body = CachedBody.from_data(result)
+        set_completion_cache.set(key, body)
+    return RawJSONResponse(body.raw, headers=dict(response.headers))
+
+@app.get("/api/collection/{collection_id}/value-history")
+def get_collection_value_history_endpoint(
+    collection_id: int,
+    start: Optional[date] = Query(None, description="First day of the range; defaults to a year before end"),
+    end: Optional[date] = Query(None, description="Last day of the range; defaults to today"),
+    interval: str = Query("auto", pattern="^(auto|day|week|month)$", description="Bucket size"),
+    current_user: dict = Depends(get_current_user)
+):
+    """API endpoint for a collection's downsampled market value history"""
+    # Verify user owns this collection
+    require_collection_owner(collection_id, current_user)
+
+    start, end, interval = history_range(start, end, interval)
+    return get_collection_value_history(collection_id, start, end, interval)
+
+@app.get("/api/collections")
+def get_user_collections(
+    request: Request,
+    response: Response,
+    include_totals: bool = Query(False, description="Include card counts and market value per collection"),
+    current_user: dict = Depends(get_current_user)
+):
     """Get all collections for the current user"""
     db = get_db_connection()
+
+    not_modified = conditional(request, response, get_collections_etag(current_user['id'], include_totals),
+                               PRIVATE_REVALIDATE)
+    if not_modified:
+        return not_modified
     
-    query = """
-        SELECT id, name, description, created_at, updated_at
-        FROM collections 
-        WHERE user_id = %s
-        ORDER BY created_at DESC
-    """
+    if include_totals:
+        query, fields = USER_COLLECTIONS_TOTALS_QUERY, USER_COLLECTIONS_TOTALS_FIELDS
+    else:
+        query, fields = USER_COLLECTIONS_QUERY, USER_COLLECTIONS_FIELDS
     
-    result = db.execute_query(query, (current_user['id'],))
-    return result if result else []
+    rows = db.fetch_all(query, (current_user['id'],), prepare=True, as_tuples=True,
+                        replica=True, affinity=current_user['id'])
+    return fast_json(response, rows_to_dicts(fields, rows))
 
 @app.post("/api/auth/register", response_model=UserResponse)
 async def register_user(user_data: UserRegister):
@@ -299,8 +1156,8 @@ async def register_user(user_data: UserRegister):
     
     try:
         # Check if username already exists
-        check_query = "SELECT id FROM users WHERE username = %s OR email = %s"
-        existing_user = db.execute_query(check_query, (user_data.username, user_data.email))
+        existing_user = await run_in_threadpool(db.fetch_one, EXISTING_USER_QUERY,
+                                                (user_data.username, user_data.email))
         
         if existing_user:
             raise HTTPException(
@@ -308,34 +1165,23 @@ async def register_user(user_data: UserRegister):
                 detail="Username or email already registered"
             )
         
-        # Hash password
-        hashed_password = hash_password(user_data.password)
-        
-        # Insert new user
-        insert_query = """
-            INSERT INTO users (username, email, password_hash, created_at, updated_at)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            RETURNING id, username, email, created_at
-        """
-        
-        result = db.execute_query(insert_query, (user_data.username, user_data.email, hashed_password))
+        # Hash password on the dedicated bcrypt workers
+        hashed_password = await get_password_hasher().hash(user_data.password)
         
-        if not result:
+        # Insert the user and their default collection in one transaction
+        try:
+            user = await run_in_threadpool(create_user, user_data.username, user_data.email, hashed_password)
+        except psycopg2.errors.UniqueViolation:
+            # Lost a race with a concurrent registration for the same username or email
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create user"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username or email already registered"
             )
+        invalidate_user(user['id'])
         
-        # Create default collection for user
-        collection_query = """
-            INSERT INTO collections (name, description, user_id, created_at, updated_at)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        """
-        db.execute_query(collection_query, (f"{user_data.username}'s Collection", "Default collection", result[0]['id']))
-        
-        return result[0]
+        return user
         
-    except HTTPException:
+    except (HTTPException, PasswordPoolBusy):
         raise
     except Exception as e:
         raise HTTPException(
@@ -344,38 +1190,40 @@ async def register_user(user_data: UserRegister):
         )
 
 @app.post("/api/auth/login", response_model=Token)
-async def login_user(user_data: UserLogin):
+async def login_user(user_data: UserLogin, background_tasks: BackgroundTasks):
     """Login user and return JWT token"""
     db = get_db_connection()
     
     try:
         # Get user by username
-        query = "SELECT id, username, password_hash FROM users WHERE username = %s"
-        result = db.execute_query(query, (user_data.username,))
+        user = await run_in_threadpool(db.fetch_one, LOGIN_USER_QUERY, (user_data.username,), prepare=True)
         
-        if not result:
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password"
             )
         
-        user = result[0]
-        
-        # Verify password
-        if not verify_password(user_data.password, user['password_hash']):
+        # Verify password on the dedicated bcrypt workers
+        if not await get_password_hasher().verify(user_data.password, user['password_hash']):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password"
             )
+
+        # Upgrade hashes made with an outdated work factor once the response is sent
+        if needs_rehash(user['password_hash']):
+            background_tasks.add_task(rehash_password, user['id'], user_data.password)
         
         # Update last login
         update_query = "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s"
-        db.execute_query(update_query, (user['id'],))
+        await run_in_threadpool(db.execute, update_query, (user['id'],), prepare=True)
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user['username']}, expires_delta=access_token_expires
+            data={"sub": user['username'], "uid": user['id'], "ver": user['token_version']},
+            expires_delta=access_token_expires
         )
         
         return {
@@ -384,7 +1232,7 @@ async def login_user(user_data: UserLogin):
             "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
         }
         
-    except HTTPException:
+    except (HTTPException, PasswordPoolBusy):
         raise
     except Exception as e:
         raise HTTPException(
@@ -393,10 +1241,58 @@ async def login_user(user_data: UserLogin):
         )
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: dict = Depends(get_current_user)):
+def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
     return current_user
 
+@app.post("/api/auth/revoke-tokens")
+def revoke_tokens(current_user: dict = Depends(get_current_user)):
+    """Invalidate every token issued to the current user, including the one used for this request"""
+    db = get_db_connection()
+    query = "UPDATE users SET token_version = token_version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = %s RETURNING token_version"
+    result = db.fetch_one(query, (current_user['id'],))
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to revoke tokens"
+        )
+    invalidate_user(current_user['id'])
+    db.note_write(current_user['id'])
+    return {"message": "All tokens revoked"}
+
+@app.get("/api/cache/stats")
+async def cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit, miss and eviction counters for the in-process caches"""
+    return {
+        "cards": card_cache.stats(),
+        "search": search_cache.stats(),
+        "users": user_cache.stats(),
+        "collection_owners": collection_owner_cache.stats(),
+        "set_completion": set_completion_cache.stats(),
+        "images": get_image_cache().stats()
+    }
+
+# Replica fields that name hosts and databases, or echo connection errors that do; kept to logs and metrics
+REPLICA_PRIVATE_FIELDS = ('name', 'error')
+
+@app.get("/api/db/stats")
+def db_stats(current_user: dict = Depends(get_current_user)):
+    """Primary pool occupancy plus health, lag and pool occupancy per read replica, numbered in DSN order"""
+    db = get_db_connection()
+    replicas = [{"replica": number, **{field: value for field, value in replica.items() if field not in REPLICA_PRIVATE_FIELDS}}
+                for number, replica in enumerate(db.replica_stats())]
+    return {"primary": db.pool_stats(), "replicas": replicas, "replica_fallbacks": db.replica_fallbacks}
+
+@app.get("/api/upstream/stats")
+def upstream_stats(current_user: dict = Depends(get_current_user)):
+    """Upstream quota queue depth per priority, grants, rejections and tokens left"""
+    return get_quota_governor().stats()
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Request, database, upstream, pool and cache metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+import logging
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from db_connection import get_db_connection
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_CONFIG = {
+    'refresh_minutes': float(os.getenv('AUTOCOMPLETE_REFRESH_MINUTES', '60')),
+    'default_results': int(os.getenv('AUTOCOMPLETE_DEFAULT_RESULTS', '8')),
+    'max_results': int(os.getenv('AUTOCOMPLETE_MAX_RESULTS', '20')),
+    # Prefixes matching more index keys than this get their top results precomputed
+    'scan_limit': int(os.getenv('AUTOCOMPLETE_SCAN_LIMIT', '64'))
+}
+
+KIND_CARD = 0
+KIND_SET = 1
+KIND_NAMES = ('card', 'set')
+
+# Popularity is the number of collections holding a name, then how many printings or cards it covers.
+# Owned names are included so suggestions work before the first catalog sync.
+CARD_NAMES_QUERY = """
+    SELECT name, SUM(owners)::int AS owners, SUM(printings)::int AS printings
+    FROM (
+        SELECT name, 0 AS owners, COUNT(*) AS printings FROM catalog_cards GROUP BY name
+        UNION ALL
+        SELECT name, COUNT(DISTINCT collection_id), 0 FROM cards GROUP BY name
+    ) names
+    GROUP BY name
+"""
+
+SET_NAMES_QUERY = """
+    SELECT name, SUM(owners)::int AS owners, SUM(printings)::int AS printings
+    FROM (
+        SELECT name, 0 AS owners, COALESCE(MAX(total), 0) AS printings FROM catalog_sets GROUP BY name
+        UNION ALL
+        SELECT set_name, COUNT(DISTINCT collection_id), 0 FROM cards WHERE set_name IS NOT NULL GROUP BY set_name
+    ) names
+    GROUP BY name
+"""
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form used for both index keys and queries"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+class AutocompleteIndex:
+    """Immutable prefix index over card and set names.
+
+    Entries are numbered in popularity order, so for any set of matches the
+    lowest entry numbers are the best suggestions. Every name is indexed
+    under its whole folded form and under each later word, matching the
+    upstream's token-prefix search, in one sorted key array searched with
+    bisect. Prefixes that match more than ``scan_limit`` keys have their top
+    results precomputed, so no lookup scans more than ``scan_limit`` keys.
+    """
+
+    def __init__(self, names: List[str], kinds: bytes, keys: List[str], targets: array,
+                 top: Dict[str, Tuple[int, ...]], scan_limit: int):
+        self.names = names
+        self.kinds = kinds
+        self.keys = keys
+        self.targets = targets
+        self.top = top
+        self.scan_limit = scan_limit
+        self.built_at: Optional[float] = None
+        self.build_seconds = 0.0
+
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[str, int, int, int]], max_results: int,
+              scan_limit: int) -> "AutocompleteIndex":
+        """Build an index from ``(name, kind, owners, printings)`` rows"""
+        unique = {}
+        for name, kind, owners, printings in entries:
+            name = ' '.join((name or '').split())
+            if name and (name, kind) not in unique:
+                unique[(name, kind)] = (-(owners or 0), -(printings or 0), len(name), name, kind)
+        ranked = sorted(unique.values())
+        names = [entry[3] for entry in ranked]
+        kinds = bytes(entry[4] for entry in ranked)
+
+        pairs = set()
+        for index, name in enumerate(names):
+            words = fold(name).split(' ')
+            for start in range(len(words)):
+                pairs.add((' '.join(words[start:]), index))
+        pairs = sorted(pairs)
+        keys = [key for key, _ in pairs]
+        targets = array('I', (index for _, index in pairs))
+
+        index = cls(names, kinds, keys, targets, {}, scan_limit)
+        index.top = index._precompute(max_results)
+        return index
+
+    @classmethod
+    def empty(cls) -> "AutocompleteIndex":
+        return cls([], b'', [], array('I'), {}, 0)
+
+    def _range(self, key: str) -> Tuple[int, int]:
+        lo = bisect_left(self.keys, key)
+        return lo, bisect_left(self.keys, key + '\U0010ffff', lo)
+
+    def _precompute(self, max_results: int) -> Dict[str, Tuple[int, ...]]:
+        """Top results for every prefix matching more than ``scan_limit`` keys.
+
+        A prefix can only be that broad if its parent prefix is too, so the
+        search grows prefixes one character at a time from the broad ones.
+        """
+        top = {}
+        frontier = {key[:1] for key in self.keys if key}
+        while frontier:
+            next_frontier = set()
+            for prefix in frontier:
+                lo, hi = self._range(prefix)
+                if hi - lo <= self.scan_limit:
+                    continue
+                top[prefix] = tuple(sorted(set(self.targets[lo:hi]))[:max_results])
+                length = len(prefix) + 1
+                next_frontier.update(key[:length] for key in self.keys[lo:hi] if len(key) >= length)
+            frontier = next_frontier
+        return top
+
+    def suggest(self, prefix: str, limit: int) -> List[Dict[str, str]]:
+        """Best ``limit`` names whose folded form, or a later word in it, starts with ``prefix``"""
+        key = fold(prefix)
+        if not key:
+            return []
+        matches = self.top.get(key)
+        if matches is None:
+            lo, hi = self._range(key)
+            matches = sorted(set(self.targets[lo:hi]))
+        return [{"name": self.names[i], "type": KIND_NAMES[self.kinds[i]]} for i in matches[:limit]]
+
+    def stats(self) -> Dict[str, object]:
+        """Size and freshness for monitoring"""
+        return {
+            'names': len(self.names),
+            'keys': len(self.keys),
+            'precomputed_prefixes': len(self.top),
+            'built_at': self.built_at,
+            'build_seconds': round(self.build_seconds, 3)
+        }
+
+# The live index; replaced wholesale on refresh so readers never see a partly built one
+_index = AutocompleteIndex.empty()
+
+def get_autocomplete_index() -> AutocompleteIndex:
+    """Get the current autocomplete index"""
+    return _index
+
+def load_entries() -> List[Tuple[str, int, int, int]]:
+    """Card and set names with their popularity, read from the catalog mirror and owned cards"""
+    db = get_db_connection()
+    entries = [(name, KIND_CARD, owners, printings)
+               for name, owners, printings in db.fetch_all(CARD_NAMES_QUERY, as_tuples=True)]
+    entries.extend((name, KIND_SET, owners, printings)
+                   for name, owners, printings in db.fetch_all(SET_NAMES_QUERY, as_tuples=True))
+    return entries
+
+def rebuild_index() -> AutocompleteIndex:
+    """Build a fresh index from Postgres and swap it in"""
+    global _index
+    started = time.perf_counter()
+    index = AutocompleteIndex.build(load_entries(), AUTOCOMPLETE_CONFIG['max_results'],
+                                    AUTOCOMPLETE_CONFIG['scan_limit'])
+    index.build_seconds = time.perf_counter() - started
+    index.built_at = time.time()
+    _index = index
+    logger.info(f"Autocomplete index rebuilt: {len(index.names)} names, {len(index.keys)} keys "
+                f"in {index.build_seconds:.2f}s")
+    return index
+
+async def run_periodic_rebuild(interval_minutes: float = AUTOCOMPLETE_CONFIG['refresh_minutes']):
+    """Build the index at startup and rebuild it every ``interval_minutes``"""
+    while True:
+        try:
+            await run_in_threadpool(rebuild_index)
+        except Exception as e:
+            logger.error(f"Autocomplete index rebuild failed: {e}")
+        await asyncio.sleep(interval_minutes * 60)
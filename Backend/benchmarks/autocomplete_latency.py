@@ -0,0 +1,78 @@
+"""In-process autocomplete latency and memory benchmark.
+
+Builds the prefix index from a synthetic catalogue of the given size and
+times lookups for every 1 to 6 character prefix of a sample of names,
+reporting percentiles in microseconds and the memory the index holds. No
+database or server is needed.
+
+    python -m benchmarks.autocomplete_latency --names 20000 --sets 170 --queries 50000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import percentile, run_metadata
+from benchmarks.fixtures import POKEMON_NAMES, NAME_SUFFIXES
+from autocomplete import AutocompleteIndex, AUTOCOMPLETE_CONFIG, KIND_CARD, KIND_SET
+
+SYLLABLES = ["ka", "ri", "zu", "mon", "bel", "tor", "chu", "ra", "dos", "lo", "pha", "nix", "ter", "gu", "vy", "ax"]
+
+def synthetic_entries(names: int, sets: int, rng: random.Random):
+    """``(name, kind, owners, printings)`` rows shaped like the real catalog"""
+    entries = [(name, KIND_CARD, rng.randint(0, 500), rng.randint(1, 40)) for name in POKEMON_NAMES]
+    seen = set(POKEMON_NAMES)
+    while len(entries) < names:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))).capitalize() + rng.choice(NAME_SUFFIXES)
+        if name not in seen:
+            seen.add(name)
+            entries.append((name, KIND_CARD, int(rng.paretovariate(1.2)) - 1, rng.randint(1, 12)))
+    entries.extend((f"{rng.choice(['Base', 'Neo', 'Evolving', 'Crown'])} {rng.choice(SYLLABLES).capitalize()} {i}",
+                    KIND_SET, rng.randint(0, 200), rng.randint(60, 250)) for i in range(sets))
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description="Time autocomplete lookups against a synthetic index")
+    parser.add_argument("--names", type=int, default=20000, help="Distinct card names in the index")
+    parser.add_argument("--sets", type=int, default=170, help="Set names in the index")
+    parser.add_argument("--queries", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=AUTOCOMPLETE_CONFIG['default_results'])
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = synthetic_entries(args.names, args.sets, rng)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = AutocompleteIndex.build(entries, AUTOCOMPLETE_CONFIG['max_results'], AUTOCOMPLETE_CONFIG['scan_limit'])
+    build_seconds = time.perf_counter() - started
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    prefixes = []
+    for _ in range(args.queries):
+        name = rng.choice(index.names)
+        prefixes.append(name[:rng.randint(1, 6)])
+
+    latencies = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.suggest(prefix, args.limit)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    report = run_metadata("autocomplete_latency", vars(args))
+    report["index"] = {**index.stats(), "build_seconds": round(build_seconds, 3),
+                       "approx_bytes": index_bytes}
+    report["lookups"] = {
+        "count": len(latencies),
+        "p50_us": round(percentile(latencies, 50) * 1000, 1),
+        "p99_us": round(percentile(latencies, 99) * 1000, 1),
+        "max_us": round(latencies[-1] * 1e6, 1)
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Helpers shared by the benchmark scripts: latency summaries and run metadata."""
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import List
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted latencies, in milliseconds"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+def summarize(label: str, latencies: List[float], elapsed: float, rejected: int = 0) -> dict:
+    """Throughput and latency percentiles for one run"""
+    ordered = sorted(latencies)
+    return {
+        "name": label,
+        "completed": len(latencies),
+        "rejected": rejected,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 1),
+        "p95_ms": round(percentile(ordered, 95), 1),
+        "p99_ms": round(percentile(ordered, 99), 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0
+    }
+
+def git_commit() -> str:
+    """Commit the benchmark ran against, so results can be lined up with changes"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_metadata(benchmark: str, config: dict) -> dict:
+    """Header recorded with every result so runs can be compared over time"""
+    return {
+        "benchmark": benchmark,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "config": config
+    }
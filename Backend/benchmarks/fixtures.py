@@ -0,0 +1,68 @@
+"""Deterministic synthetic card catalogue shared by the stub upstream, the seeder and the workloads.
+
+Every process that builds a Catalogue with the same arguments gets the same
+sets, card ids, names and prices, so cards seeded into Postgres always exist
+on the stub server and searches issued by the workloads always have hits.
+"""
+import random
+from typing import Dict, List, Optional
+
+POKEMON_NAMES = [
+    "Pikachu", "Charizard", "Bulbasaur", "Squirtle", "Eevee", "Mewtwo", "Gengar", "Snorlax",
+    "Dragonite", "Lucario", "Gardevoir", "Greninja", "Rayquaza", "Umbreon", "Sylveon", "Blastoise",
+    "Venusaur", "Jigglypuff", "Magikarp", "Gyarados", "Machamp", "Alakazam", "Arcanine", "Lapras",
+    "Tyranitar", "Garchomp", "Mimikyu", "Zoroark", "Togepi", "Psyduck", "Vulpix", "Ninetales"
+]
+
+NAME_SUFFIXES = ["", "", "", " V", " VMAX", " ex", " GX"]
+
+RARITIES = ["Common", "Uncommon", "Rare", "Rare Holo", "Rare Ultra"]
+
+SERIES = ["Base", "Neo", "EX", "Diamond & Pearl", "Black & White", "XY", "Sun & Moon", "Sword & Shield"]
+
+BENCH_USER_PREFIX = "bench_"
+
+def bench_username(index: int) -> str:
+    """Name of the ``index``-th seeded benchmark user"""
+    return f"{BENCH_USER_PREFIX}{index:05d}"
+
+class Catalogue:
+    """``sets`` synthetic sets of ``cards_per_set`` cards each"""
+
+    def __init__(self, sets: int = 40, cards_per_set: int = 150, seed: int = 7):
+        rng = random.Random(seed)
+        self.sets: List[Dict] = []
+        self.cards: List[Dict] = []
+        for set_index in range(sets):
+            series = SERIES[set_index * len(SERIES) // max(sets, 1)]
+            card_set = {
+                "id": f"bench{set_index + 1}",
+                "name": f"Bench Set {set_index + 1}",
+                "series": series,
+                "printedTotal": cards_per_set,
+                "total": cards_per_set,
+                "releaseDate": f"{2000 + set_index % 24}/{set_index % 12 + 1:02d}/01",
+                "updatedAt": "2024/01/01 00:00:00"
+            }
+            self.sets.append(card_set)
+            for number in range(1, cards_per_set + 1):
+                card_id = f"{card_set['id']}-{number}"
+                self.cards.append({
+                    "id": card_id,
+                    "name": rng.choice(POKEMON_NAMES) + rng.choice(NAME_SUFFIXES),
+                    "number": str(number),
+                    "rarity": rng.choice(RARITIES),
+                    "set": {key: card_set[key] for key in ("id", "name", "series", "printedTotal", "total", "releaseDate")},
+                    "images": {
+                        "small": f"https://images.example.test/{card_set['id']}/{number}.png",
+                        "large": f"https://images.example.test/{card_set['id']}/{number}_hires.png"
+                    },
+                    "cardmarket": {"prices": {"averageSellPrice": round(rng.lognormvariate(0.5, 1.2), 2)}}
+                })
+        self.by_id = {card["id"]: card for card in self.cards}
+
+    def card(self, card_id: str) -> Optional[Dict]:
+        return self.by_id.get(card_id)
+
+    def cards_in_set(self, set_id: str) -> List[Dict]:
+        return [card for card in self.cards if card["set"]["id"] == set_id]
@@ -0,0 +1,100 @@
+"""Login throughput benchmark.
+
+In-process mode measures how many bcrypt verifications per second the
+password worker pool sustains for a burst of concurrent logins, compared with
+verifying inline on the event loop. HTTP mode fires the same burst at a
+running API's /api/auth/login.
+
+    python -m benchmarks.login_throughput --logins 64 --concurrency 32
+    python -m benchmarks.login_throughput --url http://localhost:5001 --username ash --password pikachu
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from benchmarks.common import summarize, run_metadata
+from passwords import PasswordHasher, PasswordPoolBusy, hash_password, verify_password, PASSWORD_CONFIG
+
+async def run_burst(worker, logins: int, concurrency: int):
+    """Run ``logins`` calls of ``worker`` with at most ``concurrency`` outstanding"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    rejected = 0
+
+    async def one():
+        nonlocal rejected
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await worker()
+            except PasswordPoolBusy:
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    return latencies, time.perf_counter() - started, rejected
+
+async def in_process(logins: int, concurrency: int, rounds: int, workers: int, max_queue: int) -> List[dict]:
+    hashed = hash_password("benchmark-password", rounds=rounds)
+    results = []
+
+    async def inline():
+        # Baseline: bcrypt directly on the event loop thread
+        verify_password("benchmark-password", hashed)
+
+    latencies, elapsed, rejected = await run_burst(inline, logins, concurrency)
+    results.append(summarize("inline", latencies, elapsed, rejected))
+
+    hasher = PasswordHasher(workers=workers, max_queue=max_queue)
+    try:
+        latencies, elapsed, rejected = await run_burst(
+            lambda: hasher.verify("benchmark-password", hashed), logins, concurrency
+        )
+        results.append(summarize(f"pool[{hasher.workers} workers]", latencies, elapsed, rejected))
+    finally:
+        hasher.shutdown()
+    return results
+
+async def over_http(url: str, username: str, password: str, logins: int, concurrency: int) -> List[dict]:
+    import httpx
+
+    statuses = {}
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        async def login():
+            response = await client.post("/api/auth/login", json={"username": username, "password": password})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 503:
+                raise PasswordPoolBusy(int(response.headers.get("Retry-After", "1")))
+
+        latencies, elapsed, rejected = await run_burst(login, logins, concurrency)
+    result = summarize("http", latencies, elapsed, rejected)
+    result["statuses"] = statuses
+    return [result]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure login (bcrypt verify) throughput")
+    parser.add_argument("--logins", type=int, default=64, help="Logins in the burst")
+    parser.add_argument("--concurrency", type=int, default=32, help="Logins outstanding at once")
+    parser.add_argument("--rounds", type=int, default=PASSWORD_CONFIG['rounds'], help="bcrypt work factor")
+    parser.add_argument("--workers", type=int, default=PASSWORD_CONFIG['workers'], help="Password worker threads")
+    parser.add_argument("--max-queue", type=int, default=PASSWORD_CONFIG['max_queue'], help="Pending jobs before shedding")
+    parser.add_argument("--url", help="Benchmark a running API instead of the in-process pool")
+    parser.add_argument("--username", help="Existing user for HTTP mode")
+    parser.add_argument("--password", help="That user's password for HTTP mode")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.username or not args.password:
+            parser.error("--url requires --username and --password")
+        results = asyncio.run(over_http(args.url, args.username, args.password, args.logins, args.concurrency))
+    else:
+        results = asyncio.run(in_process(args.logins, args.concurrency, args.rounds, args.workers, args.max_queue))
+    config = {key: value for key, value in vars(args).items() if key != "password"}
+    print(json.dumps({**run_metadata("login_throughput", config), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
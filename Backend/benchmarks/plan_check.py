@@ -0,0 +1,142 @@
+"""Query-plan regression check for the hot read paths.
+
+Runs the API's own read functions against seeded benchmark data, records the
+SQL they issue, and EXPLAINs each statement with sequential scans and
+explicit sorts priced out. A plan that still contains a Seq Scan or a Sort
+means no index serves that query any more, which is how a dropped or
+reshaped index shows up before it reaches production. Exits non-zero when any
+statement regresses.
+
+    python -m benchmarks.seed --users 100 --large-collection-cards 5000
+    python -m benchmarks.plan_check
+"""
+import argparse
+import json
+import sys
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.fixtures import BENCH_USER_PREFIX
+from db_connection import get_db_connection, Transaction
+import api
+
+# Plan nodes that mean a hot query is not being served by an index
+FORBIDDEN_NODES = ("Seq Scan", "Sort", "Incremental Sort")
+
+@contextmanager
+def capture_statements():
+    """Record every (query, params) run through a Transaction while the block executes"""
+    captured: List[Tuple[str, tuple]] = []
+    original = Transaction._run
+
+    def recording_run(self, cursor, query, params, prepare):
+        captured.append((query, tuple(params) if params else ()))
+        return original(self, cursor, query, params, prepare)
+
+    Transaction._run = recording_run
+    try:
+        yield captured
+    finally:
+        Transaction._run = original
+
+def plan_nodes(plan: dict):
+    """Every node of an EXPLAIN (FORMAT JSON) plan, depth first"""
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+def explain(db, query: str, params: tuple) -> dict:
+    """Plan a statement with sequential scans and sorts discouraged, so only a missing index can produce them"""
+    with db.transaction() as tx:
+        tx.execute("SET LOCAL enable_seqscan = off")
+        tx.execute("SET LOCAL enable_sort = off")
+        row = tx.fetch_one(f"EXPLAIN (FORMAT JSON) {query}", params, as_tuples=True)
+    plan = row[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+def sample_values(db) -> Dict[str, object]:
+    """Ids and names from the seeded benchmark data to bind into the checked queries"""
+    user = db.fetch_one(
+        "SELECT id, username, email FROM users WHERE username LIKE %s ORDER BY id LIMIT 1",
+        (f"{BENCH_USER_PREFIX}%",)
+    )
+    if not user:
+        raise SystemExit("No benchmark users found; run python -m benchmarks.seed first")
+    collection = db.fetch_one(
+        "SELECT id FROM collections WHERE user_id = %s ORDER BY name = 'Bench Large Collection' DESC, id LIMIT 1",
+        (user['id'],)
+    )
+    if not collection:
+        raise SystemExit("The first benchmark user has no collections; re-run the seed")
+    return {"user_id": user['id'], "username": user['username'], "email": user['email'],
+            "collection_id": collection['id']}
+
+def checks(db, sample: Dict[str, object]) -> List[Tuple[str, Callable[[], object]]]:
+    """Named calls into the API's read paths, each issuing the statements to plan"""
+    user_id, collection_id = sample["user_id"], sample["collection_id"]
+
+    def second_page():
+        _, cursor = api.get_user_collection(collection_id, limit=50)
+        if cursor:
+            api.get_user_collection(collection_id, limit=50, cursor=cursor)
+
+    return [
+        ("collection cards, unpaged", lambda: api.get_user_collection(collection_id)),
+        ("collection cards, first page", lambda: api.get_user_collection(collection_id, limit=50)),
+        ("collection cards, next page", second_page),
+        ("collection version", lambda: api.get_collection_version(collection_id)),
+        ("collection list etag", lambda: api.get_collections_etag(user_id, False)),
+        ("owned collection ids", lambda: api.get_owned_collection_ids(user_id, refresh=True)),
+        ("user by id", lambda: api.load_user(user_id, replica=False)),
+        ("collection list", lambda: db.fetch_all(api.USER_COLLECTIONS_QUERY, (user_id,))),
+        ("collection list with totals", lambda: db.fetch_all(api.USER_COLLECTIONS_TOTALS_QUERY, (user_id,))),
+        ("register lookup", lambda: db.fetch_one(api.EXISTING_USER_QUERY, (sample["username"], sample["email"]))),
+        ("login lookup", lambda: db.fetch_one(api.LOGIN_USER_QUERY, (sample["username"],)))
+    ]
+
+def run(verbose: bool = False) -> int:
+    db = get_db_connection()
+    # Fresh statistics so the planner sees the seeded row counts
+    db.execute("ANALYZE users, collections, cards, collection_summaries")
+    sample = sample_values(db)
+
+    regressions = 0
+    for name, call in checks(db, sample):
+        with capture_statements() as captured:
+            call()
+        seen = set()
+        for query, params in captured:
+            if (query, params) in seen:
+                continue
+            seen.add((query, params))
+            plan = explain(db, query, params)
+            bad = [node for node in plan_nodes(plan) if node["Node Type"] in FORBIDDEN_NODES]
+            status = "FAIL" if bad else "ok"
+            print(f"{status:>4}  {name}: {plan['Node Type']} (cost {plan['Total Cost']})")
+            for node in bad:
+                print(f"        {node['Node Type']} on {node.get('Relation Name', '?')}")
+            if verbose or bad:
+                print("        " + " ".join(query.split()))
+            regressions += bool(bad)
+
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a hot read path stops being served by an index")
+    parser.add_argument("--verbose", action="store_true", help="Print every checked statement")
+    args = parser.parse_args()
+
+    db = get_db_connection()
+    if not db.connect():
+        raise SystemExit("Could not connect to the database")
+    try:
+        code = run(args.verbose)
+    finally:
+        db.disconnect()
+    sys.exit(code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Seed a local Postgres with benchmark users, collections and cards.
+
+Users are named ``bench_00000``, ``bench_00001``, ... and share one password.
+Re-running first deletes every existing ``bench_`` user, so a run always
+starts from the same data. Cards come from the same synthetic catalogue the
+stub upstream serves.
+
+    python -m benchmarks.seed --users 200 --collections-per-user 3 --cards-per-collection 150 \
+        --large-collection-cards 20000
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.fixtures import Catalogue, BENCH_USER_PREFIX, bench_username
+from db_connection import get_db_connection, DatabaseConnection
+from migrations import migrate
+from passwords import hash_password, PASSWORD_CONFIG
+
+def card_rows(cards, collection_id: int, rng: random.Random):
+    """Rows for the cards table, one per distinct card"""
+    rows = []
+    for card in cards:
+        fields = DatabaseConnection.card_fields(card)
+        rows.append((fields['pokemon_card_id'], fields['name'], fields['set_name'], fields['series'],
+                     fields['image_url'], fields['price'], rng.randint(1, 4), collection_id))
+    return rows
+
+def seed(users: int, collections_per_user: int, cards_per_collection: int, large_collection_cards: int,
+         password: str, rounds: int, catalogue: Catalogue, seed_value: int = 3) -> dict:
+    """Replace all benchmark users with a fresh, deterministic data set"""
+    rng = random.Random(seed_value)
+    db = get_db_connection()
+    password_hash = hash_password(password, rounds=rounds)
+    started = time.perf_counter()
+
+    with db.transaction() as tx:
+        # Collections and cards go with their users through ON DELETE CASCADE
+        removed = tx.execute("DELETE FROM users WHERE username LIKE %s", (f"{BENCH_USER_PREFIX}%",))
+
+        user_ids = [row[0] for row in tx.execute_values(
+            "INSERT INTO users (username, email, password_hash) VALUES %s RETURNING id",
+            [(bench_username(i), f"{bench_username(i)}@example.test", password_hash) for i in range(users)],
+            page_size=1000, fetch=True
+        )]
+
+        collections = [(user_id, f"Bench Collection {j + 1}", "Seeded for benchmarks")
+                       for user_id in user_ids for j in range(collections_per_user)]
+        collection_ids = [row[0] for row in tx.execute_values(
+            "INSERT INTO collections (user_id, name, description) VALUES %s RETURNING id",
+            collections, page_size=1000, fetch=True
+        )]
+
+        large_collection_id = None
+        if large_collection_cards and user_ids:
+            large_collection_id = tx.fetch_one(
+                "INSERT INTO collections (user_id, name, description) VALUES (%s, %s, %s) RETURNING id",
+                (user_ids[0], "Bench Large Collection", "Seeded for large collection reads"),
+                as_tuples=True
+            )[0]
+
+        insert_cards = """
+            INSERT INTO cards (pokemon_card_id, name, set_name, series, image_url, price, quantity, collection_id)
+            VALUES %s
+        """
+        cards_inserted = 0
+        for collection_id in collection_ids:
+            picked = rng.sample(catalogue.cards, min(cards_per_collection, len(catalogue.cards)))
+            tx.execute_values(insert_cards, card_rows(picked, collection_id, rng), page_size=1000)
+            cards_inserted += len(picked)
+        if large_collection_id is not None:
+            picked = rng.sample(catalogue.cards, min(large_collection_cards, len(catalogue.cards)))
+            tx.execute_values(insert_cards, card_rows(picked, large_collection_id, rng), page_size=1000)
+            cards_inserted += len(picked)
+
+    return {
+        "removed_users": removed,
+        "users": len(user_ids),
+        "collections": len(collection_ids) + (1 if large_collection_id else 0),
+        "cards": cards_inserted,
+        "large_collection_id": large_collection_id,
+        "elapsed_s": round(time.perf_counter() - started, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed Postgres with benchmark users, collections and cards")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--collections-per-user", type=int, default=2)
+    parser.add_argument("--cards-per-collection", type=int, default=100)
+    parser.add_argument("--large-collection-cards", type=int, default=5000,
+                        help="Cards in one extra collection owned by the first user; 0 to skip")
+    parser.add_argument("--password", default="bench-password", help="Password shared by every benchmark user")
+    parser.add_argument("--rounds", type=int, default=PASSWORD_CONFIG['rounds'], help="bcrypt work factor for the seeded hash")
+    parser.add_argument("--sets", type=int, default=40, help="Synthetic sets; must match the stub upstream")
+    parser.add_argument("--cards-per-set", type=int, default=150, help="Cards per set; must match the stub upstream")
+    args = parser.parse_args()
+
+    db = get_db_connection()
+    db.connect()
+    try:
+        migrate(db)
+        result = seed(args.users, args.collections_per_user, args.cards_per_collection, args.large_collection_cards,
+                      args.password, args.rounds, Catalogue(args.sets, args.cards_per_set))
+    finally:
+        db.disconnect()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
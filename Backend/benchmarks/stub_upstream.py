@@ -0,0 +1,187 @@
+"""Local stand-in for the Pokemon TCG API.
+
+Serves ``/cards``, ``/cards/{id}`` and ``/sets`` from the synthetic catalogue
+in benchmarks.fixtures, with configurable latency and error rates, so the API
+can be benchmarked entirely offline. Point the API at it with
+
+    python -m benchmarks.stub_upstream --port 8765 --latency-ms 120 --error-rate 0.01
+    POKEMON_API_BASE_URL=http://127.0.0.1:8765 POKEMON_DB_API_KEY=stub uvicorn api:app --port 5001
+
+Request counts are served at ``/_stats`` so a workload can report how many
+upstream calls it caused.
+"""
+import argparse
+import fnmatch
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.fixtures import Catalogue
+
+_TERM_RE = re.compile(r'(-?)([\w.]+):("[^"]*"|\S+)')
+
+FIELDS: Dict[str, Callable[[dict], str]] = {
+    "id": lambda card: card["id"],
+    "name": lambda card: card["name"],
+    "set.id": lambda card: card["set"]["id"],
+    "set.name": lambda card: card["set"]["name"],
+    "set.series": lambda card: card["set"]["series"],
+    "rarity": lambda card: card["rarity"]
+}
+
+def _value_matches(actual: str, wanted: str) -> bool:
+    actual = actual.lower()
+    wanted = wanted.strip('"').lower()
+    if '*' in wanted:
+        return fnmatch.fnmatchcase(actual, wanted)
+    return re.search(rf"\b{re.escape(wanted)}\b", actual) is not None
+
+def compile_query(query: str) -> Callable[[dict], bool]:
+    """Tiny subset of the upstream query language: field:value terms, AND-ed, with OR between groups"""
+    groups = []
+    for group in re.split(r"\s+OR\s+", query.strip()):
+        terms = []
+        for negate, field, value in _TERM_RE.findall(group.strip("() ")):
+            getter = FIELDS.get(field)
+            if getter is not None:
+                terms.append((negate == '-', getter, value))
+        groups.append(terms)
+
+    def matches(card: dict) -> bool:
+        return any(
+            all(_value_matches(getter(card), value) != negate for negate, getter, value in terms)
+            for terms in groups
+        )
+    return matches
+
+def page_of(items: List[dict], params: Dict[str, List[str]]) -> dict:
+    page = max(1, int(params.get("page", ["1"])[0]))
+    page_size = max(1, min(250, int(params.get("pageSize", ["250"])[0])))
+    data = items[(page - 1) * page_size:page * page_size]
+    return {"data": data, "page": page, "pageSize": page_size, "count": len(data), "totalCount": len(items)}
+
+class StubState:
+    """Catalogue plus the knobs and counters shared by request handler threads"""
+
+    def __init__(self, catalogue: Catalogue, latency_ms: float, jitter: float, error_rate: float,
+                 rate_limit_rate: float, seed: int = 11):
+        self.catalogue = catalogue
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+
+    def count(self, route: str):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def delay(self) -> float:
+        with self.lock:
+            spread = self.latency_ms * self.jitter
+            return max(0.0, self.rng.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000
+
+    def failure(self):
+        """Status code to fail this request with, or None"""
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+def make_handler(state: StubState):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body: dict, headers: Dict[str, str] = None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            path = url.path.rstrip("/")
+
+            if path == "/_stats":
+                with state.lock:
+                    self.send_json(200, {"requests": dict(state.requests)})
+                return
+
+            route = "/cards/{id}" if path.startswith("/cards/") else path
+            state.count(route)
+            time.sleep(state.delay())
+
+            failure = state.failure()
+            if failure == 429:
+                self.send_json(429, {"error": {"message": "Rate limit exceeded"}}, {"Retry-After": "1"})
+                return
+            if failure is not None:
+                self.send_json(failure, {"error": {"message": "Stub failure"}})
+                return
+
+            if path == "/cards":
+                matches = compile_query(params.get("q", [""])[0])
+                self.send_json(200, page_of([card for card in state.catalogue.cards if matches(card)], params))
+            elif route == "/cards/{id}":
+                card = state.catalogue.card(path[len("/cards/"):])
+                if card is None:
+                    self.send_json(404, {"error": {"message": "Not found"}})
+                else:
+                    self.send_json(200, {"data": card})
+            elif path == "/sets":
+                self.send_json(200, page_of(state.catalogue.sets, params))
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+    return StubHandler
+
+def start_stub(host: str = "127.0.0.1", port: int = 8765, catalogue: Catalogue = None, latency_ms: float = 0.0,
+               jitter: float = 0.5, error_rate: float = 0.0, rate_limit_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Serve the stub on a daemon thread and return the server; call ``shutdown()`` to stop it"""
+    state = StubState(catalogue or Catalogue(), latency_ms, jitter, error_rate, rate_limit_rate)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Pokemon TCG API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sets", type=int, default=40, help="Synthetic sets in the catalogue")
+    parser.add_argument("--cards-per-set", type=int, default=150, help="Cards in each synthetic set")
+    parser.add_argument("--latency-ms", type=float, default=120.0, help="Mean added latency per request")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency spread as a fraction of the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    catalogue = Catalogue(args.sets, args.cards_per_set)
+    server = start_stub(args.host, args.port, catalogue, args.latency_ms, args.jitter, args.error_rate,
+                        args.rate_limit_rate)
+    print(f"Stub upstream serving {len(catalogue.cards)} cards on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Scripted workloads against a running API.
+
+Expects the API to be pointed at the stub upstream and the database to be
+seeded with benchmarks.seed (see the README). Each workload reports p50, p95
+and p99 latency and requests per second per endpoint, plus how many upstream
+calls it caused when ``--stub-url`` is given.
+
+    python -m benchmarks.workloads --url http://localhost:5001 --stub-url http://127.0.0.1:8765 \
+        --output results/$(date +%Y%m%d-%H%M).json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import summarize, run_metadata
+from benchmarks.fixtures import Catalogue, POKEMON_NAMES, bench_username
+
+WORKLOADS = ["search_storm", "login_burst", "add_card_stream", "large_collection_read", "batch_card_lookup"]
+
+class Recorder:
+    """Latencies and status codes per endpoint label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        await response.aread()
+        elapsed = time.perf_counter() - started
+
+        statuses = self.statuses.setdefault(label, {})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.is_success:
+            self.latencies.setdefault(label, []).append(elapsed)
+        return response
+
+    def results(self, elapsed: float) -> List[dict]:
+        results = []
+        for label, statuses in self.statuses.items():
+            failed = sum(count for code, count in statuses.items() if code >= 300)
+            result = summarize(label, self.latencies.get(label, []), elapsed, rejected=failed)
+            result["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+            results.append(result)
+        return results
+
+async def drive(worker: Callable[[int], Awaitable], count: int, concurrency: int) -> float:
+    """Run ``worker(i)`` for i in range(count) with at most ``concurrency`` outstanding"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                await worker(i)
+            except httpx.HTTPError:
+                pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return time.perf_counter() - started
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> Dict[str, str]:
+    response = await client.post("/api/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def search_storm(client, recorder, args, catalogue, rng):
+    """Name searches with a skewed popularity distribution, as a busy search box produces"""
+    terms = [name.lower()[:length] for name in POKEMON_NAMES for length in (3, 5)] + [name.lower() for name in POKEMON_NAMES]
+    weights = [1 / (rank + 1) for rank in range(len(terms))]
+
+    async def one(i):
+        term = rng.choices(terms, weights)[0]
+        params = {"q": term, "page": rng.choice([1, 1, 1, 2, 3]), "pageSize": 20}
+        await recorder.request(client, "GET /api/search", "GET", "/api/search", params=params)
+
+    return await drive(one, args.requests, args.concurrency)
+
+async def login_burst(client, recorder, args, catalogue, rng):
+    """Concurrent logins spread across the seeded users"""
+    async def one(i):
+        body = {"username": bench_username(i % args.users), "password": args.password}
+        await recorder.request(client, "POST /api/auth/login", "POST", "/api/auth/login", json=body)
+
+    return await drive(one, args.requests, args.concurrency)
+
+async def add_card_stream(client, recorder, args, catalogue, rng):
+    """Single-card adds into the collections of a handful of users"""
+    targets = []
+    for index in range(min(args.users, 8)):
+        auth = await login(client, bench_username(index), args.password)
+        collections = (await client.get("/api/collections", headers=auth)).json()
+        targets.extend((auth, collection["id"]) for collection in collections)
+    if not targets:
+        raise RuntimeError("No seeded collections found; run benchmarks.seed first")
+
+    async def one(i):
+        auth, collection_id = rng.choice(targets)
+        await recorder.request(client, "POST /api/collection/{id}/add-card", "POST",
+                               f"/api/collection/{collection_id}/add-card",
+                               json=rng.choice(catalogue.cards), headers=auth)
+
+    return await drive(one, args.requests, args.concurrency)
+
+async def large_collection_read(client, recorder, args, catalogue, rng):
+    """Full, paged and streamed reads of the first user's largest collection"""
+    auth = await login(client, bench_username(0), args.password)
+    collections = (await client.get("/api/collections", params={"include_totals": "true"}, headers=auth)).json()
+    if not collections:
+        raise RuntimeError("No seeded collections found; run benchmarks.seed first")
+    collection_id = max(collections, key=lambda collection: collection["card_count"])["id"]
+    base = f"/api/collection/{collection_id}"
+
+    async def one(i):
+        mode = i % 3
+        if mode == 0:
+            await recorder.request(client, "GET /api/collection/{id}", "GET", base, headers=auth)
+        elif mode == 1:
+            await recorder.request(client, "GET /api/collection/{id}/stream", "GET", f"{base}/stream", headers=auth)
+        else:
+            cursor = None
+            while True:
+                params = {"limit": 500, **({"cursor": cursor} if cursor else {})}
+                response = await recorder.request(client, "GET /api/collection/{id}?limit=500", "GET", base,
+                                                  params=params, headers=auth)
+                cursor = response.json().get("next_cursor") if response.is_success else None
+                if not cursor:
+                    break
+
+    return await drive(one, args.reads, args.read_concurrency)
+
+async def batch_card_lookup(client, recorder, args, catalogue, rng):
+    """Binder-page sized batch lookups, mixing catalogue ids with a few unknown ones"""
+    async def one(i):
+        ids = [card["id"] for card in rng.sample(catalogue.cards, args.batch_ids)]
+        ids[:2] = [f"missing{i}-1", f"missing{i}-2"]
+        await recorder.request(client, "POST /api/cards/batch", "POST", "/api/cards/batch", json={"ids": ids})
+
+    return await drive(one, args.reads, args.read_concurrency)
+
+async def upstream_requests(stub_url: Optional[str]) -> Optional[Dict[str, int]]:
+    if not stub_url:
+        return None
+    async with httpx.AsyncClient(base_url=stub_url, timeout=10) as stub:
+        return (await stub.get("/_stats")).json()["requests"]
+
+def request_delta(before: Optional[dict], after: Optional[dict]) -> Optional[dict]:
+    if before is None or after is None:
+        return None
+    return {route: count - before.get(route, 0) for route, count in after.items() if count != before.get(route, 0)}
+
+async def run(args) -> List[dict]:
+    catalogue = Catalogue(args.sets, args.cards_per_set)
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.read_concurrency) + 8)
+    results = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        for name in args.workload:
+            rng = random.Random(args.seed)
+            recorder = Recorder()
+            before = await upstream_requests(args.stub_url)
+            elapsed = await globals()[name](client, recorder, args, catalogue, rng)
+            after = await upstream_requests(args.stub_url)
+            results.append({
+                "workload": name,
+                "elapsed_s": round(elapsed, 3),
+                "endpoints": recorder.results(elapsed),
+                "upstream_requests": request_delta(before, after)
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scripted workloads against a running BinderBuilder API")
+    parser.add_argument("--url", default="http://localhost:5001", help="API base URL")
+    parser.add_argument("--stub-url", help="Stub upstream base URL, to count upstream calls per workload")
+    parser.add_argument("--workload", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per search, login and add-card workload")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests outstanding at once")
+    parser.add_argument("--reads", type=int, default=30, help="Requests in the large collection and batch lookup workloads")
+    parser.add_argument("--read-concurrency", type=int, default=4,
+                        help="Large collection reads or batch lookups outstanding at once")
+    parser.add_argument("--batch-ids", type=int, default=100, help="Card ids per batch lookup")
+    parser.add_argument("--users", type=int, default=100, help="Seeded users to log in as")
+    parser.add_argument("--password", default="bench-password", help="Seeded users' password")
+    parser.add_argument("--sets", type=int, default=40, help="Synthetic sets; must match the stub upstream")
+    parser.add_argument("--cards-per-set", type=int, default=150, help="Cards per set; must match the stub upstream")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for request mixes")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("password", "output")}
+    report = {**run_metadata("workloads", config), "results": asyncio.run(run(args))}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from dotenv import load_dotenv
+from fast_json import dumps, loads
+
+# Load environment variables
+load_dotenv()
+
+CACHE_CONFIG = {
+    'card_ttl': float(os.getenv('CARD_CACHE_TTL', '86400')),
+    'card_max_bytes': int(os.getenv('CARD_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    'search_ttl': float(os.getenv('SEARCH_CACHE_TTL', '3600')),
+    'search_max_bytes': int(os.getenv('SEARCH_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    'user_ttl': float(os.getenv('USER_CACHE_TTL', '60')),
+    'user_max_entries': int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000')),
+    'completion_ttl': float(os.getenv('SET_COMPLETION_CACHE_TTL', '3600')),
+    'completion_max_bytes': int(os.getenv('SET_COMPLETION_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+}
+
+_MISSING = object()
+
+def estimate_size(value: Any) -> int:
+    """Approximate the memory held by a JSON-like value by its serialized length"""
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+class CachedBody:
+    """An encoded JSON response body cached with its strong ETag.
+
+    The encoded bytes are what gets served, so cache hits never re-serialize.
+    The decoded form is kept when the body was built from Python data and is
+    otherwise parsed on first use.
+    """
+
+    __slots__ = ('raw', 'etag', '_data')
+
+    def __init__(self, raw: bytes, data: Any = _MISSING):
+        self.raw = raw
+        self.etag = '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+        self._data = data
+
+    @classmethod
+    def from_data(cls, data: Any) -> "CachedBody":
+        return cls(dumps(data), data)
+
+    @property
+    def data(self) -> Any:
+        if self._data is _MISSING:
+            self._data = loads(self.raw)
+        return self._data
+
+def body_size(value: CachedBody) -> int:
+    # Encoded bytes plus roughly as much again for the decoded objects
+    return 2 * len(value.raw)
+
+class SingleFlight:
+    """Coalesces concurrent async loads of the same key into one loader call.
+
+    The first caller for a key runs the loader and the others await its
+    result. A loader failure is shared with every waiter, but cancellation
+    is not: if the caller running the loader is cancelled, waiters retry and
+    one of them runs the loader in its place.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # A cancelled leader cancels the shared future; only this caller's own cancellation propagates
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case no other caller was waiting on it
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and a memory budget.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or the estimated ``max_bytes`` is exceeded. ``get_or_load`` coalesces
+    concurrent misses on the same key into a single loader call.
+    """
+
+    def __init__(self, name: str, ttl: float, max_bytes: int = 0, max_entries: int = 0,
+                 sizeof: Callable[[Any], int] = estimate_size):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store an entry, evicting least-recently-used entries to stay within budget"""
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._entries and (
+                (self.max_bytes and self._bytes > self.max_bytes)
+                or (self.max_entries and len(self._entries) > self.max_entries)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, calling ``loader`` once for any number of concurrent misses"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        async def load():
+            loaded = await loader()
+            self.set(key, loaded)
+            return loaded
+
+        return await self._flight.run(key, load)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and occupancy for monitoring"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self._flight.coalesced,
+                'inflight': len(self._flight)
+            }
+
+# Card bodies are effectively immutable, search pages carry prices that change daily
+card_cache = TTLCache('cards', ttl=CACHE_CONFIG['card_ttl'], max_bytes=CACHE_CONFIG['card_max_bytes'], sizeof=body_size)
+search_cache = TTLCache('search', ttl=CACHE_CONFIG['search_ttl'], max_bytes=CACHE_CONFIG['search_max_bytes'],
+                        sizeof=body_size)
+
+# Auth lookups are short-lived so changes made by other workers are picked up within the TTL
+user_cache = TTLCache('users', ttl=CACHE_CONFIG['user_ttl'], max_entries=CACHE_CONFIG['user_max_entries'])
+collection_owner_cache = TTLCache('collection_owners', ttl=CACHE_CONFIG['user_ttl'],
+                                  max_entries=CACHE_CONFIG['user_max_entries'])
+
+# Set completion bodies are keyed by collection version and catalog generation, so entries never go stale;
+# the TTL only bounds how long superseded versions linger
+set_completion_cache = TTLCache('set_completion', ttl=CACHE_CONFIG['completion_ttl'],
+                                max_bytes=CACHE_CONFIG['completion_max_bytes'], sizeof=body_size)
+
+# name: terms and their quoted or bare values; upstream name matching ignores case
+NAME_TERM_RE = re.compile(r'(?<![\w.])(name:)("[^"]*"|[^\s()]+)', re.IGNORECASE)
+
+# Quoted phrases, whose spacing is part of what the upstream matches
+QUOTED_RE = re.compile(r'("[^"]*")')
+
+def collapse_whitespace(query: str) -> str:
+    """Collapse runs of whitespace to one space outside quoted phrases, leaving the phrases as given"""
+    parts = QUOTED_RE.split(query)
+    return ''.join(part if index % 2 else re.sub(r'\s+', ' ', part) for index, part in enumerate(parts)).strip()
+
+def search_cache_key(formatted_query: str, page: int, page_size: int) -> tuple:
+    """Normalize a search into a cache key: whitespace-collapsed query with name terms case-folded, plus paging.
+
+    Everything else is kept as given, since ids, set ids, operators and spacing inside quotes matter upstream.
+    """
+    query = NAME_TERM_RE.sub(lambda m: m.group(1).lower() + m.group(2).casefold(), collapse_whitespace(formatted_query))
+    return (query, page, page_size)
+
+def card_cache_key(card_id: str) -> str:
+    """Normalize a card id into a cache key (ids are case-sensitive upstream)"""
+    return card_id.strip()
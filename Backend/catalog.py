@@ -0,0 +1,301 @@
+import asyncio
+import os
+import re
+import time
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+import psycopg2
+from psycopg2.extras import Json
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from db_connection import get_db_connection
+from upstream import get_upstream_client
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SYNC_INTERVAL_HOURS = float(os.getenv('CATALOG_SYNC_INTERVAL_HOURS', '24'))
+CATALOG_SYNC_CONCURRENCY = int(os.getenv('CATALOG_SYNC_CONCURRENCY', '4'))
+
+# Largest page the upstream API serves
+UPSTREAM_PAGE_SIZE = 250
+
+# Advisory lock key so only one worker syncs the catalog at a time
+SYNC_LOCK_KEY = 0x42420001
+
+# How long a "catalog is populated" answer is trusted before asking Postgres again
+READY_CHECK_TTL = 60.0
+
+# One search term: optional exact-match bang, a supported field, then a quoted phrase or bare value
+_TERM_RE = re.compile(r'(!?)(name|set\.name|set\.series|set\.id):("[^"]*"|[^\s"()]+)')
+
+_ready_state = {'ready': False, 'generation': 0, 'checked_at': 0.0}
+
+def _like_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _term_clause(column: str, value: str, exact: bool) -> Optional[Tuple[str, list]]:
+    """Translate one field:value term into a SQL condition on ``column``"""
+    quoted = value.startswith('"')
+    if quoted:
+        value = value[1:-1]
+    value = value.strip().lower()
+    if not value or '?' in value:
+        return None
+
+    if exact:
+        if '*' in value:
+            return None
+        return f"lower({column}) = %s", [value]
+
+    if not quoted and value.endswith('*') and '*' not in value[:-1]:
+        # Prefix of the whole value or of any word in it, as the upstream matches tokens
+        prefix = _like_escape(value[:-1])
+        if not prefix:
+            return None
+        return f"(lower({column}) LIKE %s OR lower({column}) LIKE %s)", [f"{prefix}%", f"% {prefix}%"]
+
+    if '*' in value:
+        return None
+
+    # Whole-word (or whole-phrase) match anywhere in the value
+    return f"lower({column}) ~ %s", [rf"\m{re.escape(value)}\M"]
+
+def parse_query(query: str) -> Optional[Tuple[str, list]]:
+    """Compile a Pokemon TCG API query into a WHERE clause for the local catalog.
+
+    Only whitespace-separated (implicitly AND-ed) ``name``, ``set.name``,
+    ``set.series`` and ``set.id`` terms are understood. Anything else returns
+    None so the caller can fall back to the upstream API.
+    """
+    clauses = []
+    params = []
+    position = 0
+    for match in _TERM_RE.finditer(query):
+        if query[position:match.start()].strip():
+            return None
+        position = match.end()
+
+        exact, field, value = match.group(1) == '!', match.group(2), match.group(3)
+        if field == 'name':
+            term = _term_clause('name', value, exact)
+        elif field == 'set.id':
+            set_id = value.strip('"').lower()
+            if set_id.endswith('*') and '*' not in set_id[:-1] and not exact:
+                term = ("set_id LIKE %s", [f"{_like_escape(set_id[:-1])}%"])
+            elif '*' in set_id:
+                term = None
+            else:
+                term = ("set_id = %s", [set_id])
+        else:
+            # Set conditions are resolved against the small sets table, then joined by id
+            set_term = _term_clause('name' if field == 'set.name' else 'series', value, exact)
+            term = None
+            if set_term is not None:
+                term = (f"set_id IN (SELECT id FROM catalog_sets WHERE {set_term[0]})", set_term[1])
+
+        if term is None:
+            return None
+        clauses.append(term[0])
+        params.extend(term[1])
+
+    if not clauses or query[position:].strip():
+        return None
+    return " AND ".join(clauses), params
+
+def _check_catalog_state():
+    now = time.monotonic()
+    if now - _ready_state['checked_at'] < READY_CHECK_TTL:
+        return
+
+    try:
+        result = get_db_connection().fetch_one("""
+            SELECT bool_or(upstream_updated_at IS NOT NULL),
+                   COALESCE(EXTRACT(EPOCH FROM MAX(synced_at)), 0)::bigint
+            FROM catalog_sets
+        """, as_tuples=True)
+    except psycopg2.Error as e:
+        logger.error(f"Error checking catalog state: {e}")
+        result = None
+    _ready_state['ready'] = bool(result and result[0])
+    _ready_state['generation'] = result[1] if result else 0
+    _ready_state['checked_at'] = now
+
+def catalog_ready() -> bool:
+    """Whether the local catalog has completed at least one sync"""
+    _check_catalog_state()
+    return _ready_state['ready']
+
+def catalog_generation() -> int:
+    """Changes whenever a sync stores a set, so results derived from the catalog can be keyed on it"""
+    _check_catalog_state()
+    return _ready_state['generation']
+
+def search_local(formatted_query: str, page: int = 1, page_size: int = 20) -> Optional[Dict[str, Any]]:
+    """Answer a search from the local catalog in the upstream's SearchResponse shape.
+
+    Returns None when the query uses syntax the catalog cannot evaluate or the
+    catalog has not been synced yet.
+    """
+    compiled = parse_query(formatted_query)
+    if compiled is None or not catalog_ready():
+        return None
+
+    where, params = compiled
+    page = max(page, 1)
+    page_size = max(1, min(page_size, UPSTREAM_PAGE_SIZE))
+    db = get_db_connection()
+
+    query = f"""
+        SELECT data, COUNT(*) OVER() AS total_count
+        FROM catalog_cards
+        WHERE {where}
+        ORDER BY release_date NULLS LAST, set_id, length(number), number, id
+        LIMIT %s OFFSET %s
+    """
+    rows = db.fetch_all(query, (*params, page_size, (page - 1) * page_size), as_tuples=True)
+
+    if rows:
+        total_count = rows[0][1]
+    elif page > 1:
+        total_count = db.fetch_one(f"SELECT COUNT(*) FROM catalog_cards WHERE {where}", tuple(params), as_tuples=True)[0]
+    else:
+        total_count = 0
+
+    return {
+        "data": [row[0] for row in rows],
+        "page": page,
+        "pageSize": page_size,
+        "count": len(rows),
+        "totalCount": total_count
+    }
+
+def get_cards(card_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Full card objects for whichever of ``card_ids`` the local catalog holds, keyed by id"""
+    rows = get_db_connection().fetch_all(
+        "SELECT id, data FROM catalog_cards WHERE id = ANY(%s)", (list(card_ids),), prepare=True, as_tuples=True
+    )
+    return {card_id: data for card_id, data in rows}
+
+def _parse_date(value: Optional[str]):
+    """Parse the upstream's YYYY/MM/DD dates"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y/%m/%d").date()
+    except ValueError:
+        return None
+
+async def _fetch_all_pages(path: str, params: Dict[str, Any], endpoint: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Page through an upstream listing endpoint"""
+    client = get_upstream_client()
+    items = []
+    page = 1
+    while True:
+        body = await client.get_json(path, params={**params, "page": page, "pageSize": UPSTREAM_PAGE_SIZE},
+                                     endpoint=endpoint)
+        data = body.get("data", [])
+        items.extend(data)
+        if not data or len(items) >= body.get("totalCount", 0):
+            return items
+        page += 1
+
+def _stored_set_versions() -> Dict[str, Optional[str]]:
+    rows = get_db_connection().fetch_all("SELECT id, upstream_updated_at FROM catalog_sets", as_tuples=True)
+    return dict(rows)
+
+def _store_set(card_set: Dict[str, Any], cards: List[Dict[str, Any]]):
+    """Upsert one set's cards, drop cards no longer listed, then mark the set synced"""
+    release_date = _parse_date(card_set.get('releaseDate'))
+    card_rows = [
+        (card['id'], card.get('name', ''), card_set['id'], card_set.get('name'), card_set.get('series'),
+         card.get('number'), card.get('rarity'), release_date, Json(card))
+        for card in cards if card.get('id')
+    ]
+
+    with get_db_connection().transaction() as tx:
+        if card_rows:
+            tx.execute_values("""
+                INSERT INTO catalog_cards (id, name, set_id, set_name, series, number, rarity, release_date, data)
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE SET
+                    name = EXCLUDED.name, set_id = EXCLUDED.set_id, set_name = EXCLUDED.set_name,
+                    series = EXCLUDED.series, number = EXCLUDED.number, rarity = EXCLUDED.rarity,
+                    release_date = EXCLUDED.release_date, data = EXCLUDED.data,
+                    synced_at = CURRENT_TIMESTAMP
+            """, card_rows, page_size=500)
+        # Rows upserted above carry this transaction's timestamp; anything older has left the set
+        tx.execute("DELETE FROM catalog_cards WHERE set_id = %s AND synced_at < CURRENT_TIMESTAMP", (card_set['id'],))
+        # The set row is written last so an interrupted sync retries this set next time
+        tx.execute("""
+            INSERT INTO catalog_sets (id, name, series, printed_total, total, release_date, upstream_updated_at, data,
+                                      roster_size)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE SET
+                name = EXCLUDED.name, series = EXCLUDED.series, printed_total = EXCLUDED.printed_total,
+                total = EXCLUDED.total, release_date = EXCLUDED.release_date,
+                upstream_updated_at = EXCLUDED.upstream_updated_at, data = EXCLUDED.data,
+                roster_size = EXCLUDED.roster_size, synced_at = CURRENT_TIMESTAMP
+        """, (card_set['id'], card_set.get('name', ''), card_set.get('series'), card_set.get('printedTotal'),
+              card_set.get('total'), release_date, card_set.get('updatedAt'), Json(card_set), len(card_rows)))
+
+async def sync_catalog(full: bool = False) -> Dict[str, int]:
+    """Mirror the upstream set and card catalog into Postgres.
+
+    Sets whose upstream ``updatedAt`` is unchanged are skipped unless ``full``
+    is set, so routine runs only page through new or edited sets.
+    """
+    db = get_db_connection()
+    lock = await run_in_threadpool(db.try_advisory_lock, SYNC_LOCK_KEY)
+    if lock is None:
+        logger.info("Catalog sync already running elsewhere, skipping")
+        return {"sets_checked": 0, "sets_synced": 0, "cards_synced": 0}
+
+    try:
+        sets = await _fetch_all_pages("/sets", {"orderBy": "releaseDate"})
+        stored = await run_in_threadpool(_stored_set_versions)
+        stale = [s for s in sets if full or stored.get(s['id']) != s.get('updatedAt')]
+        logger.info(f"Catalog sync: {len(stale)} of {len(sets)} sets need refreshing")
+
+        semaphore = asyncio.Semaphore(CATALOG_SYNC_CONCURRENCY)
+        synced_cards = 0
+
+        async def sync_set(card_set: Dict[str, Any]):
+            nonlocal synced_cards
+            async with semaphore:
+                cards = await _fetch_all_pages("/cards", {"q": f"set.id:{card_set['id']}"}, endpoint="/cards?q=set.id")
+                await run_in_threadpool(_store_set, card_set, cards)
+                synced_cards += len(cards)
+
+        await asyncio.gather(*(sync_set(s) for s in stale))
+        _ready_state['checked_at'] = 0.0
+        logger.info(f"Catalog sync completed: {len(stale)} sets, {synced_cards} cards")
+        return {"sets_checked": len(sets), "sets_synced": len(stale), "cards_synced": synced_cards}
+    finally:
+        await run_in_threadpool(db.release_advisory_lock, lock, SYNC_LOCK_KEY)
+
+async def run_periodic_sync(interval_hours: float = CATALOG_SYNC_INTERVAL_HOURS):
+    """Keep the catalog current, syncing once at startup and then every ``interval_hours``"""
+    while True:
+        try:
+            await sync_catalog()
+        except Exception as e:
+            logger.error(f"Catalog sync failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+if __name__ == "__main__":
+    # Run a one-off sync when invoked directly
+    import sys
+
+    async def main():
+        get_db_connection().connect()
+        try:
+            print(await sync_catalog(full='--full' in sys.argv))
+        finally:
+            await get_upstream_client().close()
+            get_db_connection().disconnect()
+
+    asyncio.run(main())
@@ -0,0 +1,402 @@
+import csv
+import io
+import json
+import os
+import queue
+import tempfile
+import threading
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from db_connection import get_db_connection, DatabaseConnection
+from upstream import fetch_cards_by_ids
+from quota import QuotaExhausted, PRIORITY_INTERACTIVE
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CONFIG = {
+    'max_bytes': int(os.getenv('IMPORT_MAX_BYTES', str(50 * 1024 * 1024))),
+    'max_rows': int(os.getenv('IMPORT_MAX_ROWS', '100000')),
+    'resolve_batch_size': int(os.getenv('IMPORT_RESOLVE_BATCH_SIZE', '1000')),
+    'spool_bytes': int(os.getenv('IMPORT_SPOOL_BYTES', str(1024 * 1024)))
+}
+
+# Upload media types and the format each is parsed as
+IMPORT_MEDIA_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson'
+}
+
+# Accepted header names, so exports from other trackers import without editing
+ID_COLUMNS = ('pokemon_card_id', 'card_id', 'id')
+QUANTITY_COLUMNS = ('quantity', 'qty', 'count')
+
+# Row errors listed in an import report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Columns written to the staging table, in COPY order
+STAGING_COLUMNS = ('pokemon_card_id', 'name', 'set_name', 'series', 'image_url', 'price', 'quantity')
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_QUERY = """
+    COPY (
+        SELECT pokemon_card_id, name, set_name, series, image_url, price, quantity, added_at
+        FROM cards
+        WHERE collection_id = %s
+        ORDER BY added_at, id
+    ) TO STDOUT WITH (FORMAT csv, HEADER)
+"""
+
+class TransferError(Exception):
+    """Raised when an import cannot be read or completed"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def import_format(content_type: Optional[str], requested: Optional[str] = None) -> str:
+    """Pick the upload format from an explicit choice or the request's Content-Type"""
+    if requested:
+        return requested
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type not in IMPORT_MEDIA_TYPES:
+        raise TransferError("Send text/csv, application/json or application/x-ndjson, or pass format", 415)
+    return IMPORT_MEDIA_TYPES[media_type]
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_bytes: int = IMPORT_CONFIG['max_bytes']):
+    """Copy a request body into a temporary file that spills to disk past IMPORT_SPOOL_BYTES"""
+    upload = tempfile.SpooledTemporaryFile(max_size=IMPORT_CONFIG['spool_bytes'])
+    total = 0
+    try:
+        async for chunk in chunks:
+            total += len(chunk)
+            if total > max_bytes:
+                raise TransferError(f"Imports are limited to {max_bytes} bytes", 413)
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
+
+def iter_json_array(stream, chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Only the unread tail of the document and the element being decoded are
+    held in memory, so arbitrarily long arrays parse in constant space.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        eof = not chunk
+
+    expect = '['
+    while True:
+        # Skip whitespace, reading more of the document as needed
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            fill()
+        if position >= len(buffer):
+            raise TransferError("JSON import ended before its closing ]")
+
+        char = buffer[position]
+        if expect == '[':
+            if char != '[':
+                raise TransferError("JSON imports must be an array of cards")
+            position += 1
+            expect = 'first'
+            continue
+        if char == ']' and expect in ('first', ','):
+            return
+        if expect == ',':
+            if char != ',':
+                raise TransferError("Malformed JSON import: expected , or ]")
+            position += 1
+            expect = 'value'
+            continue
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise TransferError(f"Malformed JSON import: {e.msg}")
+                fill()
+                continue
+            # A number ending exactly at the buffer edge may continue in the next chunk
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            break
+        position = end
+        expect = ','
+        yield value
+
+def iter_records(upload, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (row number, record) pairs from a spooled upload"""
+    stream = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for record in reader:
+                yield reader.line_num, record
+        elif fmt == 'ndjson':
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise TransferError(f"Malformed JSON on line {line_number}: {e.msg}")
+        else:
+            for index, record in enumerate(iter_json_array(stream), 1):
+                yield index, record
+    except UnicodeDecodeError:
+        raise TransferError("Imports must be UTF-8 encoded")
+    except csv.Error as e:
+        raise TransferError(f"Malformed CSV import: {e}")
+    finally:
+        # Leave the spooled file open for its owner to close
+        stream.detach()
+
+def parse_record(record: Any) -> Tuple[str, int]:
+    """Pull a card id and quantity out of one imported record"""
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object with a card id")
+
+    card_id = next((str(record[column]).strip() for column in ID_COLUMNS
+                    if record.get(column) not in (None, '')), '')
+    if not card_id:
+        raise ValueError("Missing card id")
+
+    raw_quantity = next((record[column] for column in QUANTITY_COLUMNS
+                         if record.get(column) not in (None, '')), 1)
+    try:
+        quantity = int(str(raw_quantity).strip())
+    except ValueError:
+        raise ValueError(f"Invalid quantity {raw_quantity!r}")
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1")
+    return card_id, quantity
+
+def lookup_catalog(card_ids: Iterable[str]) -> Dict[str, tuple]:
+    """Card columns for ids found in the local catalog mirror"""
+    query = """
+        SELECT id, name, set_name, series, data->'images'->>'small',
+               (data->'cardmarket'->'prices'->>'averageSellPrice')::numeric
+        FROM catalog_cards
+        WHERE id = ANY(%s)
+    """
+    rows = get_db_connection().fetch_all(query, (list(card_ids),), as_tuples=True)
+    return {row[0]: row[1:] for row in rows}
+
+async def resolve_cards(card_ids: List[str], failed: Dict[str, Exception]) -> Dict[str, tuple]:
+    """Card columns for a batch of ids: the local catalog first, then one upstream search per chunk.
+
+    Lookups run at interactive priority since a user is waiting on the
+    upload. Ids from a chunk the upstream could not serve are recorded in
+    ``failed`` with the error rather than failing the whole import.
+    """
+    resolved = await run_in_threadpool(lookup_catalog, card_ids)
+    missing = [card_id for card_id in card_ids if card_id not in resolved]
+    if missing:
+        fetched = await fetch_cards_by_ids(missing, priority=PRIORITY_INTERACTIVE, failed=failed)
+        for card_id, card in fetched.items():
+            fields = DatabaseConnection.card_fields(card)
+            resolved[card_id] = (fields['name'], fields['set_name'], fields['series'],
+                                 fields['image_url'], fields['price'])
+    return resolved
+
+def lookup_error_message(error: Exception) -> str:
+    """Row error for a card id whose upstream lookup failed"""
+    if isinstance(error, QuotaExhausted):
+        return f"Card lookups are temporarily rate limited, retry in {error.retry_after}s"
+    return "Card lookup failed upstream"
+
+def copy_text(value: Any) -> str:
+    """Encode one value as a field of Postgres COPY text format"""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def merge_staged(collection_id: int, staged, mode: str) -> Tuple[int, int]:
+    """COPY staged rows into a temporary table and merge them into cards with one upsert.
+
+    Returns (inserted, updated) card counts. Rows for the same card are summed
+    first; ``mode`` ``add`` adds to existing quantities and ``set`` replaces them.
+    """
+    quantity = "cards.quantity + EXCLUDED.quantity" if mode == 'add' else "EXCLUDED.quantity"
+    upsert = f"""
+        WITH upserted AS (
+            INSERT INTO cards (pokemon_card_id, name, set_name, series, image_url, price, quantity, collection_id)
+            SELECT pokemon_card_id, MAX(name), MAX(set_name), MAX(series), MAX(image_url), MAX(price),
+                   SUM(quantity)::integer, %s
+            FROM import_staging
+            GROUP BY pokemon_card_id
+            ON CONFLICT (pokemon_card_id, collection_id)
+            DO UPDATE SET quantity = {quantity}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+        FROM upserted
+    """
+    with get_db_connection().transaction() as tx:
+        # Same column types as cards, without its constraints or id sequence
+        tx.execute(f"""
+            CREATE TEMP TABLE import_staging ON COMMIT DROP AS
+            SELECT {', '.join(STAGING_COLUMNS)} FROM cards WITH NO DATA
+        """)
+        tx.copy_from(f"COPY import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN", staged)
+        inserted, updated = tx.fetch_one(upsert, (collection_id,), as_tuples=True)
+    return inserted, updated
+
+def _next_batch(records: Iterator[Tuple[int, Any]], size: int) -> List[Tuple[int, Any]]:
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+    return batch
+
+async def import_collection(collection_id: int, upload, fmt: str, mode: str = 'add') -> Dict[str, Any]:
+    """Import a spooled CSV, JSON or NDJSON upload into a collection.
+
+    Records are parsed and resolved in batches of IMPORT_RESOLVE_BATCH_SIZE and
+    written to a second spooled file in COPY format, so memory stays flat
+    however long the upload is. Nothing is written to ``cards`` until every
+    record has been read; the merge is then one transaction.
+    """
+    report = {"collection_id": collection_id, "format": fmt, "mode": mode,
+              "rows": 0, "staged": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def fail(row: int, card_id: Optional[str], message: str):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row, "pokemon_card_id": card_id, "message": message})
+
+    records = iter_records(upload, fmt)
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=IMPORT_CONFIG['spool_bytes']) as staged:
+            while True:
+                batch = await run_in_threadpool(_next_batch, records, IMPORT_CONFIG['resolve_batch_size'])
+                if not batch:
+                    break
+                report["rows"] += len(batch)
+                if report["rows"] > IMPORT_CONFIG['max_rows']:
+                    raise TransferError(f"Imports are limited to {IMPORT_CONFIG['max_rows']} rows", 413)
+
+                parsed = []
+                for row, record in batch:
+                    try:
+                        parsed.append((row, *parse_record(record)))
+                    except ValueError as e:
+                        fail(row, None, str(e))
+
+                lookup_failed: Dict[str, Exception] = {}
+                resolved = await resolve_cards(list({card_id for _, card_id, _ in parsed}), lookup_failed)
+                lines = []
+                for row, card_id, quantity in parsed:
+                    fields = resolved.get(card_id)
+                    if fields is None and card_id in lookup_failed:
+                        fail(row, card_id, lookup_error_message(lookup_failed[card_id]))
+                        continue
+                    if fields is None or not fields[0]:
+                        fail(row, card_id, "Unknown card id")
+                        continue
+                    lines.append("\t".join(copy_text(value) for value in (card_id, *fields, quantity)) + "\n")
+                staged.write("".join(lines).encode('utf-8'))
+                report["staged"] += len(lines)
+
+            if report["staged"]:
+                staged.seek(0)
+                report["inserted"], report["updated"] = await run_in_threadpool(merge_staged, collection_id, staged, mode)
+    finally:
+        records.close()
+
+    logger.info(f"Imported {report['staged']} of {report['rows']} rows into collection {collection_id}")
+    return report
+
+class _QueueWriter:
+    """File-like COPY target that hands output to a consumer thread in bounded chunks"""
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event, chunk_size: int):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def write(self, data):
+        if self.cancelled.is_set():
+            # The client went away; let COPY drain so the connection is left clean
+            return
+        self.buffer += data.encode('utf-8') if isinstance(data, str) else data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+    def put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+_DONE = object()
+
+def iter_export_csv(collection_id: int, chunk_size: int = EXPORT_CHUNK_SIZE, buffered_chunks: int = 8) -> Iterator[bytes]:
+    """Stream a collection as CSV straight from ``COPY ... TO STDOUT``.
+
+    COPY runs on its own thread and pool connection and blocks once
+    ``buffered_chunks`` chunks are waiting, so a slow client holds back the
+    query instead of the export piling up in memory.
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=buffered_chunks)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled, chunk_size)
+
+    def produce():
+        try:
+            with get_db_connection().transaction() as tx:
+                tx.copy_to(EXPORT_QUERY, (collection_id,), writer)
+            writer.flush()
+        except Exception as e:
+            logger.error(f"Error exporting collection {collection_id}: {e}")
+            writer.put(e)
+        finally:
+            writer.put(_DONE)
+
+    threading.Thread(target=produce, name=f"export-{collection_id}", daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
@@ -1,9 +1,20 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+import psycopg2.pool
+from psycopg2.extras import RealDictCursor, execute_values
 import os
-from typing import Optional, Dict, Any, List
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Hashable, Iterator, List, Sequence, Union
+import hashlib
+import re
+from functools import lru_cache
 import logging
 from dotenv import load_dotenv
+from metrics import DB_QUERY_SECONDS, DB_QUERY_ERRORS, debug_sampled
 
 # Load environment variables
 load_dotenv()
@@ -20,83 +31,668 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'splitgoat')
 }
 
+# Connection pool configuration
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '20')),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+    'health_check_after': float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30'))
+}
+
+# Optional read replicas; reads opt in per call and fall back to the primary
+REPLICA_CONFIG = {
+    'dsns': [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()],
+    'min_size': int(os.getenv('DB_REPLICA_POOL_MIN_SIZE', '1')),
+    'max_size': int(os.getenv('DB_REPLICA_POOL_MAX_SIZE', '20')),
+    'connect_timeout': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '3')),
+    'max_lag': float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+    'check_interval': float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),
+    'pin_seconds': float(os.getenv('DB_PRIMARY_PIN_SECONDS', '10'))
+}
+
+# Replay lag in seconds, or 0 when everything received has been replayed (an idle primary is not lag)
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+"""
+
+Row = Union[Dict[str, Any], tuple]
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements it has prepared"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available before the checkout timeout"""
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Each checkout hands a caller its own connection, so concurrent requests no
+    longer share one socket and cursor. Connections that have been idle for a
+    while are health-checked before reuse, and connections older than
+    ``max_lifetime`` are recycled.
+    """
+
+    def __init__(self, config: Dict[str, Any], min_size: int = 2, max_size: int = 20,
+                 timeout: float = 5.0, max_lifetime: float = 1800.0, health_check_after: float = 30.0):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        # Idle connections as (connection, created_at, last_used) tuples
+        self._idle = deque()
+        self._created_at: Dict[int, float] = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+    def open(self):
+        """Create the minimum number of connections up front"""
+        for _ in range(self.min_size):
+            conn = self._new_connection()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, self._created_at[id(conn)], time.monotonic()))
+
+    def _new_connection(self):
+        conn = psycopg2.connect(**self.config, connection_factory=PooledConnection)
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_healthy(self, conn, created_at: float, last_used: float) -> bool:
+        """Check whether an idle connection can be handed out again"""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used > self.health_check_after:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds for one to free up"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                entry = None
+                while True:
+                    if self._closed:
+                        raise psycopg2.pool.PoolError("connection pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if entry is None:
+                # A slot was reserved for a brand new connection
+                try:
+                    return self._new_connection()
+                except psycopg2.Error:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            conn, created_at, last_used = entry
+            if self._is_healthy(conn, created_at, last_used):
+                return conn
+
+            # Stale or broken connection: drop it and try again with its slot released
+            logger.info("Recycling stale database connection")
+            self._discard(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if not discard and not conn.closed:
+            try:
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, self._created_at.get(id(conn), time.monotonic()), time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except BaseException:
+            self.putconn(conn, discard=conn.closed)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self) -> Dict[str, int]:
+        """Current pool occupancy"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size
+            }
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._discard(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+def replica_name(dsn: str) -> str:
+    """host:port/dbname for a DSN, without its credentials"""
+    params = psycopg2.extensions.parse_dsn(dsn)
+    return f"{params.get('host', 'localhost')}:{params.get('port', '5432')}/{params.get('dbname', '')}"
+
+class Replica:
+    """A read replica's connection pool and the result of its last health check"""
+
+    def __init__(self, dsn: str, pool_config: Dict[str, Any], connect_timeout: int = 3):
+        self.name = replica_name(dsn)
+        self.pool = ConnectionPool({'dsn': dsn, 'connect_timeout': connect_timeout}, **pool_config)
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self.error: Optional[str] = None
+        self.reads = 0
+        self.failures = 0
+        self._warmed = False
+
+    def check(self, max_lag: float):
+        """Measure replay lag, marking the replica usable only while it is reachable and within ``max_lag``"""
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(REPLICA_LAG_QUERY)
+                    lag = cursor.fetchone()[0]
+                conn.rollback()
+        except (psycopg2.Error, PoolTimeout) as e:
+            self.mark_down(e)
+        else:
+            if not self._warmed:
+                # Open the pool's minimum connections once the replica is known to be reachable
+                self._warmed = True
+                try:
+                    self.pool.open()
+                except psycopg2.Error:
+                    pass
+            if self.healthy and lag > max_lag:
+                logger.warning(f"Replica {self.name} is {lag:.1f}s behind, routing its reads to the primary")
+            elif not self.healthy and lag <= max_lag:
+                logger.info(f"Replica {self.name} is healthy ({lag:.1f}s behind)")
+            self.lag = lag
+            self.error = None
+            self.healthy = lag <= max_lag
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, error: Exception):
+        """Stop routing reads here until the next successful health check"""
+        if self.healthy:
+            logger.warning(f"Replica {self.name} is unavailable: {error}")
+        self.healthy = False
+        self.error = str(error)
+        self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'healthy': self.healthy,
+            'lag_seconds': self.lag,
+            'checked_ago_seconds': round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+            'error': self.error,
+            'reads': self.reads,
+            'failures': self.failures,
+            'pool': self.pool.stats()
+        }
+
+class Transaction:
+    """Query methods bound to a single pooled connection.
+
+    Rows come back as RealDictCursor rows (dict subclasses) or, with
+    ``as_tuples``, as plain tuples to skip per-row dict construction. With
+    ``prepare`` the statement is prepared server-side once per connection and
+    then run with EXECUTE, so Postgres stops re-parsing and re-planning hot
+    queries.
+    """
+
+    def __init__(self, conn: PooledConnection):
+        self.conn = conn
+
+    def cursor(self, as_tuples: bool = False, name: Optional[str] = None):
+        """Open a cursor on this transaction's connection"""
+        if as_tuples:
+            return self.conn.cursor(name=name)
+        return self.conn.cursor(name=name, cursor_factory=RealDictCursor)
+
+    def _run(self, cursor, query: str, params: Optional[Sequence], prepare: bool):
+        label = query_label(query)
+        started = time.perf_counter()
+        try:
+            self._execute(cursor, query, params, prepare)
+        except psycopg2.Error:
+            DB_QUERY_ERRORS.inc(label)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, label)
+
+    def _execute(self, cursor, query: str, params: Optional[Sequence], prepare: bool):
+        if not prepare:
+            cursor.execute(query, params)
+            return
+
+        name = prepared_statement_name(query)
+        if name not in self.conn.prepared:
+            cursor.execute(f"PREPARE {name} AS {to_positional(query)}")
+            self.conn.prepared.add(name)
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def fetch_one(self, query: str, params: Optional[Sequence] = None, prepare: bool = False,
+                  as_tuples: bool = False) -> Optional[Row]:
+        """Return the first row of a query, or None"""
+        with self.cursor(as_tuples) as cursor:
+            self._run(cursor, query, params, prepare)
+            return cursor.fetchone()
+
+    def fetch_all(self, query: str, params: Optional[Sequence] = None, prepare: bool = False,
+                  as_tuples: bool = False) -> List[Row]:
+        """Return every row of a query"""
+        with self.cursor(as_tuples) as cursor:
+            self._run(cursor, query, params, prepare)
+            return cursor.fetchall()
+
+    def execute(self, query: str, params: Optional[Sequence] = None, prepare: bool = False) -> int:
+        """Run a statement that returns no rows and report how many rows it touched"""
+        with self.cursor(as_tuples=True) as cursor:
+            self._run(cursor, query, params, prepare)
+            return cursor.rowcount
+
+    def execute_values(self, query: str, rows: Sequence[Sequence], template: Optional[str] = None,
+                       page_size: int = 500, fetch: bool = False, as_tuples: bool = True) -> Optional[List[Row]]:
+        """Expand ``rows`` into the ``VALUES %s`` of a multi-row statement"""
+        label = query_label(query)
+        started = time.perf_counter()
+        with self.cursor(as_tuples) as cursor:
+            try:
+                return execute_values(cursor, query, rows, template=template, page_size=page_size, fetch=fetch)
+            except psycopg2.Error:
+                DB_QUERY_ERRORS.inc(label)
+                raise
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - started, label)
+
+    def copy_from(self, query: str, source, size: int = 65536) -> int:
+        """Run a ``COPY ... FROM STDIN`` statement reading from a file-like ``source``"""
+        return self._copy(query, None, source, size)
+
+    def copy_to(self, query: str, params: Optional[Sequence], target, size: int = 65536) -> int:
+        """Run a ``COPY (SELECT ...) TO STDOUT`` statement writing to a file-like ``target``"""
+        return self._copy(query, params, target, size)
+
+    def _copy(self, query: str, params: Optional[Sequence], file, size: int) -> int:
+        label = query_label(query)
+        started = time.perf_counter()
+        with self.cursor(as_tuples=True) as cursor:
+            try:
+                # COPY takes no bind parameters, so they are interpolated client-side
+                statement = cursor.mogrify(query, params).decode('utf-8') if params else query
+                cursor.copy_expert(statement, file, size=size)
+                return cursor.rowcount
+            except psycopg2.Error:
+                DB_QUERY_ERRORS.inc(label)
+                raise
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - started, label)
+
+    def iter_rows(self, query: str, params: Optional[Sequence] = None, batch_size: int = 500,
+                  as_tuples: bool = False) -> Iterator[List[Row]]:
+        """Stream a query through a server-side cursor in batches of ``batch_size`` rows"""
+        with self.cursor(as_tuples, name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = batch_size
+            self._run(cursor, query, params, prepare=False)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def rollback(self):
+        """Roll back and forget prepared statements, whose state is unknown after a failure"""
+        if self.conn.closed:
+            return
+        try:
+            self.conn.rollback()
+            if self.conn.prepared:
+                with self.conn.cursor() as cursor:
+                    cursor.execute("DEALLOCATE ALL")
+                self.conn.commit()
+        except psycopg2.Error:
+            pass
+        self.conn.prepared.clear()
+
+_TOKEN_RE = re.compile(r"[()]|[A-Za-z_][\w.]*")
+
+# Statement verb -> keyword its target table follows
+_LABEL_TARGETS = {"SELECT": "FROM", "INSERT": "INTO", "UPDATE": "UPDATE", "DELETE": "FROM"}
+
+@lru_cache(maxsize=1024)
+def query_label(query: str) -> str:
+    """Short, low-cardinality label for a statement, such as ``select cards`` or ``insert cards``.
+
+    Only top-level tokens count, so a CTE is labelled by the statement that
+    follows it and subqueries are ignored.
+    """
+    depth = 0
+    in_cte = False
+    verb = None
+    pending = False
+    for token in _TOKEN_RE.findall(query):
+        if token == '(':
+            depth += 1
+            continue
+        if token == ')':
+            depth -= 1
+            continue
+        if depth:
+            continue
+
+        upper = token.upper()
+        if verb is None:
+            if upper == "WITH":
+                in_cte = True
+            elif not in_cte or upper in _LABEL_TARGETS:
+                verb = upper
+                pending = _LABEL_TARGETS.get(verb) == verb
+            continue
+        if pending:
+            return f"{verb.lower()} {token.lower()}"
+        pending = upper == _LABEL_TARGETS.get(verb)
+
+    return verb.lower() if verb else "empty"
+
+def prepared_statement_name(query: str) -> str:
+    """Stable server-side statement name for a query's text"""
+    return "ps_" + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+
+def to_positional(query: str) -> str:
+    """Rewrite psycopg2 %s placeholders as the $1, $2, ... placeholders PREPARE expects"""
+    counter = iter(range(1, query.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f"${next(counter)}", query)
+
 class DatabaseConnection:
-    def __init__(self):
-        self.connection = None
-        self.cursor = None
+    def __init__(self, pool_config: Optional[Dict[str, Any]] = None,
+                 replica_config: Optional[Dict[str, Any]] = None):
+        self.pool_config = pool_config if pool_config is not None else POOL_CONFIG
+        self.replica_config = replica_config if replica_config is not None else REPLICA_CONFIG
+        self.pool: Optional[ConnectionPool] = None
+        self.replicas: List[Replica] = []
+        self.replica_fallbacks = 0
+        self._lock = threading.Lock()
+        # Affinity key -> monotonic time until which its reads stay on the primary
+        self._pins: Dict[Hashable, float] = {}
+        self._pins_lock = threading.Lock()
+        self._stop_checks = threading.Event()
     
     def connect(self):
-        """Establish connection to PostgreSQL database"""
-        try:
-            self.connection = psycopg2.connect(**DB_CONFIG)
-            self.cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-            logger.info("Successfully connected to PostgreSQL database")
-            return True
-        except psycopg2.Error as e:
-            logger.error(f"Error connecting to database: {e}")
-            return False
+        """Open the connection pool to the PostgreSQL database"""
+        with self._lock:
+            if self.pool is not None:
+                return True
+            try:
+                pool = ConnectionPool(DB_CONFIG, **self.pool_config)
+                pool.open()
+                self.pool = pool
+                logger.info(f"Successfully connected to PostgreSQL database (pool size {pool.min_size}-{pool.max_size})")
+                self._open_replicas()
+                return True
+            except psycopg2.Error as e:
+                logger.error(f"Error connecting to database: {e}")
+                return False
     
     def disconnect(self):
-        """Close database connection"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
-            logger.info("Database connection closed")
-    
-    def execute_query(self, query: str, params: Optional[tuple] = None) -> Optional[List[Dict[str, Any]]]:
-        """Execute a query and return results"""
-        try:
-            if not self.connection or self.connection.closed:
-                if not self.connect():
-                    return None
-            
-            self.cursor.execute(query, params)
-            
-            # Check if the query is a SELECT (read-only) or a modification query
-            query_upper = query.strip().upper()
-            if query_upper.startswith('SELECT'):
-                # Read-only query, fetch results
-                results = self.cursor.fetchall()
-                return [dict(row) for row in results]
+        """Close the connection pool"""
+        with self._lock:
+            self._stop_checks.set()
+            for replica in self.replicas:
+                replica.pool.close()
+            self.replicas = []
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+                logger.info("Database connection closed")
+
+    def _open_replicas(self):
+        """Create replica pools and start checking their health in the background.
+
+        Replicas start out unhealthy, so reads stay on the primary until a
+        replica's first check passes.
+        """
+        config = self.replica_config
+        if not config['dsns']:
+            return
+        pool_config = {**self.pool_config, 'min_size': config['min_size'], 'max_size': config['max_size']}
+        self.replicas = [Replica(dsn, pool_config, config['connect_timeout']) for dsn in config['dsns']]
+        self._stop_checks = threading.Event()
+        threading.Thread(target=self._check_replicas, args=(self.replicas, self._stop_checks),
+                         name="db-replica-health", daemon=True).start()
+        logger.info(f"Routing reads to {len(self.replicas)} replica(s): {', '.join(r.name for r in self.replicas)}")
+
+    def _check_replicas(self, replicas: List[Replica], stop: threading.Event):
+        while not stop.is_set():
+            for replica in replicas:
+                replica.check(self.replica_config['max_lag'])
+            stop.wait(self.replica_config['check_interval'])
+
+    def note_write(self, affinity: Hashable):
+        """Keep reads for ``affinity`` on the primary until replicas have had time to replay a write"""
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        with self._pins_lock:
+            if len(self._pins) > 10000:
+                self._pins = {key: until for key, until in self._pins.items() if until > now}
+            self._pins[affinity] = now + self.replica_config['pin_seconds']
+
+    def _pinned(self, affinity: Hashable) -> bool:
+        with self._pins_lock:
+            until = self._pins.get(affinity)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._pins[affinity]
+                return False
+            return True
+
+    def read_replica(self, affinity: Optional[Hashable] = None) -> Optional[Replica]:
+        """Pick a replica for a read, or None to use the primary.
+
+        Replicas must have passed a recent health check within the lag limit.
+        Reads with an ``affinity`` (such as a user id) stick to one replica, so
+        consecutive reads see the same snapshot, and go to the primary while a
+        write made for that key is pinned.
+        """
+        if not self.replicas or (affinity is not None and self._pinned(affinity)):
+            return None
+        stale_after = 3 * self.replica_config['check_interval']
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.healthy and now - replica.checked_at < stale_after]
+        if not healthy:
+            return None
+        if affinity is not None:
+            return healthy[hash(affinity) % len(healthy)]
+        return min(healthy, key=lambda replica: replica.pool.stats()['in_use'])
+
+    def replica_stats(self) -> List[Dict[str, Any]]:
+        """Health, lag, read counts and pool occupancy per replica"""
+        return [replica.stats() for replica in self.replicas]
+
+    @contextmanager
+    def connection(self, replica: Optional[Replica] = None):
+        """Check out a pooled connection for the duration of the block.
+
+        With a ``replica`` the connection comes from its pool, falling back to
+        the primary if the replica cannot hand one out.
+        """
+        if self.pool is None and not self.connect():
+            raise psycopg2.OperationalError("Database connection pool is not available")
+        if replica is not None:
+            try:
+                conn = replica.pool.getconn()
+            except (psycopg2.Error, PoolTimeout) as e:
+                replica.mark_down(e)
+                self.replica_fallbacks += 1
             else:
-                # Modification query (INSERT, UPDATE, DELETE) - always commit
-                self.connection.commit()
-                
-                # If it has RETURNING clause, fetch the returned data
-                if 'RETURNING' in query_upper:
-                    results = self.cursor.fetchall()
-                    return [dict(row) for row in results]
+                replica.reads += 1
+                try:
+                    yield conn
+                except BaseException:
+                    replica.pool.putconn(conn, discard=conn.closed)
+                    raise
                 else:
-                    return None
-                
-        except psycopg2.Error as e:
-            logger.error(f"Error executing query: {e}")
-            if self.connection:
-                self.connection.rollback()
-            return None
+                    replica.pool.putconn(conn)
+                return
+        with self.pool.connection() as conn:
+            yield conn
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Occupancy of the connection pool"""
+        if self.pool is None:
+            return {'size': 0, 'idle': 0, 'in_use': 0, 'waiting': 0,
+                    'min_size': self.pool_config['min_size'], 'max_size': self.pool_config['max_size']}
+        return self.pool.stats()
+    
+    @contextmanager
+    def transaction(self, replica: bool = False, affinity: Optional[Hashable] = None):
+        """Run a block of statements on one pooled connection and commit them once.
+
+        Yields a Transaction exposing the same query methods as this class.
+        Any exception rolls the whole block back. With ``replica`` a read-only
+        block may run on a replica chosen by read_replica.
+        """
+        with self.transaction_on(self.read_replica(affinity) if replica else None) as tx:
+            yield tx
+
+    def fetch_one(self, query: str, params: Optional[Sequence] = None, prepare: bool = False,
+                  as_tuples: bool = False, replica: bool = False,
+                  affinity: Optional[Hashable] = None) -> Optional[Row]:
+        """Run a query in its own transaction and return its first row, or None"""
+        return self._read(lambda tx: tx.fetch_one(query, params, prepare=prepare, as_tuples=as_tuples),
+                          replica, affinity)
+
+    def fetch_all(self, query: str, params: Optional[Sequence] = None, prepare: bool = False,
+                  as_tuples: bool = False, replica: bool = False,
+                  affinity: Optional[Hashable] = None) -> List[Row]:
+        """Run a query in its own transaction and return every row"""
+        return self._read(lambda tx: tx.fetch_all(query, params, prepare=prepare, as_tuples=as_tuples),
+                          replica, affinity)
+
+    def _read(self, run, replica: bool, affinity: Optional[Hashable]):
+        target = self.read_replica(affinity) if replica else None
+        if target is not None:
+            try:
+                with self.transaction_on(target) as tx:
+                    return run(tx)
+            except psycopg2.OperationalError as e:
+                # The replica went away mid-query; a read is safe to repeat on the primary
+                target.mark_down(e)
+                self.replica_fallbacks += 1
+            except psycopg2.extensions.TransactionRollbackError:
+                # Cancelled by a conflict with recovery on the replica
+                self.replica_fallbacks += 1
+        with self.transaction() as tx:
+            return run(tx)
+
+    @contextmanager
+    def transaction_on(self, replica: Optional[Replica]):
+        """Like transaction, on a specific replica (or the primary for None)"""
+        with self.connection(replica) as conn:
+            tx = Transaction(conn)
+            try:
+                yield tx
+                conn.commit()
+            except BaseException:
+                tx.rollback()
+                raise
+
+    def execute(self, query: str, params: Optional[Sequence] = None, prepare: bool = False) -> int:
+        """Run a statement in its own transaction and return the affected row count"""
+        with self.transaction() as tx:
+            return tx.execute(query, params, prepare=prepare)
+
+    def iter_rows(self, query: str, params: Optional[Sequence] = None, batch_size: int = 500,
+                  as_tuples: bool = False, replica: bool = False,
+                  affinity: Optional[Hashable] = None) -> Iterator[List[Row]]:
+        """Stream a SELECT through a server-side cursor, yielding lists of up to ``batch_size`` rows.
+
+        The pooled connection stays checked out until the generator is exhausted
+        or closed, and only one batch is held in memory at a time.
+        """
+        with self.transaction(replica, affinity) as tx:
+            yield from tx.iter_rows(query, params, batch_size=batch_size, as_tuples=as_tuples)
 
     def add_card_to_collection(self, card_data: dict, collection_id: int):
         """Add a card to the collection"""
-        logger.info(f'card_data: {card_data}')
-        logger.info(f'collection_id: {collection_id}')
+        if debug_sampled(logger):
+            logger.debug(f"Adding card to collection {collection_id}: {card_data}")
         try:
-            # Extract card information with safe defaults
-            pokemon_card_id = card_data.get('id')
-            logger.info(f'pokemon_card_idawd: {pokemon_card_id}')
-            name = card_data.get('name')
-            logger.info(f'nameawd: {name}')
-            set_name = card_data.get('set', {}).get('name')
-            logger.info(f'set_nameawd: {set_name}')
-            series = card_data.get('set', {}).get('series')
-            logger.info(f'seriesawd: {series}')
-            image_url = card_data.get('images', {}).get('small')
-            logger.info(f'image_urlawd: {image_url}')
-            price = card_data.get('cardmarket', {}).get('prices', {}).get('averageSellPrice')
-            logger.info(f'priceawd: {price}')
+            fields = self.card_fields(card_data)
 
             # Validate required fields
-            if not pokemon_card_id or not name:
+            if not fields['pokemon_card_id'] or not fields['name']:
                 logger.error("Missing required card data: id or name")
                 return {"message": "Missing required card data", "card_id": None}
             
@@ -107,13 +703,12 @@ class DatabaseConnection:
                 DO UPDATE SET quantity = cards.quantity + 1
                 RETURNING id
             """
-
-            logger.info(f'query: {query}')
             
-            result = self.execute_query(query, (pokemon_card_id, name, set_name, series, image_url, price, collection_id))
-            logger.info(f'result: {result}')
+            params = (fields['pokemon_card_id'], fields['name'], fields['set_name'], fields['series'],
+                      fields['image_url'], fields['price'], collection_id)
+            result = self.fetch_one(query, params, prepare=True)
             if result:
-                return {"message": "Card added to collection successfully", "card_id": result[0]['id']}
+                return {"message": "Card added to collection successfully", "card_id": result['id']}
             else:
                 return {"message": "Failed to add card to collection", "card_id": None}
                 
@@ -121,8 +716,108 @@ class DatabaseConnection:
             logger.error(f"Error adding card to collection: {e}")
             return {"message": f"Error adding card to collection: {str(e)}", "card_id": None}
     
-    def create_tables(self):
-        """Create necessary tables for the BinderBuilder application"""
+    def try_advisory_lock(self, key: int):
+        """Take a session-level advisory lock on a dedicated pooled connection.
+
+        Returns the connection holding the lock, or None when another session
+        already holds it. Pass the connection to release_advisory_lock when done.
+        """
+        if self.pool is None and not self.connect():
+            raise psycopg2.OperationalError("Database connection pool is not available")
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+                locked = cursor.fetchone()[0]
+            conn.commit()
+        except psycopg2.Error:
+            self.pool.putconn(conn, discard=True)
+            raise
+        if not locked:
+            self.pool.putconn(conn)
+            return None
+        return conn
+
+    def release_advisory_lock(self, conn, key: int):
+        """Release a lock taken by try_advisory_lock and return its connection to the pool"""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (key,))
+            conn.commit()
+            self.pool.putconn(conn)
+        except psycopg2.Error:
+            # Closing the session releases the lock as well
+            self.pool.putconn(conn, discard=True)
+
+    @staticmethod
+    def card_fields(card_data: dict) -> Dict[str, Any]:
+        """Pull the columns stored in the cards table out of an upstream card payload"""
+        card_set = card_data.get('set') or {}
+        return {
+            'pokemon_card_id': card_data.get('id'),
+            'name': card_data.get('name'),
+            'set_name': card_set.get('name'),
+            'series': card_set.get('series'),
+            'image_url': (card_data.get('images') or {}).get('small'),
+            'price': ((card_data.get('cardmarket') or {}).get('prices') or {}).get('averageSellPrice')
+        }
+
+    def add_cards_to_collection(self, items: List[tuple], collection_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Upsert many (card_data, quantity) pairs into a collection in one transaction.
+
+        Duplicate cards within the batch are merged before the insert so each
+        (pokemon_card_id, collection_id) row is written once. Returns one result
+        per input item, or None if the batch could not be written.
+        """
+        results: List[Dict[str, Any]] = []
+        merged: Dict[str, list] = {}
+        for index, (card_data, quantity) in enumerate(items):
+            fields = self.card_fields(card_data)
+            pokemon_card_id = fields['pokemon_card_id']
+            if not pokemon_card_id or not fields['name']:
+                results.append({"index": index, "pokemon_card_id": pokemon_card_id, "status": "error",
+                                "message": "Missing required card data", "card_id": None})
+                continue
+            results.append({"index": index, "pokemon_card_id": pokemon_card_id, "status": "added",
+                            "message": "Card added to collection successfully"})
+            if pokemon_card_id in merged:
+                merged[pokemon_card_id][-2] += quantity
+            else:
+                merged[pokemon_card_id] = [pokemon_card_id, fields['name'], fields['set_name'], fields['series'],
+                                           fields['image_url'], fields['price'], quantity, collection_id]
+
+        if not merged:
+            return results
+
+        query = """
+            INSERT INTO cards (pokemon_card_id, name, set_name, series, image_url, price, quantity, collection_id)
+            VALUES %s
+            ON CONFLICT (pokemon_card_id, collection_id)
+            DO UPDATE SET quantity = cards.quantity + EXCLUDED.quantity
+            RETURNING id, pokemon_card_id, quantity
+        """
+        try:
+            with self.transaction() as tx:
+                rows = tx.execute_values(query, [tuple(row) for row in merged.values()],
+                                         page_size=len(merged), fetch=True)
+        except psycopg2.Error as e:
+            logger.error(f"Error adding cards to collection: {e}")
+            return None
+
+        written = {pokemon_card_id: (card_id, quantity) for card_id, pokemon_card_id, quantity in rows}
+        for result in results:
+            if result['status'] == 'added':
+                result['card_id'], result['quantity'] = written[result['pokemon_card_id']]
+        return results
+
+    @staticmethod
+    def schema() -> Dict[str, Dict[str, str]]:
+        """Baseline schema statements by kind, each keyed by the object it creates.
+
+        This is migration 1 in migrations.py. Later schema changes are added
+        there as new migrations rather than edited in here, and indexes are
+        built there with CREATE INDEX CONCURRENTLY so they never block writes.
+        """
         tables = {
             'users': """
                 CREATE TABLE IF NOT EXISTS users (
@@ -134,7 +829,8 @@ class DatabaseConnection:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     last_login TIMESTAMP,
                     is_active BOOLEAN DEFAULT TRUE,
-                    email_verified BOOLEAN DEFAULT FALSE
+                    email_verified BOOLEAN DEFAULT FALSE,
+                    token_version INTEGER NOT NULL DEFAULT 0
                 )
             """,
             'collections': """
@@ -161,15 +857,234 @@ class DatabaseConnection:
                     added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(pokemon_card_id, collection_id)
                 )
+            """,
+            'catalog_sets': """
+                CREATE TABLE IF NOT EXISTS catalog_sets (
+                    id VARCHAR(255) PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    series VARCHAR(255),
+                    printed_total INTEGER,
+                    total INTEGER,
+                    release_date DATE,
+                    upstream_updated_at VARCHAR(64),
+                    data JSONB NOT NULL,
+                    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            'catalog_cards': """
+                CREATE TABLE IF NOT EXISTS catalog_cards (
+                    id VARCHAR(255) PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    set_id VARCHAR(255) NOT NULL,
+                    set_name VARCHAR(255),
+                    series VARCHAR(255),
+                    number VARCHAR(32),
+                    rarity VARCHAR(255),
+                    release_date DATE,
+                    data JSONB NOT NULL,
+                    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            'collection_summaries': """
+                CREATE TABLE IF NOT EXISTS collection_summaries (
+                    collection_id INTEGER PRIMARY KEY,
+                    card_count INTEGER NOT NULL DEFAULT 0,
+                    unique_cards INTEGER NOT NULL DEFAULT 0,
+                    total_value NUMERIC(14,2) NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            'collection_set_summaries': """
+                CREATE TABLE IF NOT EXISTS collection_set_summaries (
+                    collection_id INTEGER NOT NULL,
+                    set_name VARCHAR(255) NOT NULL,
+                    series VARCHAR(255),
+                    card_count INTEGER NOT NULL DEFAULT 0,
+                    unique_cards INTEGER NOT NULL DEFAULT 0,
+                    total_value NUMERIC(14,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (collection_id, set_name)
+                )
+            """,
+            # One row per card per day its price changed; owned duplicates share the series
+            'card_price_history': """
+                CREATE TABLE IF NOT EXISTS card_price_history (
+                    pokemon_card_id VARCHAR(255) NOT NULL,
+                    recorded_on DATE NOT NULL,
+                    price DECIMAL(10,2) NOT NULL,
+                    PRIMARY KEY (pokemon_card_id, recorded_on)
+                )
             """
         }
-        
-        for table_name, query in tables.items():
-            try:
-                self.execute_query(query)
-                logger.info(f"Table '{table_name}' created successfully")
-            except Exception as e:
-                logger.error(f"Error creating table '{table_name}': {e}")
+
+        # Columns added after a table was first created
+        columns = {
+            'users.token_version': "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+            'cards.price_refreshed_at': "ALTER TABLE cards ADD COLUMN IF NOT EXISTS price_refreshed_at TIMESTAMP",
+            'collections.version': "ALTER TABLE collections ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0"
+        }
+
+        routines = {
+            # Applies one signed change to a collection's totals and to its per-set row
+            'apply_collection_summary_delta': """
+                CREATE OR REPLACE FUNCTION apply_collection_summary_delta(
+                    p_collection_id INTEGER, p_set_name VARCHAR, p_series VARCHAR,
+                    p_cards INTEGER, p_unique INTEGER, p_value NUMERIC
+                ) RETURNS VOID AS $$
+                BEGIN
+                    INSERT INTO collection_summaries (collection_id, card_count, unique_cards, total_value, updated_at)
+                    VALUES (p_collection_id, p_cards, p_unique, p_value, CURRENT_TIMESTAMP)
+                    ON CONFLICT (collection_id) DO UPDATE SET
+                        card_count = collection_summaries.card_count + EXCLUDED.card_count,
+                        unique_cards = collection_summaries.unique_cards + EXCLUDED.unique_cards,
+                        total_value = collection_summaries.total_value + EXCLUDED.total_value,
+                        updated_at = CURRENT_TIMESTAMP;
+
+                    INSERT INTO collection_set_summaries (collection_id, set_name, series, card_count, unique_cards, total_value)
+                    VALUES (p_collection_id, COALESCE(p_set_name, ''), p_series, p_cards, p_unique, p_value)
+                    ON CONFLICT (collection_id, set_name) DO UPDATE SET
+                        series = COALESCE(EXCLUDED.series, collection_set_summaries.series),
+                        card_count = collection_set_summaries.card_count + EXCLUDED.card_count,
+                        unique_cards = collection_set_summaries.unique_cards + EXCLUDED.unique_cards,
+                        total_value = collection_set_summaries.total_value + EXCLUDED.total_value;
+
+                    DELETE FROM collection_set_summaries
+                    WHERE collection_id = p_collection_id AND set_name = COALESCE(p_set_name, '') AND unique_cards <= 0;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            # Keeps the summaries current for every insert, quantity bump, price change and delete on cards
+            'cards_summary_trigger': """
+                CREATE OR REPLACE FUNCTION cards_summary_trigger() RETURNS TRIGGER AS $$
+                BEGIN
+                    IF TG_OP = 'UPDATE'
+                        AND OLD.collection_id IS NOT DISTINCT FROM NEW.collection_id
+                        AND OLD.set_name IS NOT DISTINCT FROM NEW.set_name
+                        AND OLD.quantity IS NOT DISTINCT FROM NEW.quantity
+                        AND OLD.price IS NOT DISTINCT FROM NEW.price THEN
+                        RETURN NULL;
+                    END IF;
+
+                    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.collection_id IS NOT NULL THEN
+                        PERFORM apply_collection_summary_delta(
+                            OLD.collection_id, OLD.set_name, OLD.series,
+                            -COALESCE(OLD.quantity, 0), -1, -COALESCE(OLD.price, 0) * COALESCE(OLD.quantity, 0));
+                    END IF;
+
+                    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.collection_id IS NOT NULL THEN
+                        PERFORM apply_collection_summary_delta(
+                            NEW.collection_id, NEW.set_name, NEW.series,
+                            COALESCE(NEW.quantity, 0), 1, COALESCE(NEW.price, 0) * COALESCE(NEW.quantity, 0));
+                    END IF;
+
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            # Trigger creation and backfill share a transaction holding off writers, so no change is counted twice or missed
+            'cards_summary': """
+                LOCK TABLE cards IN SHARE ROW EXCLUSIVE MODE;
+
+                DROP TRIGGER IF EXISTS cards_summary ON cards;
+                CREATE TRIGGER cards_summary
+                    AFTER INSERT OR UPDATE OR DELETE ON cards
+                    FOR EACH ROW EXECUTE FUNCTION cards_summary_trigger();
+
+                INSERT INTO collection_summaries (collection_id, card_count, unique_cards, total_value, updated_at)
+                SELECT collection_id, SUM(COALESCE(quantity, 0)), COUNT(*),
+                       SUM(COALESCE(price, 0) * COALESCE(quantity, 0)), CURRENT_TIMESTAMP
+                FROM cards
+                WHERE collection_id IS NOT NULL
+                GROUP BY collection_id
+                ON CONFLICT (collection_id) DO NOTHING;
+
+                INSERT INTO collection_set_summaries (collection_id, set_name, series, card_count, unique_cards, total_value)
+                SELECT collection_id, COALESCE(set_name, ''), MAX(series), SUM(COALESCE(quantity, 0)), COUNT(*),
+                       SUM(COALESCE(price, 0) * COALESCE(quantity, 0))
+                FROM cards
+                WHERE collection_id IS NOT NULL
+                GROUP BY collection_id, COALESCE(set_name, '')
+                ON CONFLICT (collection_id, set_name) DO NOTHING
+            """,
+            # Bumps the version of every collection a statement on cards visibly changed, once per statement
+            'bump_collection_versions': """
+                CREATE OR REPLACE FUNCTION bump_collection_versions() RETURNS TRIGGER AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' THEN
+                        UPDATE collections SET version = version + 1
+                        WHERE id IN (SELECT collection_id FROM new_cards);
+                    ELSIF TG_OP = 'DELETE' THEN
+                        UPDATE collections SET version = version + 1
+                        WHERE id IN (SELECT collection_id FROM old_cards);
+                    ELSE
+                        -- Price refresh stamps rows it did not change; only visible changes count
+                        UPDATE collections SET version = version + 1
+                        WHERE id IN (
+                            SELECT unnest(ARRAY[o.collection_id, n.collection_id])
+                            FROM old_cards o
+                            JOIN new_cards n ON n.id = o.id
+                            WHERE (o.pokemon_card_id, o.name, o.set_name, o.series, o.image_url,
+                                   o.price, o.quantity, o.collection_id)
+                                  IS DISTINCT FROM
+                                  (n.pokemon_card_id, n.name, n.set_name, n.series, n.image_url,
+                                   n.price, n.quantity, n.collection_id)
+                        );
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            # Renaming or redescribing a collection bumps its version too
+            'collections_version_trigger': """
+                CREATE OR REPLACE FUNCTION collections_version_trigger() RETURNS TRIGGER AS $$
+                BEGIN
+                    IF (NEW.name, NEW.description) IS DISTINCT FROM (OLD.name, OLD.description)
+                        AND NEW.version = OLD.version THEN
+                        NEW.version := OLD.version + 1;
+                    END IF;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            # Statement-level triggers with transition tables bump each collection once per write, however many rows it touched
+            'collection_versions': """
+                DROP TRIGGER IF EXISTS cards_version_insert ON cards;
+                CREATE TRIGGER cards_version_insert
+                    AFTER INSERT ON cards REFERENCING NEW TABLE AS new_cards
+                    FOR EACH STATEMENT EXECUTE FUNCTION bump_collection_versions();
+
+                DROP TRIGGER IF EXISTS cards_version_update ON cards;
+                CREATE TRIGGER cards_version_update
+                    AFTER UPDATE ON cards REFERENCING OLD TABLE AS old_cards NEW TABLE AS new_cards
+                    FOR EACH STATEMENT EXECUTE FUNCTION bump_collection_versions();
+
+                DROP TRIGGER IF EXISTS cards_version_delete ON cards;
+                CREATE TRIGGER cards_version_delete
+                    AFTER DELETE ON cards REFERENCING OLD TABLE AS old_cards
+                    FOR EACH STATEMENT EXECUTE FUNCTION bump_collection_versions();
+
+                DROP TRIGGER IF EXISTS collections_version ON collections;
+                CREATE TRIGGER collections_version
+                    BEFORE UPDATE ON collections
+                    FOR EACH ROW EXECUTE FUNCTION collections_version_trigger()
+            """
+        }
+
+        return {'Extension': {'pg_trgm': "CREATE EXTENSION IF NOT EXISTS pg_trgm"},
+                'Table': tables, 'Column': columns, 'Routine': routines}
+
+    def create_tables(self):
+        """Create necessary tables for the BinderBuilder application.
+
+        Only the baseline schema; run migrations.migrate() to bring a database
+        fully up to date.
+        """
+        for kind, statements in self.schema().items():
+            for name, query in statements.items():
+                try:
+                    self.execute(query)
+                    logger.info(f"{kind} '{name}' created successfully")
+                except Exception as e:
+                    logger.error(f"Error creating {kind.lower()} '{name}': {e}")
 
 # Global database connection instance
 db = DatabaseConnection()
@@ -180,8 +1095,10 @@ def get_db_connection():
 
 def init_database():
     """Initialize database with required tables"""
+    # Imported here because migrations builds on this module
+    from migrations import migrate
     if db.connect():
-        db.create_tables()
+        migrate(db)
         db.disconnect()
         logger.info("Database initialization completed")
     else:
@@ -191,10 +1108,10 @@ def init_database():
 def test_connection():
     """Test database connection"""
     if db.connect():
-        result = db.execute_query("SELECT version();")
+        result = db.fetch_one("SELECT version();")
         if result:
             logger.info("Database connection test successful")
-            logger.info(f"PostgreSQL version: {result[0]['version']}")
+            logger.info(f"PostgreSQL version: {result['version']}")
         db.disconnect()
         return True
     else:
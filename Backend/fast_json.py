@@ -0,0 +1,38 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+def _default(value: Any):
+    # orjson handles datetime and date natively; Decimal prices are the only other type rows carry
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> bytes:
+    """Serialize to compact JSON bytes with orjson"""
+    return orjson.dumps(value, default=_default)
+
+def loads(raw: bytes) -> Any:
+    """Parse JSON bytes with orjson"""
+    return orjson.loads(raw)
+
+def rows_to_dicts(columns: Sequence[str], rows: List[tuple]) -> List[Dict[str, Any]]:
+    """Pair plain cursor tuples with their column names, much cheaper than RealDictCursor rows"""
+    return [dict(zip(columns, row)) for row in rows]
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson.
+
+    Return it directly from an endpoint to skip FastAPI's jsonable_encoder and
+    response_model validation; the content must already be plain JSON types,
+    datetimes or Decimals.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class RawJSONResponse(Response):
+    """Response for a body that is already encoded JSON"""
+
+    media_type = "application/json"
@@ -0,0 +1,356 @@
+import hashlib
+import io
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote, urlparse
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from dotenv import load_dotenv
+from cache import SingleFlight
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CONFIG = {
+    'enabled': os.getenv('IMAGE_PROXY_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    'cache_dir': os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache')),
+    'max_bytes': int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(1024 * 1024 * 1024))),
+    'allowed_hosts': {host.strip() for host in os.getenv('IMAGE_ALLOWED_HOSTS', 'images.pokemontcg.io').split(',') if host.strip()},
+    'widths': sorted(int(width) for width in os.getenv('IMAGE_THUMBNAIL_WIDTHS', '160,245,480').split(',') if width.strip()),
+    'card_width': int(os.getenv('IMAGE_CARD_WIDTH', '245')),
+    'webp_quality': int(os.getenv('IMAGE_WEBP_QUALITY', '80')),
+    'fetch_timeout': float(os.getenv('IMAGE_FETCH_TIMEOUT', '10')),
+    'max_image_bytes': int(os.getenv('IMAGE_MAX_SOURCE_BYTES', str(10 * 1024 * 1024))),
+    'max_pixels': int(os.getenv('IMAGE_MAX_SOURCE_PIXELS', str(40 * 1000 * 1000)))
+}
+
+# Pillow refuses to decode anything larger, so a small compressed file cannot expand into gigabytes
+Image.MAX_IMAGE_PIXELS = IMAGE_CONFIG['max_pixels']
+
+PROXY_PATH = "/api/images"
+
+# Originals and thumbnails never change for a given digest
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Redirects are followed by hand so every hop is checked against the allowed hosts
+MAX_REDIRECTS = 5
+
+class ImageError(Exception):
+    """Raised when an image cannot be proxied"""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+def sniff_media_type(data: bytes) -> Optional[str]:
+    """Media type of common web image formats from their magic bytes"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if data.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return "image/gif"
+    return None
+
+MEDIA_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+
+def validate_source(url: str):
+    """Refuse anything but http(s) URLs on an allowed image host"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or parsed.hostname not in IMAGE_CONFIG['allowed_hosts']:
+        raise ImageError("Image host is not allowed", status_code=400)
+
+class ImageCache:
+    """Content-addressed on-disk image cache with LRU eviction under a byte budget.
+
+    Originals are stored once per content digest under ``blobs/`` and found
+    through ``refs/``, which maps a digest of the source URL to the content
+    digest. WebP thumbnails live under ``thumbs/`` keyed by content digest and
+    width. Refs count toward the budget like any other file. Eviction removes
+    least-recently-served files first; a dangling ref is deleted when next read
+    and simply causes a refetch. Every disk access, cache hits included, runs in
+    the threadpool.
+    """
+
+    def __init__(self, root: str, max_bytes: int, widths, webp_quality: int = 80):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.widths = set(widths)
+        self.webp_quality = webp_quality
+        self._lock = threading.Lock()
+        # path -> size, least recently used first
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        # Concurrent misses on one image or thumbnail share a single fetch or render
+        self._flight = SingleFlight()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Separate from the TCG API client so the API key is never sent to the image host
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=IMAGE_CONFIG['fetch_timeout'], follow_redirects=False)
+        return self._client
+
+    def _path(self, kind: str, name: str) -> str:
+        return os.path.join(self.root, kind, name[:2], name)
+
+    def _load(self):
+        """Index existing files oldest-first by modification time"""
+        with self._lock:
+            if self._loaded:
+                return
+            found = []
+            for kind in ("blobs", "thumbs", "refs"):
+                for directory, _, names in os.walk(os.path.join(self.root, kind)):
+                    for name in names:
+                        path = os.path.join(directory, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        found.append((stat.st_mtime, path, stat.st_size))
+            for _, path, size in sorted(found):
+                self._files[path] = size
+                self._bytes += size
+            self._loaded = True
+
+    def _touch(self, path: str) -> bool:
+        """Mark a cached file recently used; False when it is not on disk"""
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._bytes -= self._files.pop(path, 0)
+            return False
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+            else:
+                # Written by another worker sharing the directory
+                size = os.path.getsize(path)
+                self._files[path] = size
+                self._bytes += size
+        return True
+
+    def _store(self, path: str, data: bytes):
+        """Write a file atomically, account for it and evict down to the budget"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+        evicted = []
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(path, 0)
+            self._files[path] = len(data)
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                victim, size = self._files.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                evicted.append(victim)
+        for victim in evicted:
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+
+    def _ref_path(self, url: str) -> str:
+        return self._path("refs", hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    async def original(self, url: str) -> Tuple[str, str, str]:
+        """Path, content digest and media type of a source image, fetching it on first use"""
+        validate_source(url)
+        if not self._loaded:
+            await run_in_threadpool(self._load)
+        ref_path = self._ref_path(url)
+        cached = await run_in_threadpool(self._read_ref, ref_path)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        return await self._flight.run(ref_path, lambda: self._fetch(url, ref_path))
+
+    def _read_ref(self, ref_path: str) -> Optional[Tuple[str, str, str]]:
+        if not self._touch(ref_path):
+            return None
+        try:
+            with open(ref_path) as f:
+                digest, media_type = f.read().split()
+        except (OSError, ValueError):
+            self._discard(ref_path)
+            return None
+        blob_path = self._path("blobs", f"{digest}.{MEDIA_EXTENSIONS.get(media_type, 'bin')}")
+        if not self._touch(blob_path):
+            # The blob was evicted; drop the ref with it
+            self._discard(ref_path)
+            return None
+        return blob_path, digest, media_type
+
+    async def _download(self, url: str) -> bytes:
+        """Body of a source image, following redirects only to allowed hosts and reading at most the size cap"""
+        limit = IMAGE_CONFIG['max_image_bytes']
+        for _ in range(MAX_REDIRECTS + 1):
+            try:
+                async with self.client.stream("GET", url) as response:
+                    if response.is_redirect:
+                        url = str(response.url.join(response.headers["location"]))
+                        try:
+                            validate_source(url)
+                        except ImageError:
+                            raise ImageError("Image host redirected to a host that is not allowed")
+                        continue
+                    if response.status_code == 404:
+                        raise ImageError("Image not found", status_code=404)
+                    if response.is_error:
+                        raise ImageError(f"Image host returned {response.status_code}")
+
+                    length = response.headers.get("content-length", "")
+                    if length.isdigit() and int(length) > limit:
+                        raise ImageError("Source image is too large")
+                    data = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        data += chunk
+                        if len(data) > limit:
+                            raise ImageError("Source image is too large")
+                    return bytes(data)
+            except httpx.HTTPError as e:
+                raise ImageError(f"Failed to fetch image: {e}") from e
+        raise ImageError("Image host redirected too many times")
+
+    async def _fetch(self, url: str, ref_path: str) -> Tuple[str, str, str]:
+        data = await self._download(url)
+        media_type = sniff_media_type(data)
+        if media_type is None:
+            raise ImageError("Source is not a supported image")
+
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._path("blobs", f"{digest}.{MEDIA_EXTENSIONS[media_type]}")
+        if not await run_in_threadpool(self._touch, blob_path):
+            await run_in_threadpool(self._store, blob_path, data)
+        await run_in_threadpool(self._store, ref_path, f"{digest} {media_type}".encode('utf-8'))
+        return blob_path, digest, media_type
+
+    def _render_thumbnail(self, source_path: str, width: int) -> bytes:
+        with Image.open(source_path) as image:
+            # Pillow only warns between the limit and twice it
+            if image.width * image.height > IMAGE_CONFIG['max_pixels']:
+                raise Image.DecompressionBombError(f"Image has {image.width * image.height} pixels")
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=self.webp_quality, method=4)
+            return buffer.getvalue()
+
+    def _discard(self, *paths: str):
+        """Delete cached files and drop them from the accounting"""
+        for path in paths:
+            with self._lock:
+                self._bytes -= self._files.pop(path, 0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def _render(self, url: str, source_path: str, thumb_path: str, width: int) -> str:
+        try:
+            data = await run_in_threadpool(self._render_thumbnail, source_path, width)
+        except FileNotFoundError:
+            raise
+        except (OSError, Image.DecompressionBombError) as e:
+            # A blob Pillow cannot decode would fail every later request; forget it so the next one refetches
+            await run_in_threadpool(self._discard, source_path, self._ref_path(url))
+            raise ImageError(f"Source image could not be decoded: {e}") from e
+        await run_in_threadpool(self._store, thumb_path, data)
+        return thumb_path
+
+    async def thumbnail(self, url: str, width: int) -> Tuple[str, str, str]:
+        """Path, ETag value and media type of a WebP thumbnail at one of the fixed widths"""
+        if width not in self.widths:
+            raise ImageError(f"Width must be one of {sorted(self.widths)}", status_code=400)
+        for attempt in range(2):
+            source_path, digest, _ = await self.original(url)
+            thumb_path = self._path("thumbs", f"{digest}-w{width}.webp")
+            if not await run_in_threadpool(self._touch, thumb_path):
+                try:
+                    await self._flight.run(thumb_path, lambda: self._render(url, source_path, thumb_path, width))
+                except FileNotFoundError:
+                    # The source was evicted between the lookup and the render; fetch it again once
+                    await run_in_threadpool(self._discard, source_path, self._ref_path(url))
+                    if attempt:
+                        raise ImageError("Source image was evicted while rendering, please retry", status_code=503)
+                    continue
+            return thumb_path, f"{digest}-w{width}", "image/webp"
+
+    def stats(self) -> Dict[str, Any]:
+        """Occupancy and counters for monitoring"""
+        with self._lock:
+            return {
+                'name': 'images',
+                'files': len(self._files),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    async def close(self):
+        """Close pooled connections to the image host"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def proxied_image_url(url: Optional[str], width: Optional[int] = None) -> Optional[str]:
+    """Rewrite an upstream image URL to go through the proxy, leaving unknown hosts untouched"""
+    if not url or not IMAGE_CONFIG['enabled'] or url.startswith(PROXY_PATH):
+        return url
+    if urlparse(url).hostname not in IMAGE_CONFIG['allowed_hosts']:
+        return url
+    proxied = f"{PROXY_PATH}?url={quote(url, safe='')}"
+    return f"{proxied}&w={width}" if width else proxied
+
+def rewrite_card_images(card: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of an upstream card with its images pointed at the proxy: a thumbnail for small, the original for large"""
+    images = card.get('images')
+    if not IMAGE_CONFIG['enabled'] or not isinstance(images, dict):
+        return card
+    rewritten = dict(images)
+    if 'small' in images:
+        rewritten['small'] = proxied_image_url(images['small'], IMAGE_CONFIG['card_width'])
+    if 'large' in images:
+        rewritten['large'] = proxied_image_url(images['large'])
+    return {**card, 'images': rewritten}
+
+def rewrite_body_images(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Rewrite the card images in a ``{"data": card}`` or ``{"data": [cards]}`` response body"""
+    data = body.get('data') if isinstance(body, dict) else None
+    if not IMAGE_CONFIG['enabled'] or data is None:
+        return body
+    if isinstance(data, list):
+        return {**body, 'data': [rewrite_card_images(card) for card in data]}
+    return {**body, 'data': rewrite_card_images(data)}
+
+# Shared cache instance
+image_cache = ImageCache(IMAGE_CONFIG['cache_dir'], IMAGE_CONFIG['max_bytes'],
+                         set(IMAGE_CONFIG['widths']) | {IMAGE_CONFIG['card_width']}, IMAGE_CONFIG['webp_quality'])
+
+def get_image_cache() -> ImageCache:
+    """Get the shared image cache instance"""
+    return image_cache
@@ -0,0 +1,245 @@
+import argparse
+import os
+import re
+import time
+import logging
+from typing import Dict, List, Optional, Sequence
+import psycopg2.errors
+from dotenv import load_dotenv
+from db_connection import get_db_connection, DatabaseConnection
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CONFIG = {
+    'on_startup': os.getenv('DB_MIGRATE_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes'),
+    # How long a transactional migration waits for a table lock before giving up rather than stalling traffic
+    'lock_timeout': os.getenv('DB_MIGRATION_LOCK_TIMEOUT', '10s')
+}
+
+# Advisory lock key so concurrent workers apply migrations one at a time
+MIGRATION_LOCK_KEY = 0x42420003
+
+SCHEMA_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INTEGER
+    )
+"""
+
+_CONCURRENT_INDEX_RE = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+
+class Migration:
+    """One schema change, applied once and recorded in schema_migrations.
+
+    A transactional migration runs its statements and its bookkeeping row in
+    a single transaction. A ``concurrent`` migration runs statement by
+    statement in autocommit so it can build indexes with CREATE INDEX
+    CONCURRENTLY; its statements must be idempotent, since a failed run is
+    retried from the start.
+    """
+
+    def __init__(self, version: int, name: str, statements: Sequence[str], concurrent: bool = False):
+        self.version = version
+        self.name = name
+        self.statements = list(statements)
+        self.concurrent = concurrent
+
+MIGRATIONS = [
+    Migration(1, "baseline schema", [query for statements in DatabaseConnection.schema().values()
+                                     for query in statements.values()]),
+    # The collection list filters on user_id and sorts by created_at; id and version cover the
+    # ownership check and the list's ETag without touching the heap
+    Migration(2, "index collections by user, newest first", [
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_collections_user_created
+           ON collections (user_id, created_at DESC) INCLUDE (id, version)""",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_collections_user_id"
+    ], concurrent=True),
+    # Token bucket shared by every worker calling the Pokemon TCG API; see quota.py
+    Migration(3, "shared upstream quota bucket", [
+        """CREATE TABLE IF NOT EXISTS upstream_quota (
+               name VARCHAR(64) PRIMARY KEY,
+               tokens DOUBLE PRECISION NOT NULL,
+               refilled_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+           )"""
+    ]),
+    # Cards stored per set, written by the catalog sync, so set completion never counts rosters per request
+    Migration(4, "store set roster sizes", [
+        "ALTER TABLE catalog_sets ADD COLUMN IF NOT EXISTS roster_size INTEGER",
+        """UPDATE catalog_sets s SET roster_size = r.cards
+           FROM (SELECT set_id, COUNT(*) AS cards FROM catalog_cards GROUP BY set_id) r
+           WHERE r.set_id = s.id"""
+    ]),
+    # Indexes for the hot read paths, built without blocking writes to tables that may already be large
+    Migration(5, "index cards and the catalog mirror concurrently", [
+        # Serves keyset pagination of a collection newest-first
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cards_collection_added
+           ON cards (collection_id, added_at DESC, id DESC)""",
+        # Trigram index serves word-prefix and whole-word name matches, text_pattern_ops serves plain prefixes
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_cards_name_trgm
+           ON catalog_cards USING gin (lower(name) gin_trgm_ops)""",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_cards_name_prefix
+           ON catalog_cards (lower(name) text_pattern_ops)""",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_cards_set_id ON catalog_cards (set_id)",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_sets_name
+           ON catalog_sets (lower(name) text_pattern_ops)""",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_sets_series
+           ON catalog_sets (lower(series) text_pattern_ops)"""
+    ], concurrent=True),
+    # Every history read looks up by card through the primary key, so the date index only cost writes
+    Migration(6, "drop the price history date index", [
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_card_price_history_recorded_on"
+    ], concurrent=True),
+    # Deleting a collection cascades to its cards after the collection row is gone; their summary
+    # deltas must not recreate its summaries, so they clear them instead
+    Migration(7, "skip summary deltas for deleted collections", [
+        """CREATE OR REPLACE FUNCTION apply_collection_summary_delta(
+               p_collection_id INTEGER, p_set_name VARCHAR, p_series VARCHAR,
+               p_cards INTEGER, p_unique INTEGER, p_value NUMERIC
+           ) RETURNS VOID AS $$
+           BEGIN
+               IF NOT EXISTS (SELECT 1 FROM collections WHERE id = p_collection_id) THEN
+                   DELETE FROM collection_summaries WHERE collection_id = p_collection_id;
+                   DELETE FROM collection_set_summaries WHERE collection_id = p_collection_id;
+                   RETURN;
+               END IF;
+
+               INSERT INTO collection_summaries (collection_id, card_count, unique_cards, total_value, updated_at)
+               VALUES (p_collection_id, p_cards, p_unique, p_value, CURRENT_TIMESTAMP)
+               ON CONFLICT (collection_id) DO UPDATE SET
+                   card_count = collection_summaries.card_count + EXCLUDED.card_count,
+                   unique_cards = collection_summaries.unique_cards + EXCLUDED.unique_cards,
+                   total_value = collection_summaries.total_value + EXCLUDED.total_value,
+                   updated_at = CURRENT_TIMESTAMP;
+
+               INSERT INTO collection_set_summaries (collection_id, set_name, series, card_count, unique_cards, total_value)
+               VALUES (p_collection_id, COALESCE(p_set_name, ''), p_series, p_cards, p_unique, p_value)
+               ON CONFLICT (collection_id, set_name) DO UPDATE SET
+                   series = COALESCE(EXCLUDED.series, collection_set_summaries.series),
+                   card_count = collection_set_summaries.card_count + EXCLUDED.card_count,
+                   unique_cards = collection_set_summaries.unique_cards + EXCLUDED.unique_cards,
+                   total_value = collection_set_summaries.total_value + EXCLUDED.total_value;
+
+               DELETE FROM collection_set_summaries
+               WHERE collection_id = p_collection_id AND set_name = COALESCE(p_set_name, '') AND unique_cards <= 0;
+           END;
+           $$ LANGUAGE plpgsql""",
+        # Rows already left behind by earlier deletes
+        """DELETE FROM collection_summaries s
+           WHERE NOT EXISTS (SELECT 1 FROM collections c WHERE c.id = s.collection_id)""",
+        """DELETE FROM collection_set_summaries s
+           WHERE NOT EXISTS (SELECT 1 FROM collections c WHERE c.id = s.collection_id)"""
+    ])
+]
+
+def applied_versions(cursor) -> Dict[int, str]:
+    cursor.execute("SELECT version, name FROM schema_migrations ORDER BY version")
+    return dict(cursor.fetchall())
+
+def _apply_transactional(conn, migration: Migration):
+    conn.autocommit = False
+    started = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = %s", (MIGRATION_CONFIG['lock_timeout'],))
+            for statement in migration.statements:
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, int((time.perf_counter() - started) * 1000))
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+def _apply_concurrent(conn, migration: Migration):
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        for statement in migration.statements:
+            match = _CONCURRENT_INDEX_RE.search(statement)
+            if match:
+                # An interrupted concurrent build leaves an invalid index that IF NOT EXISTS would keep
+                cursor.execute(
+                    "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+                    (match.group(1),)
+                )
+                row = cursor.fetchone()
+                if row and row[0]:
+                    logger.warning(f"Dropping invalid index {match.group(1)} left by an earlier build")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+            (migration.version, migration.name, int((time.perf_counter() - started) * 1000))
+        )
+
+def migrate(db: Optional[DatabaseConnection] = None, target: Optional[int] = None) -> List[int]:
+    """Apply every pending migration up to ``target`` in version order and return the versions applied.
+
+    Safe to call from every worker at startup: an advisory lock serializes
+    runners, and whoever gets it second finds nothing left to do.
+    """
+    db = db or get_db_connection()
+    applied_now = []
+    with db.connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+                try:
+                    cursor.execute(SCHEMA_MIGRATIONS_TABLE)
+                    applied = applied_versions(cursor)
+                    for migration in MIGRATIONS:
+                        if migration.version in applied or (target is not None and migration.version > target):
+                            continue
+                        logger.info(f"Applying migration {migration.version}: {migration.name}")
+                        if migration.concurrent:
+                            _apply_concurrent(conn, migration)
+                        else:
+                            _apply_transactional(conn, migration)
+                        applied_now.append(migration.version)
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        finally:
+            conn.autocommit = False
+
+    if applied_now:
+        logger.info(f"Applied migrations {applied_now}")
+    return applied_now
+
+def migration_status(db: Optional[DatabaseConnection] = None) -> List[Dict[str, object]]:
+    """Every known migration with whether it has been applied"""
+    db = db or get_db_connection()
+    try:
+        rows = db.fetch_all("SELECT version, applied_at FROM schema_migrations", as_tuples=True)
+    except psycopg2.errors.UndefinedTable:
+        rows = []
+    applied = dict(rows)
+    return [{"version": m.version, "name": m.name, "concurrent": m.concurrent,
+             "applied_at": applied.get(m.version)} for m in MIGRATIONS]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying any")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    args = parser.parse_args()
+
+    db = get_db_connection()
+    if not db.connect():
+        raise SystemExit("Could not connect to the database")
+    try:
+        if not args.status:
+            migrate(db, args.target)
+        for entry in migration_status(db):
+            state = entry["applied_at"] or "pending"
+            print(f"{entry['version']:>4}  {entry['name']:<50} {state}")
+    finally:
+        db.disconnect()
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import bcrypt
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_CONFIG = {
+    'rounds': int(os.getenv('BCRYPT_ROUNDS', '12')),
+    'workers': int(os.getenv('PASSWORD_WORKERS', str(os.cpu_count() or 1))),
+    'max_queue': int(os.getenv('PASSWORD_MAX_QUEUE', '64')),
+    'retry_after': int(os.getenv('PASSWORD_RETRY_AFTER', '2'))
+}
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password hashing queue is full and the request should be retried later"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """Hash password using bcrypt"""
+    salt = bcrypt.gensalt(rounds=rounds or PASSWORD_CONFIG['rounds'])
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify password against hash"""
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Work factor recorded in a bcrypt hash such as ``$2b$12$...``"""
+    parts = hashed_password.split('$')
+    if len(parts) < 4:
+        return None
+    try:
+        return int(parts[2])
+    except ValueError:
+        return None
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash was made with a different work factor than the configured one"""
+    return hash_rounds(hashed_password) != PASSWORD_CONFIG['rounds']
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool sized to the available cores.
+
+    bcrypt releases the GIL while hashing, so the work spreads across cores
+    without touching the event loop or the threadpool FastAPI uses for
+    ordinary handlers. At most ``max_queue`` jobs may be pending; beyond that
+    callers get PasswordPoolBusy immediately rather than queueing forever.
+    """
+
+    def __init__(self, workers: int, max_queue: int, retry_after: int = 2):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordPoolBusy(self.retry_after)
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password off the event loop"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self):
+        """Queue occupancy for monitoring"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self._pending,
+                'max_queue': self.max_queue,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        self._executor.shutdown(wait=False)
+
+# Shared hasher instance
+password_hasher = PasswordHasher(PASSWORD_CONFIG['workers'], PASSWORD_CONFIG['max_queue'], PASSWORD_CONFIG['retry_after'])
+
+def get_password_hasher() -> PasswordHasher:
+    """Get the shared password hasher instance"""
+    return password_hasher
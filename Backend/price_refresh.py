@@ -0,0 +1,154 @@
+import asyncio
+import os
+import logging
+from typing import Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from db_connection import get_db_connection, DatabaseConnection
+from upstream import fetch_cards_by_ids, get_upstream_client, ID_QUERY_CHUNK_SIZE
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PRICE_REFRESH_CONFIG = {
+    'interval_hours': float(os.getenv('PRICE_REFRESH_INTERVAL_HOURS', '6')),
+    'budget': int(os.getenv('PRICE_REFRESH_BUDGET', '20000')),
+    'batch_size': int(os.getenv('PRICE_REFRESH_BATCH_SIZE', str(ID_QUERY_CHUNK_SIZE))),
+    'concurrency': int(os.getenv('PRICE_REFRESH_CONCURRENCY', '2')),
+    'min_age_hours': float(os.getenv('PRICE_REFRESH_MIN_AGE_HOURS', '12'))
+}
+
+# Advisory lock key so only one worker refreshes prices at a time
+REFRESH_LOCK_KEY = 0x42420002
+
+def select_stale_card_ids(limit: int, min_age_hours: float) -> List[str]:
+    """Distinct owned card ids whose price is oldest, never-refreshed first"""
+    query = """
+        SELECT pokemon_card_id
+        FROM cards
+        GROUP BY pokemon_card_id
+        HAVING MIN(COALESCE(price_refreshed_at, '-infinity'::timestamp))
+               < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        ORDER BY MIN(COALESCE(price_refreshed_at, '-infinity'::timestamp))
+        LIMIT %s
+    """
+    rows = get_db_connection().fetch_all(query, (min_age_hours * 3600, limit), as_tuples=True)
+    return [row[0] for row in rows]
+
+def write_prices(prices: Dict[str, Optional[float]]) -> int:
+    """Write one batch of prices to every owned copy of each card with a single UPDATE.
+
+    Cards the upstream returned no price for keep their old price but are still
+    stamped as refreshed, so they move to the back of the queue. Changed prices
+    are appended to card_price_history in the same transaction.
+    """
+    query = """
+        UPDATE cards
+        SET price = COALESCE(v.price, cards.price),
+            price_refreshed_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(pokemon_card_id, price)
+        WHERE cards.pokemon_card_id = v.pokemon_card_id
+    """
+    # Append today's price only where it differs from the card's latest recorded price
+    history_query = """
+        INSERT INTO card_price_history (pokemon_card_id, recorded_on, price)
+        SELECT v.pokemon_card_id, CURRENT_DATE, v.price
+        FROM (VALUES %s) AS v(pokemon_card_id, price)
+        LEFT JOIN LATERAL (
+            SELECT h.price
+            FROM card_price_history h
+            WHERE h.pokemon_card_id = v.pokemon_card_id
+            ORDER BY h.recorded_on DESC
+            LIMIT 1
+        ) latest ON TRUE
+        WHERE v.price IS NOT NULL AND latest.price IS DISTINCT FROM v.price
+        ON CONFLICT (pokemon_card_id, recorded_on) DO UPDATE SET price = EXCLUDED.price
+    """
+    # Rounded to the stored DECIMAL(10,2) so an unchanged price compares equal to the recorded one
+    template = "(%s, %s::numeric(10,2))"
+    rows = list(prices.items())
+    with get_db_connection().transaction() as tx:
+        tx.execute_values(query, rows, template=template, page_size=len(rows))
+        tx.execute_values(history_query, rows, template=template, page_size=len(rows))
+        return len(rows)
+
+async def refresh_batch(card_ids: List[str]) -> Dict[str, Optional[float]]:
+    """Fetch current prices for one batch of card ids and store them"""
+    cards = await fetch_cards_by_ids(card_ids, chunk_size=len(card_ids), concurrency=1)
+    prices = {
+        card_id: DatabaseConnection.card_fields(cards[card_id])['price'] if card_id in cards else None
+        for card_id in card_ids
+    }
+    await run_in_threadpool(write_prices, prices)
+    return prices
+
+async def refresh_prices(budget: int = PRICE_REFRESH_CONFIG['budget'],
+                         batch_size: int = PRICE_REFRESH_CONFIG['batch_size'],
+                         concurrency: int = PRICE_REFRESH_CONFIG['concurrency'],
+                         min_age_hours: float = PRICE_REFRESH_CONFIG['min_age_hours']) -> Dict[str, int]:
+    """Refresh prices for up to ``budget`` distinct owned cards, stalest first.
+
+    Each batch is one multi-id upstream search and one bulk UPDATE committed on
+    its own, so an interrupted run loses at most the batches in flight and the
+    next run resumes from whatever is still stalest.
+    """
+    db = get_db_connection()
+    lock = await run_in_threadpool(db.try_advisory_lock, REFRESH_LOCK_KEY)
+    if lock is None:
+        logger.info("Price refresh already running elsewhere, skipping")
+        return {"cards": 0, "priced": 0, "batches": 0, "failed_batches": 0}
+
+    try:
+        card_ids = await run_in_threadpool(select_stale_card_ids, budget, min_age_hours)
+        batches = [card_ids[i:i + batch_size] for i in range(0, len(card_ids), batch_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+        priced = 0
+        failed = 0
+
+        async def run_batch(batch: List[str]):
+            nonlocal priced, failed
+            async with semaphore:
+                try:
+                    prices = await refresh_batch(batch)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Price refresh batch of {len(batch)} cards failed: {e}")
+                    return
+                priced += sum(1 for price in prices.values() if price is not None)
+
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+        logger.info(f"Price refresh completed: {len(card_ids)} cards in {len(batches)} batches, {failed} failed")
+        return {"cards": len(card_ids), "priced": priced, "batches": len(batches), "failed_batches": failed}
+    finally:
+        await run_in_threadpool(db.release_advisory_lock, lock, REFRESH_LOCK_KEY)
+
+async def run_periodic_refresh(interval_hours: float = PRICE_REFRESH_CONFIG['interval_hours']):
+    """Refresh a budget of stale prices every ``interval_hours``"""
+    while True:
+        try:
+            await refresh_prices()
+        except Exception as e:
+            logger.error(f"Price refresh failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+if __name__ == "__main__":
+    # Run a single refresh pass when invoked directly
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh stored card prices from the Pokemon TCG API")
+    parser.add_argument("--budget", type=int, default=PRICE_REFRESH_CONFIG['budget'], help="Distinct cards to refresh")
+    parser.add_argument("--min-age-hours", type=float, default=PRICE_REFRESH_CONFIG['min_age_hours'],
+                        help="Skip cards refreshed more recently than this")
+    args = parser.parse_args()
+
+    async def main():
+        get_db_connection().connect()
+        try:
+            print(await refresh_prices(budget=args.budget, min_age_hours=args.min_age_hours))
+        finally:
+            await get_upstream_client().close()
+            get_db_connection().disconnect()
+
+    asyncio.run(main())
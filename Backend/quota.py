@@ -0,0 +1,271 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+import psycopg2
+from dotenv import load_dotenv
+from db_connection import get_db_connection, PoolTimeout
+from metrics import UPSTREAM_QUOTA_WAIT_SECONDS
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+QUOTA_CONFIG = {
+    'enabled': os.getenv('UPSTREAM_QUOTA_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    # Row in upstream_quota shared by every worker using the same API key
+    'bucket': os.getenv('UPSTREAM_QUOTA_BUCKET', 'pokemontcg'),
+    # Sustained requests per second; the default spreads a 20,000 requests/day key evenly
+    'rate': float(os.getenv('UPSTREAM_QUOTA_RATE', str(20000 / 86400))),
+    'burst': float(os.getenv('UPSTREAM_QUOTA_BURST', '200')),
+    # Share of the burst that background work may not spend, kept for interactive requests
+    'interactive_reserve': float(os.getenv('UPSTREAM_QUOTA_INTERACTIVE_RESERVE', '0.25')),
+    'interactive_budget': float(os.getenv('UPSTREAM_INTERACTIVE_BUDGET', '8')),
+    'background_budget': float(os.getenv('UPSTREAM_BACKGROUND_BUDGET', '600'))
+}
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+# Refill the bucket for the time since it was last touched, then take a token if enough stay above the floor
+TAKE_TOKEN_QUERY = """
+    WITH bucket AS (
+        SELECT name, LEAST(%s::float8, tokens + GREATEST(0, EXTRACT(EPOCH FROM clock_timestamp() - refilled_at)) * %s::float8) AS available
+        FROM upstream_quota
+        WHERE name = %s
+        FOR UPDATE
+    )
+    UPDATE upstream_quota q
+    SET tokens = b.available - CASE WHEN b.available >= %s::float8 + 1 THEN 1 ELSE 0 END,
+        refilled_at = GREATEST(q.refilled_at, clock_timestamp())
+    FROM bucket b
+    WHERE q.name = b.name
+    RETURNING b.available >= %s::float8 + 1, b.available
+"""
+
+CREATE_BUCKET_QUERY = """
+    INSERT INTO upstream_quota (name, tokens, refilled_at)
+    VALUES (%s, %s, clock_timestamp())
+    ON CONFLICT (name) DO NOTHING
+"""
+
+class QuotaExhausted(Exception):
+    """Raised when no upstream request token can be had within the caller's budget"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Pokemon TCG API quota exhausted")
+        self.retry_after = retry_after
+
+def wait_for_token(available: float, floor: float, rate: float) -> float:
+    """Seconds until ``available`` refills to one token above ``floor``"""
+    if rate <= 0:
+        return math.inf
+    return max(0.0, (floor + 1 - available) / rate)
+
+class LocalTokenBucket:
+    """In-process token bucket, used while the shared bucket cannot be reached"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, floor: float = 0.0) -> Tuple[bool, float, float]:
+        """Take a token if one is left above ``floor``; returns (granted, available, seconds until the next)"""
+        with self._lock:
+            now = time.monotonic()
+            available = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            granted = available >= floor + 1
+            self.tokens = available - 1 if granted else available
+            return granted, available, 0.0 if granted else wait_for_token(available, floor, self.rate)
+
+class SharedTokenBucket:
+    """Token bucket kept in a Postgres row so every worker draws on the same quota.
+
+    Each take is a single UPDATE that refills the row for the time elapsed
+    since it was last touched and removes a token, so concurrent workers never
+    spend the same token. If the database cannot be reached, takes fall back
+    to a per-process bucket until it can.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.fallback = LocalTokenBucket(rate, burst)
+        self.degraded = False
+
+    def take(self, floor: float = 0.0) -> Tuple[bool, float, float]:
+        """Take a token if one is left above ``floor``; returns (granted, available, seconds until the next)"""
+        params = (self.burst, self.rate, self.name, floor, floor)
+        try:
+            db = get_db_connection()
+            row = db.fetch_one(TAKE_TOKEN_QUERY, params, prepare=True, as_tuples=True)
+            if row is None:
+                db.execute(CREATE_BUCKET_QUERY, (self.name, self.burst))
+                row = db.fetch_one(TAKE_TOKEN_QUERY, params, prepare=True, as_tuples=True)
+        except (psycopg2.Error, PoolTimeout) as e:
+            if not self.degraded:
+                logger.warning(f"Shared upstream quota unavailable, limiting per process: {e}")
+                self.degraded = True
+            return self.fallback.take(floor)
+
+        if self.degraded:
+            logger.info("Shared upstream quota reachable again")
+            self.degraded = False
+        granted, available = row
+        return granted, available, 0.0 if granted else wait_for_token(available, floor, self.rate)
+
+class QuotaGovernor:
+    """Hands out upstream request tokens in priority order.
+
+    Callers queue with a priority and a deadline. A single dispatcher task per
+    event loop serves the highest-priority, oldest waiter first, and background
+    waiters may only take tokens above the interactive reserve, so bulk
+    lookups running in any worker cannot starve searches. A waiter whose
+    deadline falls before the next token can arrive is failed at once with
+    QuotaExhausted rather than left waiting out its budget.
+    """
+
+    def __init__(self, bucket, interactive_reserve: float, budgets: Dict[int, float], enabled: bool = True):
+        self.bucket = bucket
+        self.enabled = enabled
+        self.budgets = budgets
+        self.floors = {PRIORITY_INTERACTIVE: 0.0, PRIORITY_BACKGROUND: interactive_reserve}
+        self._seq = itertools.count()
+        # Heap of [priority, seq, deadline, future]
+        self._waiters: List[list] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self.available: Optional[float] = None
+        self.granted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.rejected = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def deadline_for(self, priority: int) -> float:
+        """Default monotonic deadline for a call made now at ``priority``"""
+        return time.monotonic() + self.budgets[priority]
+
+    def pause(self, seconds: float):
+        """Hold every token for ``seconds``, as when the upstream itself answers 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND, deadline: Optional[float] = None):
+        """Wait for a request token, or raise QuotaExhausted if none can arrive before ``deadline``"""
+        if not self.enabled:
+            return
+        if deadline is None:
+            deadline = self.deadline_for(priority)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Fresh queue state for a new event loop, as when a script calls asyncio.run again
+            self._loop, self._waiters, self._wakeup, self._dispatcher = loop, [], asyncio.Event(), None
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), deadline, future])
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+        name = PRIORITY_NAMES[priority]
+        started = time.monotonic()
+        try:
+            await future
+        except QuotaExhausted:
+            self.rejected[name] += 1
+            UPSTREAM_QUOTA_WAIT_SECONDS.observe(time.monotonic() - started, name, "rejected")
+            raise
+        finally:
+            # A cancelled caller leaves its future cancelled and the dispatcher skips it
+            future.cancel()
+        self.granted[name] += 1
+        UPSTREAM_QUOTA_WAIT_SECONDS.observe(time.monotonic() - started, name, "granted")
+
+    async def _dispatch(self):
+        try:
+            while self._waiters:
+                self._wakeup.clear()
+                priority, _, _, future = self._waiters[0]
+                if future.done():
+                    heapq.heappop(self._waiters)
+                    continue
+
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    granted, self.available, wait = await asyncio.to_thread(self.bucket.take, self.floors[priority])
+                    if granted:
+                        heapq.heappop(self._waiters)
+                        if not future.done():
+                            future.set_result(None)
+                        continue
+
+                self._expire(time.monotonic() + wait)
+                if not self._waiters:
+                    break
+                # Sleep until the next token, or until a new waiter may outrank the current head
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait, 60))
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            logger.error(f"Upstream quota dispatcher failed: {e}")
+            for _, _, _, future in self._waiters:
+                if not future.done():
+                    future.set_exception(e)
+            self._waiters = []
+
+    def _expire(self, ready_at: float):
+        """Fail every waiter whose deadline comes before the next token can be granted"""
+        kept = []
+        for entry in self._waiters:
+            future = entry[3]
+            if future.done():
+                continue
+            if entry[2] < ready_at:
+                future.set_exception(QuotaExhausted(max(1, math.ceil(min(ready_at - time.monotonic(), 3600)))))
+            else:
+                kept.append(entry)
+        heapq.heapify(kept)
+        self._waiters = kept
+
+    def stats(self) -> Dict[str, object]:
+        """Queue depth per priority, grant and rejection counts and the last observed token count"""
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in list(self._waiters):
+            if not future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        return {
+            'enabled': self.enabled,
+            'queued': queued,
+            'granted': dict(self.granted),
+            'rejected': dict(self.rejected),
+            'available': self.available,
+            'paused_for': max(0.0, round(self._paused_until - time.monotonic(), 3)),
+            'shared': not getattr(self.bucket, 'degraded', False)
+        }
+
+# Shared governor instance
+governor = QuotaGovernor(
+    SharedTokenBucket(QUOTA_CONFIG['bucket'], QUOTA_CONFIG['rate'], QUOTA_CONFIG['burst']),
+    QUOTA_CONFIG['burst'] * QUOTA_CONFIG['interactive_reserve'],
+    {PRIORITY_INTERACTIVE: QUOTA_CONFIG['interactive_budget'],
+     PRIORITY_BACKGROUND: QUOTA_CONFIG['background_budget']},
+    enabled=QUOTA_CONFIG['enabled']
+)
+
+def get_quota_governor() -> QuotaGovernor:
+    """Get the shared upstream quota governor"""
+    return governor
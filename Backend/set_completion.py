@@ -0,0 +1,94 @@
+import logging
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from db_connection import get_db_connection
+from images import IMAGE_CONFIG, proxied_image_url
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Owned cards matched to their set through the catalog roster. cards holds each card id once per
+# collection, so a count of joined rows is the number of distinct cards owned. With the flag set,
+# sets the collection has no cards from are listed too.
+SET_COMPLETION_QUERY = """
+    SELECT s.id, s.name, s.series, s.release_date, COALESCE(s.roster_size, 0) AS total,
+           COALESCE(o.owned, 0) AS owned
+    FROM catalog_sets s
+    LEFT JOIN (
+        SELECT cc.set_id, COUNT(*) AS owned
+        FROM cards c
+        JOIN catalog_cards cc ON cc.id = c.pokemon_card_id
+        WHERE c.collection_id = %s
+        GROUP BY cc.set_id
+    ) o ON o.set_id = s.id
+    WHERE o.owned IS NOT NULL OR %s
+    ORDER BY s.release_date DESC NULLS LAST, s.id
+"""
+SET_COMPLETION_FIELDS = ('set_id', 'name', 'series', 'release_date', 'total', 'owned')
+
+SET_QUERY = """
+    SELECT id, name, series, release_date, COALESCE(roster_size, 0) AS total
+    FROM catalog_sets
+    WHERE id = %s
+"""
+
+# Roster entries with no matching card in the collection, probed through the cards unique index
+MISSING_CARDS_QUERY = """
+    SELECT cc.id, cc.name, cc.number, cc.rarity, cc.data->'images'->>'small' AS image_url
+    FROM catalog_cards cc
+    WHERE cc.set_id = %s
+      AND NOT EXISTS (
+          SELECT 1 FROM cards c WHERE c.collection_id = %s AND c.pokemon_card_id = cc.id
+      )
+    ORDER BY length(cc.number), cc.number, cc.id
+"""
+MISSING_CARD_FIELDS = ('id', 'name', 'number', 'rarity', 'image_url')
+
+def percent(owned: int, total: int) -> float:
+    return round(100.0 * owned / total, 1) if total else 0.0
+
+def collection_set_completion(collection_id: int, include_unstarted: bool = False,
+                              user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Owned, total and percent complete for every set the collection holds cards from"""
+    rows = get_db_connection().fetch_all(
+        SET_COMPLETION_QUERY, (collection_id, include_unstarted), prepare=True, as_tuples=True,
+        replica=user_id is not None, affinity=user_id
+    )
+    sets = []
+    for row in rows:
+        entry = dict(zip(SET_COMPLETION_FIELDS, row))
+        entry['percent'] = percent(entry['owned'], entry['total'])
+        sets.append(entry)
+    return {
+        "collection_id": collection_id,
+        "sets": sets,
+        "sets_started": sum(1 for entry in sets if entry['owned']),
+        "sets_completed": sum(1 for entry in sets if entry['total'] and entry['owned'] >= entry['total'])
+    }
+
+def missing_set_cards(collection_id: int, set_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """A set's completion for the collection plus the roster cards it does not hold; None for an unknown set"""
+    with get_db_connection().transaction(replica=user_id is not None, affinity=user_id) as tx:
+        card_set = tx.fetch_one(SET_QUERY, (set_id,), prepare=True, as_tuples=True)
+        if card_set is None:
+            return None
+        rows = tx.fetch_all(MISSING_CARDS_QUERY, (set_id, collection_id), prepare=True, as_tuples=True)
+
+    missing = [dict(zip(MISSING_CARD_FIELDS, row)) for row in rows]
+    if IMAGE_CONFIG['enabled']:
+        for card in missing:
+            if card['image_url']:
+                card['image_url'] = proxied_image_url(card['image_url'], IMAGE_CONFIG['card_width'])
+
+    set_id, name, series, release_date, total = card_set
+    owned = max(0, total - len(missing))
+    return {
+        "collection_id": collection_id,
+        "set": {"set_id": set_id, "name": name, "series": series, "release_date": release_date},
+        "total": total,
+        "owned": owned,
+        "percent": percent(owned, total),
+        "missing": missing
+    }
@@ -0,0 +1,91 @@
+"""Single-flight loading and search keys for the in-process caches.
+
+Run from Backend/ with ``python -m pytest tests``.
+"""
+import asyncio
+
+import pytest
+
+from cache import SingleFlight, TTLCache, search_cache_key
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache('test', ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()['coalesced'] == 4
+    assert cache.get("key") == "value"
+
+def test_loader_error_reaches_every_waiter():
+    cache = TTLCache('test', ttl=60)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert cache.stats()['inflight'] == 0
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    cache = TTLCache('test', ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    # The waiter takes over the load once the leader is gone
+    assert asyncio.run(main()) == 2
+    assert cache.get("key") == 2
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    flight = SingleFlight()
+
+    async def loader():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(flight.run("key", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.run("key", loader))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(main()) == "value"
+    assert len(flight) == 0
+
+def test_search_key_folds_names_but_not_ids():
+    assert search_cache_key("name:Charizard*", 1, 20) == search_cache_key("name:charizard*", 1, 20)
+    assert search_cache_key("id:XY1-1", 1, 20) != search_cache_key("id:xy1-1", 1, 20)
+
+def test_search_key_keeps_spacing_inside_quotes():
+    assert search_cache_key('name:"Mr.  Mime"', 1, 20) != search_cache_key('name:"Mr. Mime"', 1, 20)
+    assert search_cache_key(' name:"Mr. Mime"   set.id:base1 ', 1, 20) == ('name:"mr. mime" set.id:base1', 1, 20)
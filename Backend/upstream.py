@@ -0,0 +1,239 @@
+import asyncio
+import os
+import random
+import time
+import logging
+from typing import Optional, Dict, Any, Iterable, List
+import httpx
+from dotenv import load_dotenv
+from metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_RETRIES
+from quota import get_quota_governor, QuotaExhausted, PRIORITY_BACKGROUND
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+POKEMON_DB_API_KEY = os.getenv("POKEMON_DB_API_KEY")
+if not POKEMON_DB_API_KEY:
+    raise ValueError("POKEMON_DB_API_KEY environment variable is not set")
+
+BASE_URL = os.getenv("POKEMON_API_BASE_URL", "https://api.pokemontcg.io/v2")
+
+headers = {
+    "X-Api-Key": POKEMON_DB_API_KEY
+}
+
+UPSTREAM_CONFIG = {
+    'connect_timeout': float(os.getenv('POKEMON_API_CONNECT_TIMEOUT', '3')),
+    'read_timeout': float(os.getenv('POKEMON_API_READ_TIMEOUT', '10')),
+    'max_connections': int(os.getenv('POKEMON_API_MAX_CONNECTIONS', '20')),
+    'max_keepalive': int(os.getenv('POKEMON_API_MAX_KEEPALIVE', '10')),
+    'max_in_flight': int(os.getenv('POKEMON_API_MAX_IN_FLIGHT', '16')),
+    'max_retries': int(os.getenv('POKEMON_API_MAX_RETRIES', '3')),
+    'backoff_base': float(os.getenv('POKEMON_API_BACKOFF_BASE', '0.25')),
+    'backoff_max': float(os.getenv('POKEMON_API_BACKOFF_MAX', '4'))
+}
+
+# Ids folded into one id:(a OR b ...) search; keeps the URL well under common 8KB limits
+ID_QUERY_CHUNK_SIZE = int(os.getenv('POKEMON_API_ID_CHUNK_SIZE', '200'))
+
+# Largest page the upstream API serves
+MAX_PAGE_SIZE = 250
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class UpstreamError(Exception):
+    """Raised when the Pokemon TCG API cannot answer a request"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class UpstreamClient:
+    """Async client for the Pokemon TCG API.
+
+    Keeps a pool of keep-alive HTTP/1.1 connections, applies connect and read
+    timeouts, retries 429/5xx responses with jittered exponential backoff and
+    caps the number of requests in flight at once. Every attempt first takes a
+    token from the shared quota governor at the call's priority, and no retry
+    is started past the call's deadline.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, connect_timeout: float = 3.0, read_timeout: float = 10.0,
+                 max_connections: int = 20, max_keepalive: int = 10, max_in_flight: int = 16,
+                 max_retries: int = 3, backoff_base: float = 0.25, backoff_max: float = 4.0):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=False
+            )
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server-provided Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None,
+                       endpoint: Optional[str] = None, priority: int = PRIORITY_BACKGROUND,
+                       deadline: Optional[float] = None) -> Dict[str, Any]:
+        """GET a path relative to the API base URL and return the decoded JSON body.
+
+        ``endpoint`` labels the call's timing metrics and defaults to ``path``;
+        pass a template such as ``/cards/{id}`` for paths that embed ids.
+        ``priority`` orders the call against others waiting for quota and
+        ``deadline`` (a ``time.monotonic()`` value) bounds how long it may
+        queue and retry; it defaults to the priority's budget.
+        """
+        response = await self.get(path, params, endpoint, priority, deadline)
+        return response.json()
+
+    async def get_raw(self, path: str, params: Optional[Dict[str, Any]] = None,
+                      endpoint: Optional[str] = None, priority: int = PRIORITY_BACKGROUND,
+                      deadline: Optional[float] = None) -> bytes:
+        """GET a path and return the undecoded JSON body, for passing straight through to clients"""
+        response = await self.get(path, params, endpoint, priority, deadline)
+        return response.content
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+                  endpoint: Optional[str] = None, priority: int = PRIORITY_BACKGROUND,
+                  deadline: Optional[float] = None) -> httpx.Response:
+        """GET a path with retries, timing the whole call under ``endpoint``"""
+        endpoint = endpoint or path
+        if deadline is None:
+            deadline = get_quota_governor().deadline_for(priority)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self._get(path, params, endpoint, priority, deadline)
+            outcome = "ok"
+            return response
+        finally:
+            UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, outcome)
+
+    def _can_retry(self, attempt: int, delay: float, deadline: float) -> bool:
+        return attempt < self.max_retries and time.monotonic() + delay < deadline
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]], endpoint: str,
+                   priority: int, deadline: float) -> httpx.Response:
+        governor = get_quota_governor()
+        attempt = 0
+        while True:
+            await governor.acquire(priority, deadline)
+            try:
+                async with self._in_flight:
+                    response = await self.client.get(path, params=params)
+            except httpx.TransportError as e:
+                delay = self._backoff(attempt)
+                if not self._can_retry(attempt, delay, deadline):
+                    raise UpstreamError(f"Upstream request to {path} failed: {e}") from e
+                UPSTREAM_RETRIES.inc(endpoint, "transport")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code == 429:
+                # The upstream is enforcing its quota; stop every caller in this worker, not just this one
+                governor.pause(self._retry_after(response) or self._backoff(attempt))
+
+            if response.status_code in RETRY_STATUSES:
+                delay = self._backoff(attempt, self._retry_after(response))
+                if self._can_retry(attempt, delay, deadline):
+                    logger.warning(f"Upstream returned {response.status_code} for {path}, retrying in {delay:.2f}s")
+                    UPSTREAM_RETRIES.inc(endpoint, str(response.status_code))
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+            if response.is_error:
+                raise UpstreamError(
+                    f"Upstream returned {response.status_code} for {path}",
+                    status_code=response.status_code,
+                    retry_after=self._retry_after(response)
+                )
+            return response
+
+    async def close(self):
+        """Close pooled upstream connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def id_query(card_ids: Iterable[str]) -> str:
+    """Build a search matching any of the given card ids"""
+    return " OR ".join(f'id:"{card_id}"' for card_id in card_ids)
+
+def id_chunks(card_ids: Iterable[str], chunk_size: int = ID_QUERY_CHUNK_SIZE) -> List[List[str]]:
+    """Deduplicate ids and split them into chunks of at most one upstream page each"""
+    unique_ids = list(dict.fromkeys(card_ids))
+    chunk_size = max(1, min(chunk_size, MAX_PAGE_SIZE))
+    return [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+
+async def fetch_cards_by_ids(card_ids: Iterable[str], chunk_size: int = ID_QUERY_CHUNK_SIZE,
+                             concurrency: int = 4, priority: int = PRIORITY_BACKGROUND,
+                             failed: Optional[Dict[str, Exception]] = None) -> Dict[str, Dict[str, Any]]:
+    """Fetch many cards with as few upstream calls as possible.
+
+    Ids are deduplicated and folded into ``id:"a" OR id:"b" ...`` searches of
+    at most ``chunk_size`` ids, with up to ``concurrency`` chunks in flight.
+    Returns the cards found, keyed by id; ids the upstream does not know are
+    simply absent. By default any failed chunk fails the whole call; with a
+    ``failed`` dict, each id of a failed chunk is recorded there with its
+    error and the other chunks' cards are still returned.
+    """
+    chunks = id_chunks(card_ids, chunk_size)
+    semaphore = asyncio.Semaphore(concurrency)
+    client = get_upstream_client()
+    found: Dict[str, Dict[str, Any]] = {}
+
+    async def fetch_chunk(chunk: List[str]):
+        async with semaphore:
+            try:
+                body = await client.get_json("/cards", params={"q": id_query(chunk), "pageSize": MAX_PAGE_SIZE},
+                                             endpoint="/cards?q=id", priority=priority)
+            except (UpstreamError, QuotaExhausted) as e:
+                if failed is None:
+                    raise
+                failed.update((card_id, e) for card_id in chunk)
+                return
+        for card in body.get("data", []):
+            found[card["id"]] = card
+
+    await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+    return found
+
+# Shared client instance
+upstream = UpstreamClient(**UPSTREAM_CONFIG)
+
+def get_upstream_client() -> UpstreamClient:
+    """Get the shared upstream client instance"""
+    return upstream
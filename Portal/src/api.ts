@@ -31,6 +31,22 @@ export interface AddCardResponse {
   card_id: number;
 }
 
+export interface BulkAddCardResult {
+  index: number;
+  pokemon_card_id: string | null;
+  status: 'added' | 'error';
+  message: string;
+  card_id: number | null;
+  quantity?: number;
+}
+
+export interface BulkAddCardsResponse {
+  collection_id: number;
+  added: number;
+  failed: number;
+  results: BulkAddCardResult[];
+}
+
 export interface Collection {
   id: number;
   name: string;
@@ -48,7 +64,10 @@ export async function searchPokemonCards(query: string, page: number = 1, pageSi
       formattedQuery = `name:${query}*`;
     }
     
-    const response = await fetch(`/api/search?q=${encodeURIComponent(formattedQuery)}&page=${page}&pageSize=${pageSize}`);
+    // 'no-cache' revalidates with the stored ETag, so unchanged results come back as a cheap 304
+    const response = await fetch(`/api/search?q=${encodeURIComponent(formattedQuery)}&page=${page}&pageSize=${pageSize}`, {
+      cache: 'no-cache'
+    });
     
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -62,6 +81,52 @@ export async function searchPokemonCards(query: string, page: number = 1, pageSi
   }
 }
 
+export interface CardLookupError {
+  status: number;
+  detail: string;
+  retry_after?: number;
+}
+
+export interface CardBatchResponse {
+  cards: Record<string, PokemonCard>;
+  errors: Record<string, CardLookupError>;
+  sources: { cache: number; catalog: number; upstream: number };
+  upstream_calls: number;
+}
+
+export async function getCardsByIds(ids: string[]): Promise<CardBatchResponse> {
+  // One request for a whole binder page or trade list instead of one per card
+  const response = await fetch('/api/cards/batch', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ids }),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+export interface Suggestion {
+  name: string;
+  type: 'card' | 'set';
+}
+
+export async function getSearchSuggestions(prefix: string, signal?: AbortSignal, limit: number = 8): Promise<Suggestion[]> {
+  // Served from the API's in-memory index, cheap enough to call on every keystroke
+  const response = await fetch(`/api/autocomplete?q=${encodeURIComponent(prefix)}&limit=${limit}`, { signal });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  const data = await response.json();
+  return data.suggestions || [];
+}
+
 export async function addCardToCollection(collectionId: number, cardData: PokemonCard, token: string): Promise<AddCardResponse> {
   const response = await fetch(`/api/collection/${collectionId}/add-card`, {
     method: "POST",
@@ -79,8 +144,167 @@ export async function addCardToCollection(collectionId: number, cardData: Pokemo
   return response.json();
 }
 
+export async function addCardsToCollection(
+  collectionId: number,
+  cards: { card: PokemonCard; quantity?: number }[],
+  token: string
+): Promise<BulkAddCardsResponse> {
+  const response = await fetch(`/api/collection/${collectionId}/add-cards`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "Accept": "application/json",
+      "Authorization": `Bearer ${token}`
+    },
+    body: JSON.stringify({ cards })
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
+export interface SetSummary {
+  set_name: string | null;
+  series: string | null;
+  card_count: number;
+  unique_cards: number;
+  total_value: number;
+}
+
+export interface CollectionStats {
+  collection_id: number;
+  card_count: number;
+  unique_cards: number;
+  total_value: number;
+  updated_at: string | null;
+  sets: SetSummary[];
+}
+
+export async function getCollectionStats(collectionId: number, token: string, signal?: AbortSignal): Promise<CollectionStats> {
+  const response = await fetch(`/api/collection/${collectionId}/stats`, {
+    cache: 'no-cache',
+    signal,
+    headers: {
+      "Authorization": `Bearer ${token}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
+export interface SetCompletion {
+  set_id: string;
+  name: string;
+  series: string | null;
+  release_date: string | null;
+  total: number;
+  owned: number;
+  percent: number;
+}
+
+export interface CollectionSetCompletion {
+  collection_id: number;
+  sets: SetCompletion[];
+  sets_started: number;
+  sets_completed: number;
+}
+
+export interface MissingCard {
+  id: string;
+  name: string;
+  number: string | null;
+  rarity: string | null;
+  image_url: string | null;
+}
+
+export interface MissingSetCards {
+  collection_id: number;
+  set: { set_id: string; name: string; series: string | null; release_date: string | null };
+  total: number;
+  owned: number;
+  percent: number;
+  missing: MissingCard[];
+}
+
+export async function getSetCompletion(
+  collectionId: number,
+  token: string,
+  includeUnstarted: boolean = false
+): Promise<CollectionSetCompletion> {
+  const response = await fetch(`/api/collection/${collectionId}/sets?include_unstarted=${includeUnstarted}`, {
+    cache: 'no-cache',
+    headers: {
+      "Authorization": `Bearer ${token}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
+export async function getMissingSetCards(collectionId: number, setId: string, token: string): Promise<MissingSetCards> {
+  const response = await fetch(`/api/collection/${collectionId}/sets/${encodeURIComponent(setId)}/missing`, {
+    cache: 'no-cache',
+    headers: {
+      "Authorization": `Bearer ${token}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
+export type HistoryInterval = 'auto' | 'day' | 'week' | 'month';
+
+export interface ValuePoint {
+  bucket: string;
+  value: number;
+  card_count: number;
+}
+
+export interface CollectionValueHistory {
+  collection_id: number;
+  start: string;
+  end: string;
+  interval: HistoryInterval;
+  points: ValuePoint[];
+}
+
+export async function getCollectionValueHistory(
+  collectionId: number,
+  token: string,
+  start?: string,
+  end?: string,
+  interval: HistoryInterval = 'auto'
+): Promise<CollectionValueHistory> {
+  const params = new URLSearchParams({ interval });
+  if (start) params.set('start', start);
+  if (end) params.set('end', end);
+
+  const response = await fetch(`/api/collection/${collectionId}/value-history?${params}`, {
+    headers: {
+      "Authorization": `Bearer ${token}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
 export async function getUserCollections(token: string): Promise<Collection[]> {
   const response = await fetch('/api/collections', {
+    cache: 'no-cache',
     headers: {
       "Authorization": `Bearer ${token}`
     }
@@ -94,13 +318,130 @@ export async function getUserCollections(token: string): Promise<Collection[]> {
 
 export async function getCollectionCards(collectionId: number, token: string): Promise<any> {
   const response = await fetch(`/api/collection/${collectionId}`, {
+    cache: 'no-cache',
+    headers: {
+      "Authorization": `Bearer ${token}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
+// Streams a collection as NDJSON, handing each decoded batch of cards to onCards as it arrives.
+// Aborting the signal stops the download; no batch is handed over after that.
+export async function streamCollectionCards(
+  collectionId: number,
+  token: string,
+  onCards: (cards: any[]) => void,
+  signal?: AbortSignal
+): Promise<void> {
+  const response = await fetch(`/api/collection/${collectionId}/stream`, {
+    cache: 'no-cache',
+    signal,
     headers: {
       "Authorization": `Bearer ${token}`
     }
   });
 
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  if (!response.body) {
+    const text = await response.text();
+    if (!signal?.aborted) {
+      onCards(text.split('\n').filter(line => line.trim()).map(line => JSON.parse(line)));
+    }
+    return;
+  }
+
+  const reader = response.body.getReader();
+  const stop = () => { reader.cancel().catch(() => undefined); };
+  signal?.addEventListener('abort', stop);
+  try {
+    const decoder = new TextDecoder();
+    let buffered = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (signal?.aborted) return;
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop() || '';
+      const cards = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+      if (cards.length > 0) {
+        onCards(cards);
+      }
+    }
+    buffered += decoder.decode();
+    if (buffered.trim()) {
+      onCards([JSON.parse(buffered)]);
+    }
+  } finally {
+    signal?.removeEventListener('abort', stop);
+  }
+}
+
+export type ImportFormat = 'csv' | 'json' | 'ndjson';
+
+export interface ImportRowError {
+  row: number;
+  pokemon_card_id: string | null;
+  message: string;
+}
+
+export interface CollectionImportReport {
+  collection_id: number;
+  format: ImportFormat;
+  mode: 'add' | 'set';
+  rows: number;
+  staged: number;
+  inserted: number;
+  updated: number;
+  failed: number;
+  errors: ImportRowError[];
+}
+
+// Uploads a file of card ids and quantities; the format is taken from the file extension
+export async function importCollection(
+  collectionId: number,
+  file: File,
+  token: string,
+  mode: 'add' | 'set' = 'add'
+): Promise<CollectionImportReport> {
+  const extension = file.name.split('.').pop()?.toLowerCase();
+  const format: ImportFormat = extension === 'json' || extension === 'ndjson' ? extension : 'csv';
+  const params = new URLSearchParams({ format, mode });
+  const response = await fetch(`/api/collection/${collectionId}/import?${params}`, {
+    method: "POST",
+    headers: {
+      "Authorization": `Bearer ${token}`
+    },
+    body: file
+  });
+
   if (!response.ok) {
     throw new Error(`HTTP error! status: ${response.status}`);
   }
   return response.json();
-}
\ No newline at end of file
+}
+
+// Downloads a collection backup as a Blob, ready to hand to URL.createObjectURL
+export async function exportCollection(
+  collectionId: number,
+  token: string,
+  format: 'csv' | 'ndjson' = 'csv'
+): Promise<Blob> {
+  const response = await fetch(`/api/collection/${collectionId}/export?format=${format}`, {
+    headers: {
+      "Authorization": `Bearer ${token}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.blob();
+}
@@ -1,7 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuth } from './authContext';
-import { getUserCollections, getCollectionCards } from './api';
+import { getUserCollections, streamCollectionCards, getCollectionStats, CollectionStats } from './api';
 import './App.css';
 
 interface CollectionCard {
@@ -23,7 +23,11 @@ const Collection: React.FC = () => {
   const [collections, setCollections] = useState<any[]>([]);
   const [selectedCollection, setSelectedCollection] = useState<any>(null);
   const [cards, setCards] = useState<CollectionCard[]>([]);
+  const [stats, setStats] = useState<CollectionStats | null>(null);
   const [isLoading, setIsLoading] = useState(false);
+  // Streamed batches not yet rendered, flushed to state at most once per animation frame
+  const pendingCards = useRef<CollectionCard[][]>([]);
+  const flushFrame = useRef<number | null>(null);
 
   useEffect(() => {
     if (user && token) {
@@ -31,10 +35,20 @@ const Collection: React.FC = () => {
     }
   }, [user, token]);
 
+  // Switching collections aborts the previous load so its cards and stats never reach the new one
   useEffect(() => {
-    if (selectedCollection && token) {
-      loadCollectionCards();
-    }
+    if (!selectedCollection || !token) return;
+
+    const controller = new AbortController();
+    loadCollectionCards(selectedCollection.id, controller.signal);
+    return () => {
+      controller.abort();
+      if (flushFrame.current !== null) {
+        cancelAnimationFrame(flushFrame.current);
+        flushFrame.current = null;
+      }
+      pendingCards.current = [];
+    };
   }, [selectedCollection, token]);
 
   const loadUserCollections = async () => {
@@ -49,17 +63,52 @@ const Collection: React.FC = () => {
     }
   };
 
-  const loadCollectionCards = async () => {
-    if (!selectedCollection) return;
-    
+  const flushCards = () => {
+    flushFrame.current = null;
+    const batches = pendingCards.current;
+    pendingCards.current = [];
+    if (batches.length > 0) {
+      setCards(prev => prev.concat(...batches));
+    }
+  };
+
+  const loadCollectionCards = async (collectionId: number, signal: AbortSignal) => {
     setIsLoading(true);
+    setCards([]);
+    setStats(null);
+    getCollectionStats(collectionId, token!, signal)
+      .then(result => {
+        if (!signal.aborted) {
+          setStats(result);
+        }
+      })
+      .catch(error => {
+        if (error.name !== 'AbortError') {
+          console.error('Failed to load collection stats:', error);
+        }
+      });
     try {
-      const collectionData = await getCollectionCards(selectedCollection.id, token!);
-      setCards(collectionData.cards || []);
-    } catch (error) {
-      console.error('Failed to load collection cards:', error);
+      // Render cards as streamed batches arrive instead of waiting for the whole collection
+      await streamCollectionCards(collectionId, token!, (batch: CollectionCard[]) => {
+        if (signal.aborted) return;
+        pendingCards.current.push(batch);
+        if (flushFrame.current === null) {
+          flushFrame.current = requestAnimationFrame(flushCards);
+        }
+        setIsLoading(false);
+      }, signal);
+    } catch (error: any) {
+      if (error.name !== 'AbortError') {
+        console.error('Failed to load collection cards:', error);
+      }
     } finally {
-      setIsLoading(false);
+      if (!signal.aborted) {
+        if (flushFrame.current !== null) {
+          cancelAnimationFrame(flushFrame.current);
+        }
+        flushCards();
+        setIsLoading(false);
+      }
     }
   };
 
@@ -69,6 +118,7 @@ const Collection: React.FC = () => {
     setCollections([]);
     setSelectedCollection(null);
     setCards([]);
+    setStats(null);
   };
 
   if (!user) {
@@ -134,8 +184,14 @@ const Collection: React.FC = () => {
                 </div>
                 <div className="stat-item">
                   <span className="stat-label">Total Cards</span>
-                  <span className="stat-value">{cards.length}</span>
+                  <span className="stat-value">{stats ? stats.card_count : cards.length}</span>
                 </div>
+                {stats && (
+                  <div className="stat-item">
+                    <span className="stat-label">Market Value</span>
+                    <span className="stat-value">${Number(stats.total_value).toFixed(2)}</span>
+                  </div>
+                )}
                 <div className="stat-item">
                   <span className="stat-label">Created</span>
                   <span className="stat-value">
@@ -157,7 +213,7 @@ const Collection: React.FC = () => {
               <div className="cards-grid">
                 {cards.map((card) => (
                   <div key={card.id} className="card-item">
-                    <img src={card.image_url} alt={card.name} className="card-image" />
+                    <img src={card.image_url} alt={card.name} className="card-image" loading="lazy" decoding="async" />
                     <div className="card-info">
                       <h4>{card.name}</h4>
                       <p>Set: {card.set_name}</p>
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuth } from './authContext';
-import { searchPokemonCards, addCardToCollection, getUserCollections } from './api';
+import { searchPokemonCards, getSearchSuggestions, Suggestion, addCardToCollection, getUserCollections } from './api';
 import './App.css';
 
 export interface PokemonCard {
@@ -25,6 +25,7 @@ export interface PokemonCard {
 const App: React.FC = () => {
   const [searchQuery, setSearchQuery] = useState('');
   const [searchResults, setSearchResults] = useState<PokemonCard[]>([]);
+  const [suggestions, setSuggestions] = useState<Suggestion[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [addingCards, setAddingCards] = useState<Set<string>>(new Set());
   const [userCollectionId, setUserCollectionId] = useState<number | null>(null);
@@ -45,6 +46,25 @@ const App: React.FC = () => {
     }
   }, [user, token]);
 
+  // Suggest names as the user types; a newer keystroke cancels the previous request
+  useEffect(() => {
+    const prefix = searchQuery.trim();
+    if (!prefix || prefix.includes(':')) {
+      setSuggestions([]);
+      return;
+    }
+
+    const controller = new AbortController();
+    getSearchSuggestions(prefix, controller.signal)
+      .then(setSuggestions)
+      .catch(error => {
+        if (error.name !== 'AbortError') {
+          console.error('Failed to get suggestions:', error);
+        }
+      });
+    return () => controller.abort();
+  }, [searchQuery]);
+
   const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!searchQuery.trim()) return;
@@ -134,7 +154,18 @@ const App: React.FC = () => {
               onChange={(e) => setSearchQuery(e.target.value)}
               placeholder="Search for Pokemon cards..."
               className="search-input"
+              list="search-suggestions"
+              autoComplete="off"
             />
+            <datalist id="search-suggestions">
+              {suggestions.map((suggestion) => (
+                <option
+                  key={`${suggestion.type}:${suggestion.name}`}
+                  value={suggestion.type === 'set' ? `set.name:"${suggestion.name}"` : suggestion.name}
+                  label={suggestion.type === 'set' ? 'Set' : undefined}
+                />
+              ))}
+            </datalist>
             <button type="submit" className="search-button primary-button" disabled={isLoading}>
               {isLoading ? 'Searching...' : 'Search'}
             </button>
@@ -147,7 +178,7 @@ const App: React.FC = () => {
             <div className="cards-grid">
               {searchResults.map((card) => (
                 <div key={card.id} className="card-item">
-                  <img src={card.images.small} alt={card.name} className="card-image" />
+                  <img src={card.images.small} alt={card.name} className="card-image" loading="lazy" decoding="async" />
                   <div className="card-info">
                     <h4>{card.name}</h4>
                     <p>Set: {card.set.name}</p>